@@ -1,2 +1,162 @@
 # app/api.py
-# FastAPI server: webhook + WebSocket
\ No newline at end of file
+# FastAPI server: webhook + WebSocket
+
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import Counter, deque
+from typing import Optional
+
+import redis.asyncio as aioredis
+from fastapi import APIRouter, FastAPI, WebSocket, WebSocketDisconnect
+from groq import AsyncGroq
+
+from app.core.config import GROQ_API_KEY, REDIS_URL
+from app.websocket_audio import Utterance, UtteranceSegmenter, decode_media_message, pcm_to_wav, utterance_key
+from llm.groq_llm import STT_MODEL
+from utils.tracing import SpanRecorder, new_trace_id, percentile
+from vad.endpointing import create_endpointer
+from vad.vad_detector import VoiceActivityDetector
+
+logger = logging.getLogger(__name__)
+
+VAD_AGGRESSIVENESS = int(os.environ.get("VAD_AGGRESSIVENESS", 2))
+# "adaptive" picks each turn's hangover from speech/silence statistics and the caller's learned
+# pause length; "fixed" waits VAD_END_SILENCE_MS like the old end_silence_timeout.
+VAD_ENDPOINTING = os.environ.get("VAD_ENDPOINTING", "adaptive")
+VAD_END_SILENCE_MS = int(os.environ.get("VAD_END_SILENCE_MS", 800))
+VAD_MIN_HANGOVER_MS = int(os.environ.get("VAD_MIN_HANGOVER_MS", 300))
+VAD_MAX_HANGOVER_MS = int(os.environ.get("VAD_MAX_HANGOVER_MS", 1200))
+VAD_MIN_SPEECH_MS = int(os.environ.get("VAD_MIN_SPEECH_MS", 250))
+# Utterances nobody picks up (e.g. the call ended) expire with their list.
+UTTERANCE_TTL = int(os.environ.get("UTTERANCE_TTL", 60))
+
+router = APIRouter()
+groq_client = AsyncGroq(api_key=GROQ_API_KEY)
+redis_client = aioredis.from_url(REDIS_URL)
+tracer = SpanRecorder("ingest", REDIS_URL)
+
+# Endpoint decision latency (silence waited through before ending a turn), across all streams.
+endpoint_decisions = deque(maxlen=2000)
+endpoint_reasons = Counter()
+active_streams = {}
+
+
+async def transcribe(pcm: bytes) -> str:
+    """Sends one utterance to Groq STT straight from memory."""
+    transcription = await groq_client.audio.transcriptions.create(
+        file=("utterance.wav", pcm_to_wav(pcm)),
+        model=STT_MODEL,
+    )
+    return transcription.text.strip()
+
+
+async def publish_utterance(call_id: str, pcm: bytes, ended_at: float, trace_id: str, after: Optional[asyncio.Task] = None):
+    """Transcribes a finished utterance and queues the text for the relay handling the call.
+
+    Utterances are transcribed concurrently but queued in the order they were
+    spoken: the text waits for `after`, the previous utterance's task.
+    """
+    stt_start_time = time.monotonic()
+    try:
+        with tracer.span("stt", trace_id=trace_id, call_id=call_id, audio_ms=len(pcm) // 16):
+            text = await transcribe(pcm)
+    except Exception as e:
+        logger.error(f"[{call_id}] Streaming STT failed: {e}", exc_info=True)
+        return
+    logger.info(f"[{call_id}] Groq STT Latency (streamed): {(time.monotonic() - stt_start_time) * 1000:.2f} ms, transcript: '{text}'")
+    if after is not None:
+        await asyncio.gather(after, return_exceptions=True)
+    if not text:
+        return
+    key = utterance_key(call_id)
+    message = json.dumps({"text": text, "trace_id": trace_id, "recorded_at": ended_at})
+    async with redis_client.pipeline(transaction=True) as pipe:
+        await pipe.rpush(key, message).expire(key, UTTERANCE_TTL).execute()
+
+
+@router.websocket("/media-stream/{call_id}")
+async def media_stream(websocket: WebSocket, call_id: str):
+    """
+    Live caller audio for one call, as μ-law frames from a SignalWire tap or
+    media stream. Speech is endpointed as it arrives, and each finished
+    utterance is transcribed from memory and pushed to `utterances:<call_id>`,
+    so no recording is ever downloaded. Transcription runs in the background,
+    so the stream is never stalled by STT.
+    """
+    await websocket.accept()
+    endpointer = create_endpointer(
+        VAD_ENDPOINTING, frame_duration_ms=20, end_silence_ms=VAD_END_SILENCE_MS,
+        min_hangover_ms=VAD_MIN_HANGOVER_MS, max_hangover_ms=VAD_MAX_HANGOVER_MS,
+    )
+    segmenter = UtteranceSegmenter(
+        VoiceActivityDetector(sample_rate=8000, frame_duration_ms=20, aggressiveness=VAD_AGGRESSIVENESS),
+        endpointer=endpointer,
+        min_speech_ms=VAD_MIN_SPEECH_MS,
+    )
+    active_streams[call_id] = endpointer
+    pending = set()
+    last_task = None
+
+    def dispatch(utterance: Utterance):
+        nonlocal last_task
+        ended_at = time.time()
+        trace_id = new_trace_id()
+        endpoint_reasons[utterance.endpoint_reason] += 1
+        if utterance.endpoint_ms is not None:
+            endpoint_decisions.append(utterance.endpoint_ms)
+            tracer.record("endpoint", utterance.endpoint_ms, trace_id=trace_id, call_id=call_id, reason=utterance.endpoint_reason)
+        last_task = asyncio.create_task(publish_utterance(call_id, utterance.pcm, ended_at, trace_id, after=last_task))
+        pending.add(last_task)
+        last_task.add_done_callback(pending.discard)
+
+    logger.info(f"[{call_id}] Media stream connected ({VAD_ENDPOINTING} endpointing).")
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("bytes") is not None:
+                data = message["bytes"]
+            elif message.get("text") is not None:
+                data = json.loads(message["text"])
+                if data.get("event") == "stop":
+                    break
+            else:
+                continue
+            pcm = decode_media_message(data)
+            if pcm:
+                for utterance in segmenter.feed(pcm):
+                    dispatch(utterance)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        utterance = segmenter.flush()
+        if utterance:
+            dispatch(utterance)
+        active_streams.pop(call_id, None)
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        logger.info(f"[{call_id}] Media stream closed: {segmenter.utterances} utterances, {segmenter.dropped} dropped as noise, "
+                    f"endpointing {endpointer.stats()}")
+
+
+@router.get("/media-stream/stats")
+def media_stream_stats():
+    """Endpoint decision latency across streams, plus each live stream's endpointer state."""
+    decisions = list(endpoint_decisions)
+    return {
+        "mode": VAD_ENDPOINTING,
+        "active_streams": len(active_streams),
+        "endpoints": dict(endpoint_reasons),
+        "decision_p50_ms": percentile(decisions, 50),
+        "decision_p95_ms": percentile(decisions, 95),
+        "decision_p99_ms": percentile(decisions, 99),
+        "streams": {call_id: endpointer.stats() for call_id, endpointer in active_streams.items()},
+    }
+
+
+app = FastAPI()
+app.include_router(router)
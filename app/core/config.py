@@ -19,6 +19,11 @@ def load_config():
         # AI Model Paths (Local)
         "PIPER_MODEL_PATH": os.getenv("PIPER_MODEL_PATH", "./piper_models/en_US-lessac-medium.onnx"),
         "PIPER_CONFIG_PATH": os.getenv("PIPER_CONFIG_PATH", "./piper_models/en_US-lessac-medium.onnx.json"),
+        # Piper synthesis pool: worker processes (0 = synthesize in-process) and max queued jobs (0 = 2x workers).
+        # The default is per process: hosts running several Piper users (orchestrator, relays) should split the cores;
+        # start_services.py does so for its relay instances.
+        "PIPER_POOL_WORKERS": int(os.getenv("PIPER_POOL_WORKERS", os.cpu_count() or 1)),
+        "PIPER_POOL_MAX_PENDING": int(os.getenv("PIPER_POOL_MAX_PENDING", 0)),
 
         # AI Model Configuration
         "LLM_MODEL": os.getenv("LLM_MODEL", "llama3-8b-8192"),
@@ -51,6 +56,8 @@ SIGNALWIRE_SPACE_URL = _config.get("SIGNALWIRE_SPACE_URL")
 SIGNALWIRE_CONTEXT = _config.get("SIGNALWIRE_CONTEXT")
 PIPER_MODEL_PATH = _config.get("PIPER_MODEL_PATH")
 PIPER_CONFIG_PATH = _config.get("PIPER_CONFIG_PATH")
+PIPER_POOL_WORKERS = _config.get("PIPER_POOL_WORKERS")
+PIPER_POOL_MAX_PENDING = _config.get("PIPER_POOL_MAX_PENDING")
 LLM_MODEL = _config.get("LLM_MODEL")
 GROQ_API_KEY = _config.get("GROQ_API_KEY")
 REDIS_URL = _config.get("REDIS_URL")
@@ -1,2 +1,211 @@
 # app/websocket_audio.py
-# Handles VAD + buffering + audio chunking
\ No newline at end of file
+# Handles VAD + buffering + audio chunking
+
+import asyncio
+import base64
+import io
+import json
+import logging
+import wave
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, List, Optional, Union
+
+import redis.asyncio as aioredis
+
+from utils.audio import decode_twilio_mulaw
+from vad.endpointing import FixedEndpointer
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 8000
+SAMPLE_WIDTH = 2
+
+
+def utterance_key(call_id: str) -> str:
+    """Redis list the ingest endpoint pushes a call's finished utterances to."""
+    return f"utterances:{call_id}"
+
+
+def decode_media_message(message: Union[bytes, dict]) -> Optional[bytes]:
+    """Returns the PCM S16 audio carried by one media-stream message, if any.
+
+    Text frames (passed in parsed) follow the Twilio/SignalWire media-stream
+    protocol: `connected`, `start`, `media` and `stop` events with base64 μ-law
+    payloads. Binary frames are taken as raw μ-law, which is what a plain
+    WebSocket tap sends.
+    """
+    if isinstance(message, (bytes, bytearray)):
+        payload = bytes(message)
+    else:
+        if message.get("event") != "media":
+            return None
+        media = message["media"]
+        if media.get("track", "inbound") != "inbound":
+            return None
+        payload = base64.b64decode(media["payload"])
+    return decode_twilio_mulaw(payload).tobytes() if payload else None
+
+
+def pcm_to_wav(pcm: bytes, sample_rate: int = SAMPLE_RATE) -> bytes:
+    """Wraps mono PCM S16 in a WAV header, in memory, for the STT upload."""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(SAMPLE_WIDTH)
+        wf.setframerate(sample_rate)
+        wf.writeframes(pcm)
+    return buffer.getvalue()
+
+
+@dataclass
+class Utterance:
+    """One endpointed stretch of caller speech, as PCM S16."""
+    pcm: bytes
+    # Silence the endpointer waited through before deciding the turn was over.
+    endpoint_ms: Optional[float] = None
+    endpoint_reason: Optional[str] = None
+
+
+class UtteranceSegmenter:
+    """Cuts a live PCM stream into utterances with a voice activity detector.
+
+    Audio is fed in whatever sizes the stream delivers and is re-framed into
+    `frame_ms` frames for `vad.is_speech`. An utterance starts at the first
+    voiced frame, including `pre_roll_ms` of audio before it so soft onsets
+    are not clipped. `endpointer` decides from the frame decisions when it is
+    over (by default after a fixed `end_silence_ms` of silence), and
+    `max_utterance_ms` caps it. Utterances with less than `min_speech_ms` of
+    voiced audio (coughs, clicks, line noise) are dropped. Trailing silence
+    beyond `keep_silence_ms` is trimmed before the utterance is returned.
+    """
+
+    def __init__(
+        self,
+        vad: Any,
+        endpointer: Any = None,
+        sample_rate: int = SAMPLE_RATE,
+        frame_ms: int = 20,
+        pre_roll_ms: int = 200,
+        end_silence_ms: int = 800,
+        min_speech_ms: int = 250,
+        max_utterance_ms: int = 30000,
+        keep_silence_ms: int = 200,
+    ):
+        self.vad = vad
+        self.endpointer = endpointer or FixedEndpointer(end_silence_ms, frame_ms)
+        self.frame_ms = frame_ms
+        self.frame_bytes = sample_rate * frame_ms // 1000 * SAMPLE_WIDTH
+        self.min_speech_frames = max(1, min_speech_ms // frame_ms)
+        self.max_utterance_frames = max_utterance_ms // frame_ms
+        self.keep_silence_frames = keep_silence_ms // frame_ms
+        self._pending = bytearray()
+        self._pre_roll = deque(maxlen=max(1, pre_roll_ms // frame_ms))
+        self._utterance = bytearray()
+        self._in_speech = False
+        self._frames = 0
+        self._speech_frames = 0
+        self._silence_frames = 0
+
+        self.utterances = 0
+        self.dropped = 0
+
+    @property
+    def in_speech(self) -> bool:
+        return self._in_speech
+
+    def feed(self, pcm: bytes) -> List[Utterance]:
+        """Adds audio and returns any utterances it completed."""
+        self._pending += pcm
+        finished = []
+        offset = 0
+        while len(self._pending) - offset >= self.frame_bytes:
+            utterance = self._process(bytes(self._pending[offset:offset + self.frame_bytes]))
+            offset += self.frame_bytes
+            if utterance:
+                finished.append(utterance)
+        del self._pending[:offset]
+        return finished
+
+    def _process(self, frame: bytes) -> Optional[Utterance]:
+        speech = self.vad.is_speech(frame)
+        if not self._in_speech:
+            if not speech:
+                self._pre_roll.append(frame)
+                self.endpointer.idle()
+                return None
+            self._in_speech = True
+            self._utterance = bytearray(b"".join(self._pre_roll))
+            self._pre_roll.clear()
+            self._frames = self._speech_frames = self._silence_frames = 0
+            self.endpointer.begin()
+
+        self._utterance += frame
+        self._frames += 1
+        if speech:
+            self._speech_frames += 1
+            self._silence_frames = 0
+        else:
+            self._silence_frames += 1
+        if self.endpointer.update(speech):
+            return self._finish(self.endpointer.last_decision_ms, self.endpointer.last_reason)
+        if self._frames >= self.max_utterance_frames:
+            return self._finish(None, "max_length")
+        return None
+
+    def _finish(self, endpoint_ms: Optional[float], reason: str) -> Optional[Utterance]:
+        trim_frames = max(0, self._silence_frames - self.keep_silence_frames)
+        pcm = bytes(self._utterance[:len(self._utterance) - trim_frames * self.frame_bytes])
+        voiced = self._speech_frames
+        self._in_speech = False
+        self._utterance = bytearray()
+        if voiced < self.min_speech_frames:
+            self.dropped += 1
+            return None
+        self.utterances += 1
+        return Utterance(pcm, endpoint_ms, reason)
+
+    def flush(self) -> Optional[Utterance]:
+        """Ends the stream; returns the utterance in progress, if it is long enough."""
+        self._pending.clear()
+        return self._finish(None, "stream_end") if self._in_speech else None
+
+
+class UtteranceInbox:
+    """Relay-side reader of the utterances the media-stream endpoint transcribes.
+
+    One redis.asyncio client, created by `open()` on the consumer's loop. Each
+    waiting call holds a BLPOP on its own list, so nothing is polled.
+    """
+
+    def __init__(self, redis_url: str):
+        self.redis_url = redis_url
+        self._client: Optional[aioredis.Redis] = None
+
+    def open(self):
+        if self._client is None:
+            self._client = aioredis.from_url(self.redis_url)
+
+    async def next(self, call_id: str, timeout: float, abort_on: Optional[Awaitable] = None) -> Optional[dict]:
+        """Waits for the call's next utterance; None on timeout or if `abort_on` completes first."""
+        pop = asyncio.ensure_future(self._client.blpop([utterance_key(call_id)], timeout=timeout))
+        abort_task = asyncio.ensure_future(abort_on) if abort_on is not None else None
+        try:
+            done, _ = await asyncio.wait([pop] + ([abort_task] if abort_task else []), return_when=asyncio.FIRST_COMPLETED)
+            if pop not in done:
+                return None
+            item = pop.result()
+            return json.loads(item[1]) if item else None
+        finally:
+            pop.cancel()
+            if abort_task:
+                abort_task.cancel()
+
+    async def discard(self, call_id: str):
+        """Drops anything still queued for a call, e.g. once it has ended."""
+        await self._client.delete(utterance_key(call_id))
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Pipeline Benchmark
+Compares end-to-end turn latency (turn submitted -> reply text back) of the
+inline pipeline, which runs download, STT and LLM on the relay's event loop,
+against the Celery round trip through the broker, a worker and the result
+backend, under the same offered load.
+
+Celery mode needs a running worker (python start_services.py, or
+`celery -A celery_worker.celery_app worker`) on the same REDIS_URL. Both modes
+call Groq, so GROQ_API_KEY must be set.
+
+Usage:
+    python benchmark_pipeline.py --turns 40 --concurrency 8
+    python benchmark_pipeline.py --recording-url https://.../recording.wav --modes inline
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+import aiohttp
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from celery_worker.celery_app import celery_app
+from utils.celery_results import CeleryResultWaiter
+from utils.http_pool import PooledHTTPSession
+from utils.inline_pipeline import InlinePipeline
+from utils.tracing import SpanRecorder
+
+REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+
+
+def report(name: str, samples_ms: list, failures: int, elapsed: float):
+    samples_ms = sorted(samples_ms)
+    if not samples_ms:
+        print(f"{name:<8} all {failures} turns failed")
+        return
+    p95 = samples_ms[min(len(samples_ms) - 1, int(len(samples_ms) * 0.95))]
+    print(f"{name:<8} mean={statistics.mean(samples_ms):8.1f} ms  p50={statistics.median(samples_ms):8.1f} ms  "
+          f"p95={p95:8.1f} ms  max={samples_ms[-1]:8.1f} ms  failed={failures}  {len(samples_ms) / elapsed:.1f} turns/s")
+
+
+async def run_load(turn, turns: int, concurrency: int):
+    """Runs `turns` turns, at most `concurrency` at once; returns (latencies ms, failures, elapsed s)."""
+    slots = asyncio.Semaphore(concurrency)
+    latencies, failures = [], 0
+
+    async def one(index):
+        nonlocal failures
+        async with slots:
+            start = time.perf_counter()
+            try:
+                reply = await turn(index)
+            except Exception:
+                reply = None
+            if reply:
+                latencies.append((time.perf_counter() - start) * 1000)
+            else:
+                failures += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(turns)))
+    return latencies, failures, time.perf_counter() - start
+
+
+async def run(args):
+    text = args.text
+    print(f"{args.turns} turns, concurrency {args.concurrency}, input: {args.recording_url or repr(text)}")
+
+    http = PooledHTTPSession()
+    http.open()
+    pipeline = InlinePipeline(
+        os.environ.get("GROQ_API_KEY"), http, SpanRecorder("benchmark", None),
+        recording_auth=aiohttp.BasicAuth(os.environ.get("SIGNALWIRE_PROJECT_ID", ""), os.environ.get("SIGNALWIRE_API_TOKEN", "")),
+        max_concurrency=args.concurrency,
+    )
+    pipeline.open()
+    waiter = CeleryResultWaiter(celery_app, REDIS_URL)
+
+    async def inline_turn(index):
+        return await pipeline.reply(f"bench-{index}", recording_url=args.recording_url,
+                                    text=None if args.recording_url else text, timeout=args.timeout)
+
+    async def celery_turn(index):
+        if args.recording_url:
+            task = celery_app.send_task("get_llm_response_task", args=[f"bench-{index}", args.recording_url])
+        else:
+            task = celery_app.send_task("get_llm_reply_task", args=[f"bench-{index}", text])
+        return await waiter.wait(task.id, timeout=args.timeout)
+
+    modes = {"inline": inline_turn, "celery": celery_turn}
+    try:
+        for name in args.modes:
+            await modes[name](-1)  # warm-up: connections, worker prefork, Groq client
+            report(name, *await run_load(modes[name], args.turns, args.concurrency))
+    finally:
+        await pipeline.close()
+        await http.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark inline vs Celery turn processing.")
+    parser.add_argument("--turns", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--text", default="What are your opening hours on Saturday?",
+                        help="Caller utterance for LLM-only turns (the streamed-call path).")
+    parser.add_argument("--recording-url", help="Recording to download and transcribe each turn (the recorded-call path).")
+    parser.add_argument("--modes", nargs="+", choices=["inline", "celery"], default=["inline", "celery"])
+    parser.add_argument("--timeout", type=float, default=30.0)
+    asyncio.run(run(parser.parse_args()))
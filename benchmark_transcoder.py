@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Transcoder Benchmark
+Compares the in-process NumPy telephony transcoder against ffmpeg, both the
+piped fallback and the legacy write-raw-file / spawn / write-output-file path.
+
+Usage:
+    python benchmark_transcoder.py --iterations 50 --seconds 6 --rate 24000
+    python benchmark_transcoder.py --input some_provider_output.wav
+"""
+
+import argparse
+import asyncio
+import io
+import os
+import shutil
+import statistics
+import tempfile
+import time
+import wave
+
+import numpy as np
+
+from utils.transcoder import transcode_to_telephony, transcode_with_ffmpeg
+
+
+def make_test_wav(seconds: float, rate: int, channels: int) -> bytes:
+    """Builds a speech-like test signal (harmonic stack with a vibrato) as 16-bit WAV."""
+    t = np.arange(int(seconds * rate)) / rate
+    f0 = 140 + 20 * np.sin(2 * np.pi * 3 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / rate
+    signal = sum(np.sin(k * phase) / k for k in range(1, 20)) * 0.2
+    pcm = np.clip(signal * 32767, -32768, 32767).astype(np.int16)
+    pcm = np.repeat(pcm[:, None], channels, axis=1)
+
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wf:
+        wf.setnchannels(channels)
+        wf.setsampwidth(2)
+        wf.setframerate(rate)
+        wf.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+
+async def legacy_ffmpeg_file_path(data: bytes, codec: str, workdir: str) -> bytes:
+    """The original pipeline: raw file on disk -> ffmpeg subprocess -> output file on disk."""
+    raw_path = os.path.join(workdir, "raw.wav")
+    out_path = os.path.join(workdir, "optimized.wav")
+    with open(raw_path, "wb") as f:
+        f.write(data)
+    command = ["ffmpeg", "-i", raw_path, "-ar", "8000", "-ac", "1", "-acodec", codec, "-y", out_path]
+    process = await asyncio.create_subprocess_exec(*command, stderr=asyncio.subprocess.PIPE)
+    _, stderr = await process.communicate()
+    if process.returncode != 0:
+        raise Exception(f"ffmpeg failed: {stderr.decode()}")
+    with open(out_path, "rb") as f:
+        return f.read()
+
+
+def report(name: str, samples_ms: list):
+    samples_ms = sorted(samples_ms)
+    p95 = samples_ms[min(len(samples_ms) - 1, int(len(samples_ms) * 0.95))]
+    print(f"{name:<28} mean={statistics.mean(samples_ms):8.2f} ms  "
+          f"p50={statistics.median(samples_ms):8.2f} ms  p95={p95:8.2f} ms")
+
+
+async def run(args):
+    if args.input:
+        with open(args.input, "rb") as f:
+            data = f.read()
+    else:
+        data = make_test_wav(args.seconds, args.rate, args.channels)
+    print(f"Input: {len(data)} bytes, codec={args.codec}, iterations={args.iterations}")
+
+    paths = {"in-process (numpy)": lambda: asyncio.to_thread(transcode_to_telephony, data, args.codec)}
+    if shutil.which("ffmpeg"):
+        workdir = tempfile.mkdtemp(prefix="transcode_bench_")
+        paths["ffmpeg (pipes)"] = lambda: transcode_with_ffmpeg(data, args.codec)
+        paths["ffmpeg (legacy files)"] = lambda: legacy_ffmpeg_file_path(data, args.codec, workdir)
+    else:
+        workdir = None
+        print("ffmpeg not found on PATH; only the in-process path will be measured.")
+
+    try:
+        for name, runner in paths.items():
+            await runner()  # warm-up
+            timings = []
+            for _ in range(args.iterations):
+                start = time.perf_counter()
+                await runner()
+                timings.append((time.perf_counter() - start) * 1000)
+            report(name, timings)
+
+            # Throughput under concurrency, as seen by an event loop serving many calls.
+            start = time.perf_counter()
+            await asyncio.gather(*(runner() for _ in range(args.concurrency)))
+            elapsed = time.perf_counter() - start
+            print(f"{'':<28} {args.concurrency} concurrent: {elapsed * 1000:.1f} ms total, "
+                  f"{args.concurrency / elapsed:.1f} clips/s")
+    finally:
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark telephony transcoding paths.")
+    parser.add_argument("--input", help="WAV file to transcode instead of a generated signal.")
+    parser.add_argument("--seconds", type=float, default=6.0)
+    parser.add_argument("--rate", type=int, default=24000)
+    parser.add_argument("--channels", type=int, default=1)
+    parser.add_argument("--codec", default=os.environ.get("TELEPHONY_CODEC", "pcm_mulaw"))
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--concurrency", type=int, default=20)
+    asyncio.run(run(parser.parse_args()))
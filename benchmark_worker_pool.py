@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Worker Pool Benchmark
+Starts a Celery worker in each pool mode, pushes the same number of turns
+through it and reports turns per second, the worker's memory and turns per
+second per GB of RAM.
+
+By default each turn is a queue_probe_task that blocks for `--work-ms`, the
+same I/O wait a Groq turn spends on the network. With `--text`, turns are real
+get_llm_reply_task calls to Groq instead (needs GROQ_API_KEY). Memory is the
+proportional set size (PSS) of the worker and all its children, sampled
+while the load runs, so prefork pages shared after the fork are not counted
+twice. Linux only, and the gevent mode needs `pip install gevent`.
+
+Usage:
+    python benchmark_worker_pool.py --turns 2000 --concurrency 400
+    python benchmark_worker_pool.py --modes prefork:4 prefork:16 gevent:200 gevent:500 threads:100
+    python benchmark_worker_pool.py --text "What are your opening hours?" --turns 200
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from celery_worker.celery_app import celery_app
+from utils.celery_results import CeleryResultWaiter
+
+REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+
+
+def process_tree(root_pid: int) -> list:
+    """The pid and every descendant of `root_pid`, read from /proc."""
+    parents = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as stat:
+                    # The command name may contain spaces; ppid is the second field after it.
+                    parents[int(entry)] = int(stat.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+    tree, frontier = [root_pid], [root_pid]
+    while frontier:
+        frontier = [pid for pid, ppid in parents.items() if ppid in frontier]
+        tree += frontier
+    return tree
+
+
+def memory_kb(pid: int) -> int:
+    """PSS of the process, or its RSS where smaps_rollup is unavailable."""
+    for path, field in ((f"/proc/{pid}/smaps_rollup", "Pss:"), (f"/proc/{pid}/status", "VmRSS:")):
+        try:
+            with open(path) as status:
+                for line in status:
+                    if line.startswith(field):
+                        return int(line.split()[1])
+        except OSError:
+            continue
+    return 0
+
+
+def worker_memory_mb(root_pid: int) -> float:
+    return sum(memory_kb(pid) for pid in process_tree(root_pid)) / 1024
+
+
+def start_worker(pool: str, concurrency: int, queue: str, hostname: str) -> subprocess.Popen:
+    cmd = [
+        "celery", "-A", "celery_worker.celery_app", "worker",
+        "--include=celery_worker.probe_tasks",
+        "--loglevel=warning",
+        f"--pool={pool}",
+        f"--concurrency={concurrency}",
+        f"--queues={queue}",
+        "--prefetch-multiplier=1",
+        f"--hostname={hostname}",
+    ]
+    env = dict(os.environ, RECORDING_POOL_MAXSIZE=str(concurrency))
+    return subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=sys.stderr)
+
+
+async def wait_until_ready(hostname: str, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        replies = await asyncio.to_thread(celery_app.control.ping, destination=[hostname], timeout=1.0)
+        if replies:
+            return
+    raise RuntimeError(f"Worker {hostname} did not come up within {timeout:.0f}s.")
+
+
+async def run_mode(args, waiter: CeleryResultWaiter, pool: str, concurrency: int) -> dict:
+    queue = f"bench-{pool}-{concurrency}"
+    hostname = f"bench-{pool}-{concurrency}@{os.uname().nodename}"
+    worker = start_worker(pool, concurrency, queue, hostname)
+    try:
+        await wait_until_ready(hostname)
+
+        def send(index):
+            if args.text:
+                return celery_app.send_task("get_llm_reply_task", args=[f"bench-{index}", args.text], queue=queue)
+            return celery_app.send_task("queue_probe_task", args=[time.time(), args.work_ms], queue=queue)
+
+        slots = asyncio.Semaphore(args.concurrency)
+        failures = 0
+
+        async def turn(index):
+            nonlocal failures
+            async with slots:
+                try:
+                    if await waiter.wait(send(index).id, timeout=args.timeout) is None:
+                        failures += 1
+                except asyncio.TimeoutError:
+                    failures += 1
+
+        # Warm-up: let every slot import, connect and allocate before measuring.
+        await asyncio.gather(*(turn(-1) for _ in range(min(concurrency, args.concurrency))))
+        failures = 0
+
+        peak_mb = 0.0
+        load = asyncio.ensure_future(asyncio.gather(*(turn(index) for index in range(args.turns))))
+        start = time.perf_counter()
+        while not load.done():
+            peak_mb = max(peak_mb, worker_memory_mb(worker.pid))
+            await asyncio.wait([load], timeout=0.5)
+        await load
+        elapsed = time.perf_counter() - start
+    finally:
+        worker.terminate()
+        try:
+            worker.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            worker.kill()
+
+    turns_per_s = (args.turns - failures) / elapsed
+    return {
+        "mode": f"{pool}:{concurrency}",
+        "turns_per_s": turns_per_s,
+        "memory_mb": peak_mb,
+        "turns_per_s_per_gb": turns_per_s / (peak_mb / 1024) if peak_mb else 0.0,
+        "failed": failures,
+    }
+
+
+async def run(args):
+    workload = f"Groq replies to {args.text!r}" if args.text else f"{args.work_ms:.0f} ms I/O-bound probe turns"
+    print(f"{args.turns} turns per mode, {args.concurrency} in flight, {workload}")
+    waiter = CeleryResultWaiter(celery_app, REDIS_URL)
+    for mode in args.modes:
+        pool, concurrency = mode.split(":")
+        result = await run_mode(args, waiter, pool, int(concurrency))
+        print(f"{result['mode']:<14} {result['turns_per_s']:8.1f} turns/s  {result['memory_mb']:8.1f} MB  "
+              f"{result['turns_per_s_per_gb']:9.1f} turns/s/GB  failed={result['failed']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark Celery pool modes for the realtime turn tasks.")
+    parser.add_argument("--modes", nargs="+", default=["prefork:4", "threads:100", "gevent:200"],
+                        help="pool:concurrency pairs to run, in order.")
+    parser.add_argument("--turns", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=400, help="Turns in flight from the load generator.")
+    parser.add_argument("--work-ms", type=float, default=800.0, help="I/O wait per probe turn.")
+    parser.add_argument("--text", help="Run real Groq LLM turns with this caller utterance instead of probes.")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    asyncio.run(run(parser.parse_args()))
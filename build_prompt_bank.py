@@ -0,0 +1,35 @@
+# build_prompt_bank.py
+#
+# Renders every fixed system prompt once at build time and writes the
+# telephony-ready clips plus a manifest to PROMPT_BANK_DIR. The orchestrator
+# loads this artifact at startup instead of calling the TTS provider; entries
+# whose text, voice or codec changed since the build are re-rendered live.
+
+import asyncio
+import logging
+import sys
+
+from tts_orchestrator import PROMPT_BANK_DIR, groq_tts_client, piper_tts_service, prompt_bank
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+async def main() -> int:
+    await piper_tts_service.initialize()
+    try:
+        await prompt_bank.load()
+    finally:
+        await groq_tts_client.aclose()
+        await piper_tts_service.cleanup()
+
+    missing = [prompt_id for prompt_id in prompt_bank.prompts if prompt_bank.get(prompt_id) is None]
+    prompt_bank.save_artifact(PROMPT_BANK_DIR)
+    if missing:
+        logger.error(f"Could not render prompts: {', '.join(missing)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -1,11 +1,25 @@
 import os
 from celery import Celery
 from dotenv import load_dotenv
+from kombu import Queue
 
 load_dotenv()
 
 redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 
+# Live call turns go to their own queue, served by their own workers, so warm-up and
+# batch jobs on the bulk queue can never sit in front of a caller. Realtime tasks only
+# wait on Groq and SignalWire, so their worker can run a green-thread pool; anything
+# CPU-bound (local inference) belongs on the bulk queue, whose worker stays prefork.
+REALTIME_QUEUE = os.getenv("CELERY_REALTIME_QUEUE", "realtime")
+BULK_QUEUE = os.getenv("CELERY_BULK_QUEUE", "bulk")
+REALTIME_TASKS = ("get_llm_response_task", "get_llm_reply_task")
+# The load-test probe (celery_worker/probe_tasks.py) is not part of the app; workers only know it
+# when started with `-I celery_worker.probe_tasks`, and unless sent elsewhere it goes to its own queue.
+PROBE_QUEUE = os.getenv("CELERY_PROBE_QUEUE", "probe")
+# Turn results are read within seconds; don't keep them in Redis for the default day.
+RESULT_EXPIRES = int(os.getenv("CELERY_RESULT_EXPIRES", 300))
+
 celery_app = Celery(
     'auravoice',
     broker=redis_url,
@@ -19,6 +33,14 @@ celery_app.conf.update(
     result_serializer='json',
     timezone='UTC',
     enable_utc=True,
+    task_queues=(Queue(REALTIME_QUEUE), Queue(BULK_QUEUE), Queue(PROBE_QUEUE)),
+    task_default_queue=BULK_QUEUE,
+    task_routes={**{name: {'queue': REALTIME_QUEUE} for name in REALTIME_TASKS}, 'queue_probe_task': {'queue': PROBE_QUEUE}},
+    # Each worker process reserves only the task it is running, and acknowledges it when done:
+    # a slow turn holds up nothing but itself, and the next turn goes to whichever process frees up first.
+    worker_prefetch_multiplier=1,
+    task_acks_late=True,
+    result_expires=RESULT_EXPIRES,
 )
 
 if __name__ == '__main__':
@@ -0,0 +1,25 @@
+# celery_worker/probe_tasks.py
+"""
+Tasks for the queue load test and the worker pool benchmark only.
+
+Production workers never import this module. load_test_queues.py and
+benchmark_worker_pool.py start (or expect) workers with
+`--include celery_worker.probe_tasks` and send the probes to the queue under
+test explicitly. Sent without a queue, a probe is routed to
+PROBE_QUEUE (see celery_app.py), never to the realtime one.
+"""
+
+import time
+
+from celery import shared_task
+
+
+@shared_task(name="queue_probe_task", bind=True)
+def queue_probe_task(self, sent_at: float, work_ms: float = 0) -> dict:
+    """
+    Load-test stand-in for a turn: reports how long it sat in the queue, then
+    holds the worker for `work_ms` like STT + LLM would.
+    """
+    wait_ms = (time.time() - sent_at) * 1000
+    time.sleep(work_ms / 1000)
+    return {"wait_ms": wait_ms, "queue": (self.request.delivery_info or {}).get("routing_key"), "worker": self.request.hostname}
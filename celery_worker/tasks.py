@@ -2,15 +2,45 @@ import os
 import logging
 import time
 from celery import shared_task
+from celery.signals import worker_process_init, worker_process_shutdown
 from dotenv import load_dotenv
-import io
-import requests
+import redis
 from groq import Groq
+from llm.conversation_memory import ConversationMemory, estimate_tokens
+from llm.groq_llm import HISTORY_MAX_TURNS, HISTORY_TOKEN_BUDGET, HISTORY_TTL, LLM_MODEL, STT_MODEL, chat_messages
+from tts.chunking import SentenceAccumulator
+from utils.recording_fetch import RecordingSession
+from utils.reply_stream import ReplyStreamWriter
+from utils.tracing import SpanRecorder
 
 # --- Configuration ---
 load_dotenv()
 logger = logging.getLogger("AuraVoice")
 
+REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+# Per-stage spans for the latency trace the relay starts for each turn.
+tracer = SpanRecorder("worker", REDIS_URL)
+# Streaming replies are published here sentence by sentence (see utils/reply_stream.py).
+redis_client = redis.from_url(REDIS_URL)
+# The call's recent turns, prepended to every prompt.
+memory = ConversationMemory(redis_client, HISTORY_MAX_TURNS, HISTORY_TOKEN_BUDGET, HISTORY_TTL)
+# Keep-alive connections to SignalWire for recording downloads, one pool per worker process.
+# Size it to the worker's concurrency on green-thread/thread pools, where one process runs many turns.
+recordings = RecordingSession(pool_maxsize=int(os.environ.get("RECORDING_POOL_MAXSIZE", 4)))
+
+
+@worker_process_init.connect
+def open_recording_session(**kwargs):
+    # Opened after the fork so child processes never share pooled sockets. Non-prefork
+    # pools don't fork and don't send this signal; the session opens on first use there.
+    recordings.open()
+
+
+@worker_process_shutdown.connect
+def close_recording_session(**kwargs):
+    logger.info(f"Recording transfer stats: {recordings.stats()}")
+    recordings.close()
+
 # --- Groq Client Initialization ---
 try:
     groq_api_key = os.environ.get("GROQ_API_KEY")
@@ -24,33 +54,102 @@ except Exception as e:
     logger.error(f"Failed to initialize Groq client in Celery worker: {e}", exc_info=True)
     groq_client = None
 
+def generate_reply(call_id: str, transcript_text: str, trace_id: str | None = None, stream: ReplyStreamWriter | None = None) -> str:
+    """Runs the chat completion for one caller utterance and returns the reply text.
+
+    With `stream`, tokens are streamed from Groq and each complete sentence is
+    published as soon as it is cut, so the relay can start synthesis long
+    before the last token. The prompt carries the call's recent turns from
+    `memory`, and the exchange is appended to it afterwards.
+    """
+    try:
+        history = memory.window(call_id)
+    except Exception as e:
+        logger.warning(f"[{call_id}] Could not read conversation memory, answering without context: {e}")
+        history = []
+    messages = chat_messages(transcript_text, history)
+    prompt_tokens = sum(estimate_tokens(message["content"]) for message in messages)
+    logger.info(f"[{call_id}] Generating chat completion{' (streaming)' if stream else ''} with {len(history)} prior message(s)...")
+    llm_start_time = time.monotonic()
+    if stream is None:
+        with tracer.span("llm", trace_id=trace_id, call_id=call_id, prompt_tokens=prompt_tokens):
+            chat_completion = groq_client.chat.completions.create(
+                messages=messages,
+                model=LLM_MODEL,
+            )
+        llm_response_text = chat_completion.choices[0].message.content
+    else:
+        accumulator = SentenceAccumulator()
+        parts = []
+
+        def publish(sentence):
+            if stream.sentences == 0:
+                first_sentence_latency = (time.monotonic() - llm_start_time) * 1000
+                logger.info(f"[{call_id}] Groq LLM Time-to-first-sentence: {first_sentence_latency:.2f} ms")
+                tracer.record("first_sentence", first_sentence_latency, trace_id=trace_id, call_id=call_id)
+            stream.sentence(sentence)
+
+        with tracer.span("llm", trace_id=trace_id, call_id=call_id, prompt_tokens=prompt_tokens, streamed=True) as span:
+            for chunk in groq_client.chat.completions.create(messages=messages, model=LLM_MODEL, stream=True):
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if not delta:
+                    continue
+                parts.append(delta)
+                for sentence in accumulator.feed(delta):
+                    publish(sentence)
+            rest = accumulator.flush()
+            if rest:
+                publish(rest)
+            span["sentences"] = stream.sentences
+        stream.end()
+        llm_response_text = "".join(parts)
+    llm_end_time = time.monotonic()
+    llm_latency = (llm_end_time - llm_start_time) * 1000
+    logger.info(f"[{call_id}] Groq LLM Latency: {llm_latency:.2f} ms")
+
+    logger.info(f"[{call_id}] LLM Response: '{llm_response_text}'")
+    try:
+        memory.append(call_id, {"role": "user", "content": transcript_text}, {"role": "assistant", "content": llm_response_text})
+    except Exception as e:
+        logger.warning(f"[{call_id}] Could not update conversation memory: {e}")
+    return llm_response_text
+
 @shared_task(name="get_llm_response_task", bind=True, max_retries=3, default_retry_delay=5)
-def get_llm_response_task(self, call_id: str, recording_url: str) -> str | None:
+def get_llm_response_task(self, call_id: str, recording_url: str, trace_id: str | None = None, recorded_at: float | None = None,
+                          stream: bool = False) -> str | None:
     """
     This task takes a user's voice recording, transcribes it, gets a response
     from an LLM, and returns the text response. It does NOT handle TTS.
+    `trace_id` and `recorded_at` (epoch seconds the recording ended) come from
+    the relay and tie this task's spans to the turn. With `stream`, the reply
+    is also published sentence by sentence to `reply:<task id>`.
     """
+    if recorded_at is not None:
+        tracer.record("dispatch", (time.time() - recorded_at) * 1000, start=recorded_at, trace_id=trace_id, call_id=call_id)
+
     if not groq_client:
         logger.error(f"[{call_id}] Groq client not available. Retrying task...")
         raise self.retry()
 
     logger.info(f"[{call_id}] Celery task started for STT/LLM processing.")
+    writer = ReplyStreamWriter(redis_client, self.request.id) if stream else None
 
     try:
         # --- Step 1: Download audio ---
         auth = (os.environ["SIGNALWIRE_PROJECT_ID"], os.environ["SIGNALWIRE_API_TOKEN"])
-        response = requests.get(recording_url, auth=auth, timeout=15)
-        response.raise_for_status()
-        audio_buffer = io.BytesIO(response.content)
-        audio_buffer.name = "recording.wav"
+        with tracer.span("download", trace_id=trace_id, call_id=call_id) as span:
+            audio = recordings.download(recording_url, auth=auth)
+            span["bytes"] = len(audio)
         
         # --- Step 2: STT ---
+        # The downloaded bytes go to Groq as they are; no BytesIO or read() copy.
         logger.info(f"[{call_id}] Transcribing audio...")
         stt_start_time = time.monotonic()
-        transcription = groq_client.audio.transcriptions.create(
-            file=(audio_buffer.name, audio_buffer.read()),
-            model="whisper-large-v3"
-        )
+        with tracer.span("stt", trace_id=trace_id, call_id=call_id, bytes=len(audio)), recordings.uploading(audio):
+            transcription = groq_client.audio.transcriptions.create(
+                file=("recording.wav", audio),
+                model=STT_MODEL
+            )
         stt_end_time = time.monotonic()
         stt_latency = (stt_end_time - stt_start_time) * 1000
         logger.info(f"[{call_id}] Groq STT Latency: {stt_latency:.2f} ms")
@@ -61,25 +160,41 @@ def get_llm_response_task(self, call_id: str, recording_url: str) -> str | None:
             return None # Return None if user said nothing
 
         # --- Step 3: LLM ---
-        logger.info(f"[{call_id}] Generating chat completion...")
-        llm_start_time = time.monotonic()
-        chat_completion = groq_client.chat.completions.create(
-            messages=[
-                {"role": "system", "content": "You are a human-like voice assistant. Your responses MUST be short, warm, and conversational. NEVER exceed 35 words. Be helpful, but get straight to the point."},
-                {"role": "user", "content": transcript_text},
-            ],
-            model="llama3-8b-8192",
-        )
-        llm_end_time = time.monotonic()
-        llm_latency = (llm_end_time - llm_start_time) * 1000
-        logger.info(f"[{call_id}] Groq LLM Latency: {llm_latency:.2f} ms")
-
-        llm_response_text = chat_completion.choices[0].message.content
-        logger.info(f"[{call_id}] LLM Response: '{llm_response_text}'")
-        
-        return llm_response_text
+        return generate_reply(call_id, transcript_text, trace_id, writer)
 
     except Exception as e:
-        logger.error(f"[{call.id}] Unhandled exception in Celery STT/LLM task: {e}", exc_info=True)
+        logger.error(f"[{call_id}] Unhandled exception in Celery STT/LLM task: {e}", exc_info=True)
+        if writer:
+            writer.error(str(e))
         # Returning None will signal the relay server that something went wrong.
         return None
+    finally:
+        if writer:
+            writer.end()
+
+@shared_task(name="get_llm_reply_task", bind=True, max_retries=3, default_retry_delay=5)
+def get_llm_reply_task(self, call_id: str, transcript_text: str, trace_id: str | None = None, recorded_at: float | None = None,
+                       stream: bool = False) -> str | None:
+    """
+    LLM-only variant for streamed calls: the media-stream endpoint has already
+    transcribed the utterance from memory, so there is nothing to download.
+    `stream` works as in get_llm_response_task.
+    """
+    if recorded_at is not None:
+        tracer.record("dispatch", (time.time() - recorded_at) * 1000, start=recorded_at, trace_id=trace_id, call_id=call_id)
+
+    if not groq_client:
+        logger.error(f"[{call_id}] Groq client not available. Retrying task...")
+        raise self.retry()
+
+    writer = ReplyStreamWriter(redis_client, self.request.id) if stream else None
+    try:
+        return generate_reply(call_id, transcript_text, trace_id, writer)
+    except Exception as e:
+        logger.error(f"[{call_id}] Unhandled exception in Celery LLM task: {e}", exc_info=True)
+        if writer:
+            writer.error(str(e))
+        return None
+    finally:
+        if writer:
+            writer.end()
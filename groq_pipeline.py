@@ -1,9 +1,9 @@
 import os
 import logging
 import requests
-import io
 from groq import Groq
 from dotenv import load_dotenv
+from utils.recording_fetch import RecordingSession
 
 # --- Basic Configuration ---
 load_dotenv()
@@ -22,6 +22,9 @@ except Exception as e:
     logger.error(f"Failed to initialize Groq client: {e}", exc_info=True)
     groq_client = None
 
+# Pooled recording downloads; opened on first use in whichever process runs the pipeline.
+recordings = RecordingSession()
+
 def process_audio_with_groq(audio_url: str, sw_project_id: str, sw_token: str, output_filepath: str) -> bool:
     """
     Processes an audio URL through the full Groq pipeline (STT -> LLM -> TTS)
@@ -35,13 +38,8 @@ def process_audio_with_groq(audio_url: str, sw_project_id: str, sw_token: str, o
     try:
         logger.info(f"Downloading audio from: {audio_url}")
         auth = (sw_project_id, sw_token)
-        response = requests.get(audio_url, auth=auth, timeout=15)
-        response.raise_for_status()
-        
-        audio_buffer = io.BytesIO(response.content)
-        audio_buffer.name = "recording.wav"
-        
-        logger.info("Audio downloaded successfully into memory.")
+        audio_bytes = recordings.download(audio_url, auth=auth)
+        logger.info(f"Audio downloaded successfully into memory ({len(audio_bytes)} bytes).")
 
     except requests.exceptions.RequestException as e:
         logger.error(f"Failed to download audio file from {audio_url}: {e}", exc_info=True)
@@ -50,13 +48,13 @@ def process_audio_with_groq(audio_url: str, sw_project_id: str, sw_token: str, o
     # --- Step 2: STT ---
     try:
         logger.info("Transcribing audio with Groq Whisper...")
-        # We must read the buffer to pass the bytes to the file tuple
-        audio_bytes = audio_buffer.read()
-        transcription = groq_client.audio.transcriptions.create(
-            file=(audio_buffer.name, audio_bytes),
-            model="whisper-large-v3",
-            response_format="json",
-        )
+        # The downloaded bytes are passed as they are, without another copy.
+        with recordings.uploading(audio_bytes):
+            transcription = groq_client.audio.transcriptions.create(
+                file=("recording.wav", audio_bytes),
+                model="whisper-large-v3",
+                response_format="json",
+            )
         transcript_text = transcription.text
         logger.info(f"Transcript: '{transcript_text}'")
         if not transcript_text.strip():
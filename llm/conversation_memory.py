@@ -0,0 +1,136 @@
+# llm/conversation_memory.py
+
+import asyncio
+import json
+import logging
+import math
+from typing import List, Optional
+
+import redis
+import redis.asyncio as aioredis
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token), enough for budgeting."""
+    return max(1, math.ceil(len(text) / 4))
+
+
+class ConversationMemory:
+    """A call's recent turns, kept as a Redis list at `history:<call_id>`.
+
+    Each message is one list entry, added with RPUSH, so a turn costs two
+    appends rather than a rewrite of the whole history. The list is trimmed
+    to the last `max_turns` turns on every append and expires `ttl` seconds
+    after the last one; the relay also deletes it when the call ends.
+    `window` reads only the tail with LRANGE and keeps the newest messages
+    that fit `token_budget`, so the prompt stays the same size however long
+    the call runs.
+    """
+
+    def __init__(self, client: redis.Redis, max_turns: int = 8, token_budget: int = 600, ttl: int = 3600,
+                 prefix: str = "history"):
+        self.client = client
+        self.max_messages = max_turns * 2
+        self.token_budget = token_budget
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def _key(self, call_id: str) -> str:
+        return f"{self.prefix}:{call_id}"
+
+    def start(self, call_id: str):
+        """Clears anything left under this call id, e.g. by a relay that crashed."""
+        self.client.delete(self._key(call_id))
+
+    def end(self, call_id: str):
+        self.client.delete(self._key(call_id))
+
+    def _entries(self, messages) -> List[str]:
+        return [json.dumps({**message, "tokens": estimate_tokens(message["content"])}) for message in messages]
+
+    def _fit(self, entries) -> List[dict]:
+        """The newest `entries`, oldest first, within the token budget, starting on a user message.
+
+        A budget cut in the middle of an exchange would otherwise leave its
+        reply at the head of the window with no question before it.
+        """
+        window, used = [], 0
+        for entry in reversed(entries):
+            message = json.loads(entry)
+            used += message.pop("tokens", None) or estimate_tokens(message["content"])
+            if used > self.token_budget:
+                break
+            window.append(message)
+        while window and window[-1]["role"] != "user":
+            window.pop()
+        return window[::-1]
+
+    def append(self, call_id: str, *messages: dict):
+        """Appends chat messages ({"role", "content"}) in order, then trims and refreshes the TTL."""
+        key = self._key(call_id)
+        pipe = self.client.pipeline(transaction=False)
+        pipe.rpush(key, *self._entries(messages))
+        pipe.ltrim(key, -self.max_messages, -1)
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+
+    def window(self, call_id: str) -> List[dict]:
+        """The newest whole exchanges, oldest first, that fit the token budget."""
+        return self._fit(self.client.lrange(self._key(call_id), -self.max_messages, -1))
+
+
+class AsyncConversationMemory(ConversationMemory):
+    """`ConversationMemory` over `redis.asyncio`, for code running on the relay's event loop.
+
+    Reads and writes the same `history:<call_id>` lists as the worker, so a
+    call's context carries over whichever side answers a turn. `open()`
+    creates the client on the consumer's loop.
+    """
+
+    def __init__(self, redis_url: str, max_turns: int = 8, token_budget: int = 600, ttl: int = 3600,
+                 prefix: str = "history"):
+        super().__init__(None, max_turns, token_budget, ttl, prefix)
+        self.redis_url = redis_url
+        self.client: Optional[aioredis.Redis] = None
+
+    def open(self):
+        if self.client is None:
+            self.client = aioredis.from_url(self.redis_url, decode_responses=True)
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    async def start(self, call_id: str):
+        await self.client.delete(self._key(call_id))
+
+    def start_soon(self, call_id: str) -> asyncio.Task:
+        """`start` as a background task, so the greeting never waits on Redis.
+
+        The call's first turn is seconds away, long after the DEL has landed.
+        A failure is logged; the key still expires after `ttl`.
+        """
+        def log_failure(task: asyncio.Task):
+            if not task.cancelled() and task.exception() is not None:
+                logger.warning(f"[{call_id}] Could not reset conversation memory: {task.exception()}")
+
+        task = asyncio.ensure_future(self.start(call_id))
+        task.add_done_callback(log_failure)
+        return task
+
+    async def end(self, call_id: str):
+        await self.client.delete(self._key(call_id))
+
+    async def append(self, call_id: str, *messages: dict):
+        key = self._key(call_id)
+        pipe = self.client.pipeline(transaction=False)
+        pipe.rpush(key, *self._entries(messages))
+        pipe.ltrim(key, -self.max_messages, -1)
+        pipe.expire(key, self.ttl)
+        await pipe.execute()
+
+    async def window(self, call_id: str) -> List[dict]:
+        return self._fit(await self.client.lrange(self._key(call_id), -self.max_messages, -1))
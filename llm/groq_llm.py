@@ -1 +1,27 @@
-# llm/groq_llm.py
\ No newline at end of file
+# llm/groq_llm.py
+
+import os
+from typing import List, Sequence
+
+# Shared by the Celery worker and the relays' inline pipeline, so both modes answer alike.
+LLM_MODEL = os.environ.get("LLM_MODEL", "llama3-8b-8192")
+STT_MODEL = os.environ.get("STT_MODEL", "whisper-large-v3")
+SYSTEM_PROMPT = (
+    "You are a human-like voice assistant. Your responses MUST be short, warm, and conversational. "
+    "NEVER exceed 35 words. Be helpful, but get straight to the point."
+)
+
+
+# Conversation memory window (see llm/conversation_memory.py).
+HISTORY_MAX_TURNS = int(os.environ.get("HISTORY_MAX_TURNS", 8))
+HISTORY_TOKEN_BUDGET = int(os.environ.get("HISTORY_TOKEN_BUDGET", 600))
+HISTORY_TTL = int(os.environ.get("HISTORY_TTL", 3600))
+
+
+def chat_messages(transcript_text: str, history: Sequence[dict] = ()) -> List[dict]:
+    """The chat completion messages for one caller utterance, after the call's recent turns."""
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        *history,
+        {"role": "user", "content": transcript_text},
+    ]
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Queue Load Test
+Simulates concurrent calls against the Celery workers and reports how long
+live turns wait in the queue before a worker picks them up, with a backlog of
+bulk jobs submitted at the same time.
+
+Each simulated call takes `--turns` turns: it sends a queue_probe_task (which
+holds a worker for `--work-ms`, standing in for STT + LLM), waits for the
+result, then "listens" for `--think-ms` before the next turn. Queue wait is
+measured by the task itself (task start - send time), so run this on the same
+host as the workers or with synced clocks.
+
+Start the workers as start_services.py does, plus the probe task module, e.g.:
+    celery -A celery_worker.celery_app worker -I celery_worker.probe_tasks -Q realtime --prefetch-multiplier=1 -c 4
+    celery -A celery_worker.celery_app worker -I celery_worker.probe_tasks -Q bulk -c 1
+
+Usage:
+    python load_test_queues.py --calls 50
+    python load_test_queues.py --calls 50 --single-queue   # bulk jobs share the realtime queue
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from celery_worker.celery_app import BULK_QUEUE, REALTIME_QUEUE, celery_app
+from utils.celery_results import CeleryResultWaiter
+from utils.tracing import percentile
+
+REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+
+
+def report(name: str, samples_ms: list):
+    if not samples_ms:
+        print(f"{name:<18} no samples")
+        return
+    print(f"{name:<18} n={len(samples_ms):<5} mean={statistics.mean(samples_ms):8.1f} ms  p50={percentile(samples_ms, 50):8.1f} ms  "
+          f"p95={percentile(samples_ms, 95):8.1f} ms  p99={percentile(samples_ms, 99):8.1f} ms  max={max(samples_ms):8.1f} ms")
+
+
+async def run(args):
+    waiter = CeleryResultWaiter(celery_app, REDIS_URL)
+    bulk_queue = REALTIME_QUEUE if args.single_queue else BULK_QUEUE
+    waits, round_trips, failures = [], [], 0
+
+    async def call(index):
+        nonlocal failures
+        # Calls arrive spread over the ramp, not all in the same millisecond.
+        await asyncio.sleep(random.uniform(0, args.ramp))
+        for _ in range(args.turns):
+            sent_at = time.time()
+            task = celery_app.send_task("queue_probe_task", args=[sent_at, args.work_ms], queue=REALTIME_QUEUE, expires=args.timeout)
+            try:
+                result = await waiter.wait(task.id, timeout=args.timeout)
+            except asyncio.TimeoutError:
+                result = None
+            if not result:
+                failures += 1
+            else:
+                waits.append(result["wait_ms"])
+                round_trips.append((time.time() - sent_at) * 1000)
+            await asyncio.sleep(random.uniform(0.5, 1.5) * args.think_ms / 1000)
+
+    print(f"{args.calls} calls x {args.turns} turns, {args.work_ms:.0f} ms of work per turn, "
+          f"{args.bulk_jobs} bulk jobs of {args.bulk_work_ms:.0f} ms on '{bulk_queue}'")
+    for _ in range(args.bulk_jobs):
+        celery_app.send_task("queue_probe_task", args=[time.time(), args.bulk_work_ms], queue=bulk_queue)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(call(index) for index in range(args.calls)))
+    elapsed = time.perf_counter() - start
+
+    report("turn queue wait", waits)
+    report("turn round trip", round_trips)
+    print(f"failed/expired turns: {failures}, elapsed {elapsed:.1f}s")
+    if args.purge:
+        celery_app.control.purge()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure live-turn queue wait under concurrent calls and bulk load.")
+    parser.add_argument("--calls", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--work-ms", type=float, default=600.0, help="Worker time per turn (STT + LLM stand-in).")
+    parser.add_argument("--think-ms", type=float, default=3000.0, help="Caller speaking time between turns.")
+    parser.add_argument("--ramp", type=float, default=5.0, help="Seconds over which calls arrive.")
+    parser.add_argument("--bulk-jobs", type=int, default=40)
+    parser.add_argument("--bulk-work-ms", type=float, default=2000.0)
+    parser.add_argument("--single-queue", action="store_true", help="Send bulk jobs to the realtime queue, for comparison.")
+    parser.add_argument("--purge", action="store_true", help="Drop bulk jobs still queued when the test ends.")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    asyncio.run(run(parser.parse_args()))
@@ -1,6 +1,5 @@
 import os
 import uuid
-import json
 import time
 import logging
 from dotenv import load_dotenv
@@ -9,6 +8,7 @@ import redis
 # Import the Celery app and the task we want to test
 from celery_worker.celery_app import celery_app
 from celery_worker.tasks import process_call_recording
+from llm.conversation_memory import ConversationMemory
 
 # --- Setup ---
 load_dotenv()
@@ -42,9 +42,7 @@ def run_local_test():
 
     # Initialize a dummy conversation history for the test call
     history_key = f"history:{TEST_CALL_ID}"
-    redis_client.set(history_key, json.dumps([
-        {"role": "assistant", "content": "Hello! How can I help you today?"}
-    ]))
+    ConversationMemory(redis_client).append(TEST_CALL_ID, {"role": "assistant", "content": "Hello! How can I help you today?"})
     logger.info(f"Initialized dummy conversation history in Redis for call ID: {TEST_CALL_ID}")
 
     logger.info(f"Dispatching task for call ID: {TEST_CALL_ID}")
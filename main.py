@@ -2,20 +2,31 @@ import logging
 import os
 import asyncio
 import time
-import subprocess
-import uuid
 import threading
 import aiohttp
-from fastapi import FastAPI, HTTPException, BackgroundTasks
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from groq import Groq
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import Response
 from dotenv import load_dotenv
+import redis
+from llm.conversation_memory import AsyncConversationMemory
+from llm.groq_llm import HISTORY_MAX_TURNS, HISTORY_TOKEN_BUDGET, HISTORY_TTL
 from tts.piper_tts import PiperTTS
+from tts.audio_cache import TTSAudioCache
+from tts.audio_store import DiskAudioStore, create_audio_store
+from tts.groq_tts import GroqTTSClient
+from tts.chunking import split_for_tts, synthesize_in_order
+from tts.prompt_bank import PromptBank
+from tts.provider_router import AllProvidersFailed, CircuitBreaker, TTSProvider, TTSProviderRouter
+from utils.call_playback import play_with_barge_in
+from utils.audio_janitor import AudioJanitor
+from utils.tracing import SpanRecorder, current_trace, new_trace_id
+from utils.transcoder import transcode
 from signalwire.relay.consumer import Consumer
 from signalwire.relay.calling import Call
 from celery_worker.celery_app import celery_app
+from utils.celery_results import CeleryResultWaiter, TaskAborted
 from urllib.parse import quote
+from app.api import router as media_stream_router
 
 # --- Load Environment Variables & Configuration ---
 load_dotenv()
@@ -24,86 +35,127 @@ logger = logging.getLogger("VoiceAgentService")
 
 # --- FastAPI App Setup ---
 app = FastAPI()
+# Live caller audio for relays that set MEDIA_STREAM_URL to this service.
+app.include_router(media_stream_router)
 
 # --- Global Configuration ---
 GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
 TELEPHONY_CODEC = os.environ.get("TELEPHONY_CODEC", "pcm_mulaw")
-OPTIMIZED_AUDIO_DIR = "public_audio"
-RAW_AUDIO_DIR = "temp_raw_audio"
+GROQ_TTS_MODEL = os.environ.get("GROQ_TTS_MODEL", "playai-tts")
+GROQ_TTS_VOICE = os.environ.get("GROQ_TTS_VOICE", "Arista-PlayAI")
+GROQ_TTS_CONCURRENCY = int(os.environ.get("GROQ_TTS_CONCURRENCY", 8))
+GROQ_TTS_TIMEOUT = float(os.environ.get("GROQ_TTS_TIMEOUT", 8.0))
+GROQ_TTS_MAX_CONNECTIONS = int(os.environ.get("GROQ_TTS_MAX_CONNECTIONS", 20))
+# Provider routing: skip a failing provider for a cool-down, optionally hedge slow Groq calls with Piper.
+TTS_BREAKER_FAILURES = int(os.environ.get("TTS_BREAKER_FAILURES", 3))
+TTS_BREAKER_COOLDOWN = float(os.environ.get("TTS_BREAKER_COOLDOWN", 30))
+TTS_HEDGE = os.environ.get("TTS_HEDGE", "false").lower() == "true"
+TTS_HEDGE_DEFAULT_DELAY = float(os.environ.get("TTS_HEDGE_DEFAULT_DELAY", 1.5))
+# Shares breaker state with every other process on the same Redis.
+REDIS_URL = os.environ.get("REDIS_URL")
+AUDIO_STORE_BACKEND = os.environ.get("AUDIO_STORE_BACKEND", "memory")
+AUDIO_STORE_MAX_BYTES = int(os.environ.get("AUDIO_STORE_MAX_BYTES", 128 * 1024 * 1024))
+AUDIO_STORE_TTL = float(os.environ.get("AUDIO_STORE_TTL", 600))
+AUDIO_STORE_DIR = os.environ.get("AUDIO_STORE_DIR", os.path.join("public_audio", "cache"))
+AUDIO_STORE_DISK_MAX_BYTES = int(os.environ.get("AUDIO_STORE_DISK_MAX_BYTES", 200 * 1024 * 1024))
+AUDIO_STORE_DISK_TTL = float(os.environ.get("AUDIO_STORE_DISK_TTL", 24 * 3600))
+# The TTS cache also writes every primary-voice clip here (LRU, bounded by the janitor), so
+# cached prompts survive restarts and quiet spells whichever backend serves /audio.
+TTS_CACHE_DIR = os.environ.get("TTS_CACHE_DIR", os.path.join("public_audio", "cache", "tts"))
+AUDIO_JANITOR_INTERVAL = float(os.environ.get("AUDIO_JANITOR_INTERVAL", 60))
+PROMPT_BANK_DIR = os.environ.get("PROMPT_BANK_DIR", "prompt_bank")
 SIGNALWIRE_PROJECT_ID = os.environ.get("SIGNALWIRE_PROJECT_ID")
 SIGNALWIRE_API_TOKEN = os.environ.get("SIGNALWIRE_API_TOKEN")
 SIGNALWIRE_CONTEXT = os.environ.get("SIGNALWIRE_CONTEXT", "voiceai")
 # The TTS_ORCHESTRATOR_URL is now the service's own public URL,
 # which we will get from the Render environment at runtime.
 TTS_ORCHESTRATOR_URL = os.environ.get("RENDER_EXTERNAL_URL")
+TTS_CHUNKED_PLAYBACK = os.environ.get("TTS_CHUNKED_PLAYBACK", "true").lower() == "true"
 
 # --- Service Clients ---
-groq_client = Groq(api_key=GROQ_API_KEY)
+# One pooled client shared by the FastAPI endpoints and the relay consumer thread.
+groq_tts_client = GroqTTSClient(
+    api_key=GROQ_API_KEY,
+    model=GROQ_TTS_MODEL,
+    voice=GROQ_TTS_VOICE,
+    max_concurrency=GROQ_TTS_CONCURRENCY,
+    timeout=GROQ_TTS_TIMEOUT,
+    max_connections=GROQ_TTS_MAX_CONNECTIONS,
+)
 piper_tts_service = PiperTTS()
 
-# --- Directory Setup ---
-for directory in [RAW_AUDIO_DIR, OPTIMIZED_AUDIO_DIR]:
-    if not os.path.exists(directory):
-        os.makedirs(directory)
-        logger.info(f"Created audio directory: {directory}")
-
-app.mount("/audio", StaticFiles(directory=OPTIMIZED_AUDIO_DIR), name="audio")
+async def synthesize_with_piper(text: str) -> bytes:
+    if not piper_tts_service.available:
+        await piper_tts_service.initialize()
+    return await piper_tts_service.text_to_speech(text)
+
+breaker_redis = redis.from_url(REDIS_URL, socket_timeout=0.2, socket_connect_timeout=0.2) if REDIS_URL else None
+tts_providers = []
+if GROQ_API_KEY:
+    tts_providers.append(TTSProvider(
+        "groq", groq_tts_client.synthesize,
+        CircuitBreaker("groq", TTS_BREAKER_FAILURES, TTS_BREAKER_COOLDOWN, redis_client=breaker_redis),
+    ))
+# Piper runs in-process, so its health is not shared with other hosts.
+tts_providers.append(TTSProvider("piper", synthesize_with_piper, CircuitBreaker("piper", TTS_BREAKER_FAILURES, TTS_BREAKER_COOLDOWN)))
+tts_router = TTSProviderRouter(tts_providers, hedge=TTS_HEDGE, hedge_default_delay=TTS_HEDGE_DEFAULT_DELAY)
+
+# Celery results are awaited over Redis pub/sub so one caller's turn never blocks the consumer loop.
+celery_results = CeleryResultWaiter(celery_app)
+# One trace per turn, shared with the Celery worker; TTS spans pick it up from the turn's context.
+tracer = SpanRecorder("agent", REDIS_URL)
+# The worker reads and extends it each turn (on its own default Redis if REDIS_URL is unset);
+# the consumer clears it when the call starts and ends.
+memory = AsyncConversationMemory(REDIS_URL or "redis://localhost:6379/0", HISTORY_MAX_TURNS, HISTORY_TOKEN_BUDGET, HISTORY_TTL)
+
+# Shared by the FastAPI /audio handler and the consumer thread that fills it.
+audio_janitor = AudioJanitor(
+    [AUDIO_STORE_DIR, TTS_CACHE_DIR],
+    ttl=AUDIO_STORE_DISK_TTL,
+    max_bytes=AUDIO_STORE_DISK_MAX_BYTES,
+    interval=AUDIO_JANITOR_INTERVAL,
+)
+audio_store = create_audio_store(
+    AUDIO_STORE_BACKEND,
+    max_bytes=AUDIO_STORE_MAX_BYTES,
+    ttl=AUDIO_STORE_TTL,
+    directory=AUDIO_STORE_DIR,
+    janitor=audio_janitor,
+)
+# With the "disk" backend the served clips are already on disk; the cache needs no second copy.
+tts_cache = TTSAudioCache(audio_store, disk=None if AUDIO_STORE_BACKEND == "disk" else DiskAudioStore(TTS_CACHE_DIR, audio_janitor))
 
 # --- TTS Generation Logic (from tts_orchestrator.py) ---
-def cleanup_file(path: str):
+async def generate_tts_audio(text: str) -> str:
+    primary_provider = "groq" if GROQ_API_KEY else "piper"
+    clip_id = await tts_cache.get_or_generate(
+        text, primary_provider, GROQ_TTS_VOICE, TELEPHONY_CODEC,
+        lambda: synthesize_telephony_audio(text),
+    )
+    return f"{clip_id}.wav"
+
+async def synthesize_telephony_audio(text: str) -> tuple[bytes, str]:
     try:
-        if os.path.exists(path): os.remove(path)
-        logger.info(f"Cleaned up file: {path}")
-    except Exception as e:
-        logger.error(f"Error cleaning up file {path}: {e}")
-
-async def generate_tts_audio(text: str, background_tasks: BackgroundTasks) -> str:
-    request_id = str(uuid.uuid4())
-    raw_filepath = os.path.join(RAW_AUDIO_DIR, f"{request_id}_raw.wav")
-    optimized_filename = f"{request_id}_optimized.wav"
-    optimized_filepath = os.path.join(OPTIMIZED_AUDIO_DIR, optimized_filename)
-    
-    background_tasks.add_task(asyncio.sleep, 600)
-    background_tasks.add_task(cleanup_file, raw_filepath)
-    background_tasks.add_task(cleanup_file, optimized_filepath)
-
-    generation_success = False
-    if GROQ_API_KEY:
-        try:
-            logger.info(f"Attempting Groq TTS for text: '{text[:30]}...'")
-            tts_start_time = time.monotonic()
-            tts_response = groq_client.audio.speech.create(model="playai-tts", voice="Arista-PlayAI", input=text)
-            tts_response.write_to_file(raw_filepath)
-            tts_end_time = time.monotonic()
-            tts_latency = (tts_end_time - tts_start_time) * 1000
-            logger.info(f"Groq TTS Latency: {tts_latency:.2f} ms")
-            generation_success = True
-        except Exception as e:
-            logger.error(f"Groq TTS failed: {e}", exc_info=True)
-
-    if not generation_success:
-        try:
-            logger.info("Attempting Piper TTS fallback.")
-            if not piper_tts_service.model: await piper_tts_service.initialize()
-            audio_bytes = await piper_tts_service.text_to_speech(text)
-            if audio_bytes:
-                with open(raw_filepath, "wb") as f: f.write(audio_bytes)
-                generation_success = True
-        except Exception as e:
-            logger.error(f"Piper TTS fallback failed: {e}", exc_info=True)
-            raise HTTPException(status_code=500, detail="All TTS providers failed.")
-
-    ffmpeg_start_time = time.monotonic()
-    command = ["ffmpeg", "-i", raw_filepath, "-ar", "8000", "-ac", "1", "-acodec", TELEPHONY_CODEC, "-y", optimized_filepath]
-    process = await asyncio.create_subprocess_exec(*command, stderr=asyncio.subprocess.PIPE)
-    _, stderr = await process.communicate()
-    if process.returncode != 0:
-        raise Exception(f"ffmpeg failed: {stderr.decode()}")
-    ffmpeg_end_time = time.monotonic()
-    ffmpeg_latency = (ffmpeg_end_time - ffmpeg_start_time) * 1000
-    logger.info(f"ffmpeg Transcoding Latency: {ffmpeg_latency:.2f} ms")
-        
-    return optimized_filename
+        with tracer.span("tts", chars=len(text)) as span:
+            raw_audio, provider_used = await tts_router.synthesize(text)
+            span["provider"] = provider_used
+    except AllProvidersFailed as e:
+        logger.error(str(e))
+        raise HTTPException(status_code=500, detail="All TTS providers failed.")
+
+    with tracer.span("transcode", codec=TELEPHONY_CODEC):
+        optimized_audio = await transcode(raw_audio, TELEPHONY_CODEC)
+    return optimized_audio, provider_used
+
+async def render_prompt(text: str) -> bytes:
+    optimized_audio, provider_used = await synthesize_telephony_audio(text)
+    primary_provider = "groq" if GROQ_API_KEY else "piper"
+    if provider_used != primary_provider:
+        # Same rule as the TTS cache: never pin fallback audio under the primary voice.
+        raise RuntimeError(f"Prompt rendered by fallback provider '{provider_used}'.")
+    return optimized_audio
+
+prompt_bank = PromptBank(render_prompt, fingerprint=f"{GROQ_TTS_MODEL}:{GROQ_TTS_VOICE}:{TELEPHONY_CODEC}")
 
 # --- SignalWire Relay Logic (from relay_server.py) ---
 class VoiceAIAgent(Consumer):
@@ -113,8 +165,13 @@ class VoiceAIAgent(Consumer):
         self.contexts = [SIGNALWIRE_CONTEXT]
     
     async def ready(self):
+        # The Redis client must be created on the consumer's own loop.
+        memory.open()
         logger.info(f"✅ SignalWire Consumer ready on context '{SIGNALWIRE_CONTEXT}'")
 
+    def teardown(self):
+        self.client.loop.run_until_complete(memory.close())
+
     async def on_incoming_call(self, call: Call):
         logger.info(f"📞 Incoming call {call.id} from {call.from_number}.")
         await call.answer()
@@ -123,8 +180,9 @@ class VoiceAIAgent(Consumer):
     async def handle_conversation(self, call: Call):
         logger.info(f"[{call.id}] Starting conversation.")
         try:
+            memory.start_soon(call.id)
             # The play_tts_response function now returns a recording if a barge-in occurs.
-            barge_in_recording = await self.play_tts_response(call, "Hello! Thank you for calling. How can I help you today?", use_groq_pipeline=False)
+            barge_in_recording = await self.play_prompt(call, "greeting")
             
             recording_to_process = barge_in_recording
 
@@ -140,9 +198,20 @@ class VoiceAIAgent(Consumer):
                     recording_to_process = None # Reset for the next loop
                     continue
                 
-                # We have a recording, send it to Celery.
-                task = celery_app.send_task("get_llm_response_task", args=[call.id, recording_to_process.url])
-                llm_response_text = task.get(timeout=15)
+                # We have a recording, send it to Celery under a fresh trace for this turn.
+                recorded_at = time.time()
+                current_trace.set(new_trace_id())
+                task = celery_app.send_task(
+                    "get_llm_response_task",
+                    args=[call.id, recording_to_process.url],
+                    kwargs={"trace_id": current_trace.get(), "recorded_at": recorded_at},
+                    expires=15,
+                )
+                try:
+                    llm_response_text = await celery_results.wait(task.id, timeout=15, abort_on=call.wait_for_ended())
+                except TaskAborted:
+                    logger.info(f"[{call.id}] Caller hung up while waiting for the LLM response.")
+                    break
                 
                 # Reset for the next loop.
                 recording_to_process = None
@@ -152,73 +221,118 @@ class VoiceAIAgent(Consumer):
                     continue
                 
                 # Play the LLM response and listen for the next barge-in.
-                recording_to_process = await self.play_tts_response(call, llm_response_text, use_groq_pipeline=True)
+                recording_to_process = await self.play_tts_response(call, llm_response_text, use_groq_pipeline=True, recorded_at=recorded_at)
         except Exception as e:
             logger.error(f"[{call.id}] Unhandled exception in conversation: {e}", exc_info=True)
         finally:
             logger.info(f"[{call.id}] Conversation ended.")
-
-    async def play_tts_response(self, call: Call, text: str, use_groq_pipeline: bool = True):
-        logger.info(f"[{call.id}] Playing TTS for: '{text[:30]}...'. Using Groq Pipeline: {use_groq_pipeline}")
-        
-        play_finished_event = asyncio.Event()
-        record_finished_event = asyncio.Event()
-
-        async def on_play_finished(action):
-            play_finished_event.set()
-
-        async def on_record_finished(action):
-            record_finished_event.set()
-
+            try:
+                await memory.end(call.id)
+            except Exception as e:
+                logger.warning(f"[{call.id}] Could not clear conversation memory: {e}")
+
+    async def _groq_pipeline_audio(self, text: str):
+        """Yields playable media for `text`; in chunked mode all chunks generate concurrently."""
+        chunks = split_for_tts(text) if TTS_CHUNKED_PLAYBACK else [text]
+        async for filename in synthesize_in_order(chunks, generate_tts_audio):
+            yield {"type": "audio", "url": f"{TTS_ORCHESTRATOR_URL}/audio/{filename}"}
+
+    async def _signalwire_tts_audio(self, text: str):
+        yield {"type": "tts", "text": text}
+
+    async def _prompt_audio(self, prompt_id: str):
+        yield {"type": "audio", "url": prompt_bank.url(TTS_ORCHESTRATOR_URL, prompt_id)}
+
+    async def _play_media(self, call: Call, media, mode: str, recorded_at: float | None = None):
+        turn_start = time.monotonic()
+        turn_started_at = time.time()
         try:
-            call.on('play.finished', on_play_finished)
-            call.on('play.error', on_play_finished)
-            call.on('record.finished', on_record_finished)
-
-            if use_groq_pipeline:
-                background_tasks = BackgroundTasks()
-                filename = await generate_tts_audio(text, background_tasks)
-                final_audio_url = f"{TTS_ORCHESTRATOR_URL}/audio/{filename}"
-                play_action = await call.play_audio_async(url=final_audio_url)
-            else:
-                play_action = await call.play_tts_async(text=text)
-
-            record_action = await call.record_async(beep=False, end_silence_timeout=1.0)
-
-            play_waiter = asyncio.create_task(play_finished_event.wait())
-            record_waiter = asyncio.create_task(record_finished_event.wait())
-            
-            done, pending = await asyncio.wait([play_waiter, record_waiter], return_when=asyncio.FIRST_COMPLETED)
+            playback = await play_with_barge_in(call, media, turn_start)
 
-            for task in pending:
-                task.cancel()
-
-            if record_waiter in done:
-                logger.info(f"[{call.id}] Barge-in detected. Stopping playback.")
-                await play_action.stop()
-                # CRITICAL FIX: Wait for the recording to complete to get the final result with the URL.
-                return await record_action.completed
-            else:
-                logger.info(f"[{call.id}] Playback finished. Stopping listener.")
-                await record_action.stop()
-                return None
+            if playback.time_to_first_audio_ms is not None:
+                logger.info(f"[{call.id}] Time-to-first-audio ({mode}): {playback.time_to_first_audio_ms:.2f} ms, "
+                            f"{playback.chunks_played} chunk(s) played, barge-in: {playback.barged_in}")
+                if recorded_at is not None:
+                    tracer.record("first_audio", playback.time_to_first_audio_ms, start=turn_started_at, call_id=call.id, mode=mode)
+                    turn_ms = (turn_started_at - recorded_at) * 1000 + playback.time_to_first_audio_ms
+                    tracer.record("turn", turn_ms, start=recorded_at, call_id=call.id, mode=mode)
+            return playback.recording
 
         except Exception as e:
             logger.error(f"[{call.id}] Failed to play TTS response: {e}", exc_info=True)
-            await call.play_tts(text="I am sorry, a system error occurred.")
+            await self.play_system_error(call)
             return None
-        finally:
-            call.off('play.finished', on_play_finished)
-            call.off('play.error', on_play_finished)
-            call.off('record.finished', on_record_finished)
+
+    async def play_tts_response(self, call: Call, text: str, use_groq_pipeline: bool = True, recorded_at: float | None = None):
+        logger.info(f"[{call.id}] Playing TTS for: '{text[:30]}...'. Using Groq Pipeline: {use_groq_pipeline}")
+        mode = "chunked" if use_groq_pipeline and TTS_CHUNKED_PLAYBACK else "monolithic"
+        media = self._groq_pipeline_audio(text) if use_groq_pipeline else self._signalwire_tts_audio(text)
+        return await self._play_media(call, media, mode, recorded_at)
+
+    async def play_prompt(self, call: Call, prompt_id: str):
+        """Plays a pre-rendered prompt from the bank, falling back to SignalWire TTS if it failed to render."""
+        if prompt_bank.get(prompt_id) is None:
+            return await self.play_tts_response(call, prompt_bank.text(prompt_id), use_groq_pipeline=False)
+        logger.info(f"[{call.id}] Playing prompt '{prompt_id}'.")
+        return await self._play_media(call, self._prompt_audio(prompt_id), "prompt")
+
+    async def play_system_error(self, call: Call):
+        if prompt_bank.get("system_error") is not None:
+            await call.play_audio(url=prompt_bank.url(TTS_ORCHESTRATOR_URL, "system_error"))
+        else:
+            await call.play_tts(text=prompt_bank.text("system_error"))
 
 # --- FastAPI Endpoints and Startup Logic ---
 @app.get("/generate-audio")
-async def get_generated_audio_url(text: str, background_tasks: BackgroundTasks):
+async def get_generated_audio_url(text: str):
     if not text: raise HTTPException(status_code=400, detail="Text is required.")
-    filename = await generate_tts_audio(text, background_tasks)
+    filename = await generate_tts_audio(text)
     return {"success": True, "filename": filename}
 
+@app.get("/audio/{clip_id}.wav")
+def get_audio_clip(clip_id: str):
+    audio = audio_store.get(clip_id)
+    if audio is None: raise HTTPException(status_code=404, detail="Audio clip not found or expired.")
+    return Response(content=audio, media_type="audio/wav")
+
+@app.get("/cache/stats")
+def get_cache_stats():
+    return tts_cache.stats()
+
+@app.get("/tts/stats")
+def get_tts_stats():
+    return {"groq": groq_tts_client.stats(), "piper": piper_tts_service.stats(), "cache": tts_cache.stats(),
+            "router": tts_router.stats(), "tracing": tracer.stats()}
+
+@app.on_event("startup")
+async def preload_piper_voices():
+    await piper_tts_service.initialize()
+
+@app.on_event("startup")
+async def load_prompt_bank():
+    await prompt_bank.load(PROMPT_BANK_DIR)
+
+@app.on_event("startup")
+def start_audio_janitor():
+    audio_janitor.start()
+
+@app.on_event("shutdown")
+async def close_tts_clients():
+    await groq_tts_client.aclose()
+    await piper_tts_service.cleanup()
+    audio_janitor.stop()
+    tracer.close()
+
+@app.get("/janitor/stats")
+def get_janitor_stats():
+    return audio_janitor.stats()
+
+@app.get("/prompts/{prompt_id}.wav")
+async def get_prompt_audio(prompt_id: str):
+    audio = await prompt_bank.ensure(prompt_id)
+    if audio is None: raise HTTPException(status_code=404, detail=f"Unknown or unavailable prompt: {prompt_id}")
+    return Response(content=audio, media_type="audio/wav")
+
 @app.get("/")
 def read_root():
     return {"message": "Voice Agent Service is running."}
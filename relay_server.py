@@ -10,6 +10,7 @@ from dotenv import load_dotenv
 import redis
 import json
 import time
+from typing import AsyncIterator
 from urllib.parse import quote
 
 # --- Load Environment Variables ---
@@ -18,7 +19,20 @@ load_dotenv()
 # --- Imports and Config ---
 from signalwire.relay.consumer import Consumer
 from signalwire.relay.calling import Call
+from app.websocket_audio import UtteranceInbox
 from celery_worker.celery_app import celery_app
+from utils.celery_results import CeleryResultWaiter, TaskAborted
+from utils.admission import ADMITTED, REJECTED, AdmissionController
+from utils.call_lease import CallLeases
+from utils.call_playback import LatencyMask, play_on_loop, play_with_barge_in
+from utils.http_pool import PooledHTTPSession
+from utils.inline_pipeline import InlinePipeline
+from llm.conversation_memory import AsyncConversationMemory
+from llm.groq_llm import HISTORY_MAX_TURNS, HISTORY_TOKEN_BUDGET, HISTORY_TTL
+from utils.reply_stream import ReplyStreamReader
+from tts.chunking import synthesize_as_ready
+from utils.tracing import SpanRecorder, new_trace_id
+from tts.prompt_bank import FILLER_PROMPT_IDS, PROMPTS, prompt_path
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger("AuraVoice")
@@ -27,8 +41,40 @@ SIGNALWIRE_PROJECT_ID = os.environ.get("SIGNALWIRE_PROJECT_ID")
 SIGNALWIRE_API_TOKEN = os.environ.get("SIGNALWIRE_API_TOKEN")
 SIGNALWIRE_CONTEXT = os.environ.get("SIGNALWIRE_CONTEXT", "voiceai")
 REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
+# "inline" runs each turn's download, STT and LLM on this relay's loop; "celery" hands them to
+# the worker, which remains the place for CPU-heavy local models.
+PIPELINE_MODE = os.environ.get("PIPELINE_MODE", "celery")
+INLINE_MAX_CONCURRENCY = int(os.environ.get("INLINE_MAX_CONCURRENCY", 16))
+# In celery mode, have the worker stream the reply sentence by sentence and synthesize each
+# sentence as it arrives, instead of waiting for the whole completion.
+LLM_STREAMING = os.environ.get("LLM_STREAMING", "true").lower() == "true"
 # This will now be the URL provided by Render for your TTS orchestrator
 TTS_ORCHESTRATOR_URL = os.environ.get("TTS_ORCHESTRATOR_URL")
+# Chunked mode plays the first sentence while the rest of the reply is still being synthesized.
+TTS_CHUNKED_PLAYBACK = os.environ.get("TTS_CHUNKED_PLAYBACK", "true").lower() == "true"
+# Shared keep-alive pool for outbound HTTP; size per-host limits against concurrent calls.
+HTTP_POOL_LIMIT = int(os.environ.get("HTTP_POOL_LIMIT", 100))
+HTTP_POOL_LIMIT_PER_HOST = int(os.environ.get("HTTP_POOL_LIMIT_PER_HOST", 50))
+HTTP_KEEPALIVE_TIMEOUT = float(os.environ.get("HTTP_KEEPALIVE_TIMEOUT", 30))
+# wss:// base of the media-stream ingest (app/api.py). When set, caller audio is tapped and
+# endpointed live instead of recorded and downloaded each turn.
+MEDIA_STREAM_URL = os.environ.get("MEDIA_STREAM_URL")
+# Admission control: conversations this relay runs at once, and the worker load (turns in
+# flight across relays, tasks queued in the broker) above which new callers are held.
+MAX_ACTIVE_CALLS = int(os.environ.get("MAX_ACTIVE_CALLS", 20))
+ADMISSION_MAX_INFLIGHT_TURNS = int(os.environ.get("ADMISSION_MAX_INFLIGHT_TURNS", 16))
+ADMISSION_MAX_QUEUE_DEPTH = int(os.environ.get("ADMISSION_MAX_QUEUE_DEPTH", 8))
+ADMISSION_QUEUES = os.environ.get("ADMISSION_QUEUES", "realtime").split(",")
+# Held callers hear the hold prompt; past these limits they hear the busy prompt and are hung up on.
+ADMISSION_MAX_WAITING = int(os.environ.get("ADMISSION_MAX_WAITING", 10))
+ADMISSION_MAX_WAIT = float(os.environ.get("ADMISSION_MAX_WAIT", 30))
+# Every relay on the context gets each call; a Redis lease decides which one handles it.
+# A relay that dies stops renewing, and its leases expire after this many seconds.
+CALL_LEASE_TTL = float(os.environ.get("CALL_LEASE_TTL", 15))
+# A short filler prompt plays when a reply has no audio this many seconds after the caller stopped.
+FILLER_ENABLED = os.environ.get("FILLER_ENABLED", "true").lower() == "true"
+FILLER_THRESHOLD = float(os.environ.get("FILLER_THRESHOLD", 1.0))
 
 # --- Service Clients ---
 try:
@@ -38,109 +84,377 @@ try:
 except Exception as e:
     logger.critical(f"FATAL: Could not connect to Redis: {e}", exc_info=True)
     sys.exit(1)
+celery_results = CeleryResultWaiter(celery_app, REDIS_URL)
+# One trace per turn; the worker and the orchestrator add their spans to it.
+tracer = SpanRecorder("relay", REDIS_URL)
+utterances = UtteranceInbox(REDIS_URL)
+reply_streams = ReplyStreamReader(REDIS_URL)
+admission = AdmissionController(
+    REDIS_URL,
+    max_active_calls=MAX_ACTIVE_CALLS,
+    max_waiting=ADMISSION_MAX_WAITING,
+    max_wait=ADMISSION_MAX_WAIT,
+    max_inflight_turns=ADMISSION_MAX_INFLIGHT_TURNS,
+    max_queue_depth=ADMISSION_MAX_QUEUE_DEPTH,
+    queues=ADMISSION_QUEUES,
+)
+call_leases = CallLeases(REDIS_URL, ttl=CALL_LEASE_TTL)
+# Inline turns read and extend it, as the worker does; the relay clears it when the call starts and ends.
+memory = AsyncConversationMemory(REDIS_URL, HISTORY_MAX_TURNS, HISTORY_TOKEN_BUDGET, HISTORY_TTL)
+latency_mask = LatencyMask(
+    [f"{TTS_ORCHESTRATOR_URL}{prompt_path(prompt_id)}" for prompt_id in FILLER_PROMPT_IDS],
+    threshold=FILLER_THRESHOLD,
+    enabled=FILLER_ENABLED,
+)
 
 class VoiceAIAgent(Consumer):
     def setup(self):
         self.project = SIGNALWIRE_PROJECT_ID
         self.token = SIGNALWIRE_API_TOKEN
         self.contexts = [SIGNALWIRE_CONTEXT]
-        self._processing_calls = set()
+        self._streamed_calls = set()
+        self.http = PooledHTTPSession(
+            limit=HTTP_POOL_LIMIT,
+            limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+            keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+        )
+        self.inline_pipeline = InlinePipeline(
+            GROQ_API_KEY, self.http, tracer,
+            recording_auth=aiohttp.BasicAuth(SIGNALWIRE_PROJECT_ID or "", SIGNALWIRE_API_TOKEN or ""),
+            memory=memory,
+            max_concurrency=INLINE_MAX_CONCURRENCY,
+        )
 
     async def ready(self):
+        # The session must be created on the consumer's own loop.
+        self.http.open()
+        if PIPELINE_MODE == "inline":
+            self.inline_pipeline.open()
+        utterances.open()
+        reply_streams.open()
+        admission.open()
+        call_leases.open()
+        memory.open()
         logger.info(f"✅ Consumer ready on context '{SIGNALWIRE_CONTEXT}'")
 
+    def teardown(self):
+        self.client.loop.run_until_complete(self.inline_pipeline.close())
+        self.client.loop.run_until_complete(self.http.close())
+        self.client.loop.run_until_complete(utterances.close())
+        self.client.loop.run_until_complete(reply_streams.close())
+        self.client.loop.run_until_complete(admission.close())
+        self.client.loop.run_until_complete(call_leases.close())
+        self.client.loop.run_until_complete(memory.close())
+        tracer.close()
+
     async def run_in_background(self):
         """A wrapper to run the consumer's blocking run() method in an async-friendly way."""
         loop = asyncio.get_event_loop()
         await loop.run_in_executor(None, self.run)
 
     async def on_incoming_call(self, call: Call):
-        if call.id in self._processing_calls:
+        if not await call_leases.acquire(call.id):
+            logger.info(f"[{call.id}] Ignoring event; the call is owned by another relay or already being handled.")
             return
-        self._processing_calls.add(call.id)
         logger.info(f"📞 Incoming call {call.id} from {call.from_number}.")
         try:
             await call.answer()
-            asyncio.create_task(self.handle_conversation(call))
+            asyncio.create_task(self.handle_conversation(call, answered_at=time.time()))
         except Exception as e:
             logger.error(f"Error in on_incoming_call for {call.id}: {e}", exc_info=True)
-            self._processing_calls.remove(call.id)
+            await call_leases.release(call.id)
+
+    async def admit(self, call: Call) -> bool:
+        """Holds the caller on the hold prompt until there is capacity; turns them away if none frees up."""
+        decision = await admission.acquire(
+            call.id,
+            hold=lambda: play_on_loop(call, f"{TTS_ORCHESTRATOR_URL}{prompt_path('hold')}", PROMPTS["hold"]),
+            abort_on=call.wait_for_ended(),
+        )
+        if decision == ADMITTED:
+            return True
+        if decision == REJECTED and call.active:
+            await call.play_audio(url=f"{TTS_ORCHESTRATOR_URL}{prompt_path('busy')}")
+            await call.hangup()
+        return False
 
-    async def handle_conversation(self, call: Call):
+    async def start_media_stream(self, call: Call) -> bool:
+        """Taps the caller's audio to the media-stream ingest; False means record turns instead."""
+        if not MEDIA_STREAM_URL:
+            return False
+        try:
+            tap = await call.tap_async(
+                audio_direction="listen", target_type="ws",
+                target_uri=f"{MEDIA_STREAM_URL}/media-stream/{call.id}", codec="PCMU", rate=8000,
+            )
+        except Exception as e:
+            logger.error(f"[{call.id}] Could not start the media stream: {e}", exc_info=True)
+            return False
+        if tap.completed:
+            logger.error(f"[{call.id}] Media stream tap was rejected; falling back to recording turns.")
+            return False
+        self._streamed_calls.add(call.id)
+        logger.info(f"[{call.id}] Streaming caller audio to {MEDIA_STREAM_URL}.")
+        return True
+
+    def _barge_in_listener(self, call: Call):
+        """On streamed calls the next utterance is the barge-in; otherwise playback arms a recorder."""
+        if call.id not in self._streamed_calls:
+            return None
+        return lambda: utterances.next(call.id, timeout=0)
+
+    async def _barge_in_listener_after(self, call: Call, media_stream: asyncio.Future):
+        """`_barge_in_listener`, once the media stream tap has been answered."""
+        await asyncio.shield(media_stream)
+        return self._barge_in_listener(call)
+
+    async def handle_conversation(self, call: Call, answered_at: float | None = None):
         logger.info(f"[{call.id}] Starting conversation.")
+        media_stream = None
         try:
-            # Dynamically generate the welcome message using our robust, ffmpeg-powered TTS pipeline.
-            # This is the most reliable method and ensures perfect audio quality.
-            await self.play_tts_response(call, "Hello! Thank you for calling. How can I help you today?")
+            admit_start = time.time()
+            if not await self.admit(call):
+                return
+            hold_ms = (time.time() - admit_start) * 1000
+            memory.start_soon(call.id)
+            # The greeting's play request goes out alongside the tap request; only the choice of
+            # barge-in listener waits for the tap, and the first turn starts once both are done.
+            media_stream = asyncio.ensure_future(self.start_media_stream(call))
+            barge_in = await self.play_prompt(call, "greeting", answered_at=answered_at, hold_ms=hold_ms,
+                                              listen_ready=asyncio.ensure_future(self._barge_in_listener_after(call, media_stream)))
+            streaming = await media_stream
 
             while call.active:
-                logger.info(f"[{call.id}] Listening for user input...")
-                record_action = await call.record(beep=False, end_silence_timeout=0.8, record_format='wav')
-                
-                if not record_action.url:
+                if barge_in:
+                    turn_input, barge_in = barge_in, None
+                elif streaming:
+                    turn_input = await utterances.next(call.id, timeout=30, abort_on=call.wait_for_ended())
+                    if not turn_input:
+                        continue
+                else:
+                    logger.info(f"[{call.id}] Listening for user input...")
+                    turn_input = await call.record(beep=False, end_silence_timeout=0.8, record_format='wav')
+
+                if isinstance(turn_input, dict):
+                    # Already endpointed and transcribed by the media-stream ingest, which started the trace.
+                    trace_id, recorded_at = turn_input["trace_id"], turn_input["recorded_at"]
+                    recording_url, text = None, turn_input["text"]
+                    logger.info(f"[{call.id}] Heard '{text[:50]}'. Getting LLM response ({PIPELINE_MODE}, trace {trace_id}).")
+                elif not turn_input.url:
                     logger.warning(f"[{call.id}] Recording was empty or failed.")
                     continue
-
-                logger.info(f"[{call.id}] Recording complete. Getting LLM response from worker.")
-                task = celery_app.send_task("get_llm_response_task", args=[call.id, record_action.url])
-                llm_response_text = task.get(timeout=15) # Wait for the LLM result
+                else:
+                    recorded_at = time.time()
+                    trace_id = new_trace_id()
+                    recording_url, text = turn_input.url, None
+                    logger.info(f"[{call.id}] Recording complete. Getting LLM response ({PIPELINE_MODE}, trace {trace_id}).")
+                masked = latency_mask.arm(call, recorded_at)
+                try:
+                    # Wait for the LLM result without blocking other calls on this loop.
+                    async with admission.turn(call.id):
+                        llm_response_text = await self.request_reply(call, recording_url, text, trace_id, recorded_at)
+                except TaskAborted:
+                    masked.cancel()
+                    logger.info(f"[{call.id}] Caller hung up while waiting for the LLM response.")
+                    break
+                except BaseException:
+                    masked.cancel()
+                    raise
 
                 if not llm_response_text:
+                    masked.cancel()
                     logger.error(f"[{call.id}] Worker failed to produce LLM text.")
                     continue
 
-                logger.info(f"[{call.id}] Received LLM response: '{llm_response_text[:50]}...'")
-                await self.play_tts_response(call, llm_response_text)
+                if isinstance(llm_response_text, str):
+                    logger.info(f"[{call.id}] Received LLM response: '{llm_response_text[:50]}...'")
+                barge_in = await self.play_tts_response(call, llm_response_text, trace_id, recorded_at, masked)
         
         except Exception as e:
             logger.error(f"[{call.id}] Unhandled exception in conversation: {e}", exc_info=True)
         finally:
             logger.info(f"[{call.id}] Conversation ended.")
-            self._processing_calls.remove(call.id)
+            try:
+                await memory.end(call.id)
+            except Exception as e:
+                logger.warning(f"[{call.id}] Could not clear conversation memory: {e}")
+            admission.release(call.id)
+            await call_leases.release(call.id)
+            if media_stream is not None and not media_stream.done():
+                media_stream.cancel()
+            if call.id in self._streamed_calls:
+                self._streamed_calls.discard(call.id)
+                try:
+                    await utterances.discard(call.id)
+                except Exception as e:
+                    logger.warning(f"[{call.id}] Could not discard queued utterances: {e}")
+
+    async def request_reply(self, call: Call, recording_url: str | None, text: str | None, trace_id: str, recorded_at: float):
+        """
+        The reply text for a recording or an already-transcribed utterance,
+        computed on this loop in inline mode or by a Celery worker otherwise.
+        Raises TaskAborted if the caller hangs up first.
+        """
+        if PIPELINE_MODE == "inline":
+            return await self.inline_pipeline.reply(
+                call.id, recording_url=recording_url, text=text, trace_id=trace_id, recorded_at=recorded_at,
+                timeout=15, abort_on=call.wait_for_ended(),
+            )
+        kwargs = {"trace_id": trace_id, "recorded_at": recorded_at, "stream": LLM_STREAMING}
+        if text is not None:
+            task = celery_app.send_task("get_llm_reply_task", args=[call.id, text], kwargs=kwargs, expires=15)
+        else:
+            task = celery_app.send_task("get_llm_response_task", args=[call.id, recording_url], kwargs=kwargs, expires=15)
+        if LLM_STREAMING:
+            return await self._first_sentence(call, reply_streams.sentences(task.id, timeout=15, abort_on=call.wait_for_ended()))
+        return await celery_results.wait(task.id, timeout=15, abort_on=call.wait_for_ended())
 
-    async def play_tts_response(self, call: Call, text: str):
-        """Calls the TTS orchestrator to get a playable URL and plays it on the call."""
-        logger.info(f"[{call.id}] Entering play_tts_response for text: '{text[:30]}...'")
+    async def _first_sentence(self, call: Call, sentences: AsyncIterator[str]) -> AsyncIterator[str] | None:
+        """Waits for a streaming reply's first sentence; the whole reply, or None if it is empty."""
         try:
-            encoded_text = quote(text)
-            generation_url = f"{TTS_ORCHESTRATOR_URL}/generate-audio?text={encoded_text}"
-            
-            logger.info(f"[{call.id}] Step 1: Requesting audio from orchestrator: {generation_url}")
-            async with aiohttp.ClientSession() as session:
-                async with session.get(generation_url) as response:
-                    if response.status != 200:
-                        error_text = await response.text()
-                        logger.error(f"TTS orchestrator returned an error: {response.status} - {error_text}")
-                        raise Exception("TTS orchestrator failed.")
-                    
-                    response_json = await response.json()
-                    filename = response_json.get("filename")
-
-            if not filename:
-                raise Exception("TTS orchestrator did not return a valid filename.")
-
-            final_audio_url = f"{TTS_ORCHESTRATOR_URL}/audio/{filename}"
-            logger.info(f"[{call.id}] Step 2: Successfully got audio URL: {final_audio_url}")
-            
-            # Implement barge-in logic
-            logger.info(f"[{call.id}] Step 3: Initiating playback and concurrent recording (barge-in).")
-            play_action = await call.play_audio_async(url=final_audio_url)
-            listen_action = await call.record_async(beep=False, end_silence_timeout=1.0)
-            
-            await asyncio.wait(
-                [play_action.wait_for_completed(), listen_action.wait_for_completed()],
-                return_when=asyncio.FIRST_COMPLETED
+            first = await sentences.__anext__()
+        except StopAsyncIteration:
+            return None
+        except BaseException:
+            await sentences.aclose()
+            raise
+        logger.info(f"[{call.id}] Received first LLM sentence: '{first[:50]}...'")
+
+        async def reply():
+            try:
+                yield first
+                async for sentence in sentences:
+                    yield sentence
+            finally:
+                await sentences.aclose()
+        return reply()
+
+    async def _orchestrator_clip(self, session: aiohttp.ClientSession, text: str, trace_id: str | None = None) -> str:
+        """Synthesizes `text` as one clip on the TTS orchestrator and returns its URL."""
+        query = f"text={quote(text)}" + (f"&trace_id={trace_id}" if trace_id else "")
+        async with session.get(f"{TTS_ORCHESTRATOR_URL}/generate-audio?{query}") as response:
+            if response.status != 200:
+                error_text = await response.text()
+                logger.error(f"TTS orchestrator returned an error: {response.status} - {error_text}")
+                raise Exception("TTS orchestrator failed.")
+            response_json = await response.json()
+            filename = response_json.get("filename")
+        if not filename:
+            raise Exception("TTS orchestrator did not return a valid filename.")
+        return f"{TTS_ORCHESTRATOR_URL}/audio/{filename}"
+
+    async def _sentence_audio(self, session: aiohttp.ClientSession, sentences: AsyncIterator[str], trace_id: str | None = None):
+        """Yields playable media per sentence of a streaming reply, synthesizing each one as it arrives."""
+        async for url in synthesize_as_ready(sentences, lambda sentence: self._orchestrator_clip(session, sentence, trace_id)):
+            yield {"type": "audio", "url": url}
+
+    async def _orchestrator_audio(self, session: aiohttp.ClientSession, text: str, trace_id: str | None = None):
+        """Yields playable media for `text`, one item per chunk in chunked mode."""
+        if not TTS_CHUNKED_PLAYBACK:
+            yield {"type": "audio", "url": await self._orchestrator_clip(session, text, trace_id)}
+            return
+
+        query = f"text={quote(text)}" + (f"&trace_id={trace_id}" if trace_id else "")
+        generation_url = f"{TTS_ORCHESTRATOR_URL}/generate-audio/chunked?{query}"
+        async with session.get(generation_url) as response:
+            if response.status != 200:
+                error_text = await response.text()
+                logger.error(f"TTS orchestrator returned an error: {response.status} - {error_text}")
+                raise Exception("TTS orchestrator failed.")
+            async for line in response.content:
+                if not line.strip():
+                    continue
+                chunk = json.loads(line)
+                if chunk.get("error") or not chunk.get("filename"):
+                    raise Exception(f"TTS orchestrator failed mid-stream: {chunk.get('error')}")
+                yield {"type": "audio", "url": f"{TTS_ORCHESTRATOR_URL}/audio/{chunk['filename']}"}
+
+    async def play_tts_response(self, call: Call, text: str | AsyncIterator[str], trace_id: str | None = None,
+                                recorded_at: float | None = None, masked=None):
+        """
+        Gets playable audio from the TTS orchestrator and plays it with barge-in.
+        `text` is the reply, or a streaming reply's sentences as they arrive.
+        Returns the caller's barge-in (a recording, or an utterance on streamed
+        calls), otherwise None. With a trace, also records the reply's
+        first_audio and the whole turn's span. `masked` is the turn's armed
+        LatencyMask; the reply waits for a filler that is already playing.
+        """
+        if isinstance(text, str):
+            logger.info(f"[{call.id}] Entering play_tts_response for text: '{text[:30]}...'")
+            mode = "chunked" if TTS_CHUNKED_PLAYBACK else "monolithic"
+            media = self._orchestrator_audio(self.http.session, text, trace_id)
+        else:
+            logger.info(f"[{call.id}] Entering play_tts_response for a streaming reply.")
+            mode = "streamed"
+            media = self._sentence_audio(self.http.session, text, trace_id)
+        turn_start = time.monotonic()
+        turn_started_at = time.time()
+        try:
+            playback = await play_with_barge_in(
+                call, media, turn_start,
+                listen=self._barge_in_listener(call),
+                before_first=masked.settle if masked else None,
             )
+            if masked and masked.played:
+                tracer.record("filler", masked.filler_ms, start=masked.started_at, trace_id=trace_id, call_id=call.id)
 
-            if listen_action.completed:
-                logger.info(f"[{call.id}] Barge-in detected! Stopping playback.")
-                await play_action.stop()
-            else:
-                await listen_action.stop()
+            if playback.time_to_first_audio_ms is not None:
+                logger.info(f"[{call.id}] Time-to-first-audio ({mode}): {playback.time_to_first_audio_ms:.2f} ms, "
+                            f"{playback.chunks_played} chunk(s) played, barge-in: {playback.barged_in}")
+                tracer.record("first_audio", playback.time_to_first_audio_ms, start=turn_started_at,
+                              trace_id=trace_id, call_id=call.id, mode=mode)
+                if recorded_at is not None:
+                    turn_ms = (turn_started_at - recorded_at) * 1000 + playback.time_to_first_audio_ms
+                    tracer.record("turn", turn_ms, start=recorded_at, trace_id=trace_id, call_id=call.id, mode=mode)
+            if not playback.audio_played and call.active:
+                raise Exception("No audio was produced for the response.")
+            return playback.recording
 
         except Exception as e:
             logger.error(f"[{call.id}] Failed to play TTS response: {e}", exc_info=True)
-            await call.play_tts(text="I am sorry, a system error occurred.")
+            if masked:
+                masked.cancel()
+            await self.play_system_error(call)
+            return None
+
+    async def _prompt_audio(self, prompt_id: str):
+        yield {"type": "audio", "url": f"{TTS_ORCHESTRATOR_URL}{prompt_path(prompt_id)}"}
+
+    async def play_prompt(self, call: Call, prompt_id: str, answered_at: float | None = None, hold_ms: float | None = None,
+                          listen_ready=None):
+        """
+        Plays a prompt the orchestrator pre-rendered at startup, with barge-in.
+        With `answered_at`, also records answer-to-first-audio as a greeting span.
+        `listen_ready` resolves to the barge-in listener if that is not settled yet (see play_with_barge_in).
+        """
+        logger.info(f"[{call.id}] Playing prompt '{prompt_id}'.")
+        turn_start = time.monotonic()
+        turn_started_at = time.time()
+        try:
+            if listen_ready is not None:
+                playback = await play_with_barge_in(call, self._prompt_audio(prompt_id), turn_start, listen_ready=listen_ready)
+            else:
+                playback = await play_with_barge_in(call, self._prompt_audio(prompt_id), turn_start, listen=self._barge_in_listener(call))
+            if not playback.audio_played and not playback.barged_in and call.active:
+                # The orchestrator has no rendered clip (e.g. Groq was down at startup): say it live instead.
+                logger.warning(f"[{call.id}] Prompt '{prompt_id}' is unavailable; synthesizing it live.")
+                return await self.play_tts_response(call, PROMPTS[prompt_id])
+            if playback.time_to_first_audio_ms is not None:
+                logger.info(f"[{call.id}] Time-to-first-audio (prompt): {playback.time_to_first_audio_ms:.2f} ms")
+                if answered_at is not None:
+                    answer_to_audio_ms = (turn_started_at - answered_at) * 1000 + playback.time_to_first_audio_ms
+                    logger.info(f"[{call.id}] Answer-to-first-audio: {answer_to_audio_ms:.2f} ms (held {hold_ms or 0:.0f} ms).")
+                    tracer.record("greeting", answer_to_audio_ms, start=answered_at, trace_id=new_trace_id(),
+                                  call_id=call.id, hold_ms=f"{hold_ms or 0:.0f}")
+            return playback.recording
+        except Exception as e:
+            logger.error(f"[{call.id}] Failed to play prompt '{prompt_id}': {e}", exc_info=True)
+            return await self.play_tts_response(call, PROMPTS[prompt_id])
+
+    async def play_system_error(self, call: Call):
+        result = await call.play_audio(url=f"{TTS_ORCHESTRATOR_URL}{prompt_path('system_error')}")
+        if not result.successful:
+            await call.play_tts(text=PROMPTS["system_error"])
 
 async def health_check(request):
     """A simple health check endpoint for Render."""
@@ -152,9 +466,34 @@ async def start_agent_and_web_server():
     agent = VoiceAIAgent()
     consumer_task = asyncio.create_task(agent.run_in_background())
 
+    async def http_stats(request):
+        """Per-host connection pool metrics of the consumer's shared HTTP session."""
+        return web.json_response(agent.http.stats())
+
+    async def admission_stats(request):
+        """Admission decisions, hold times and the worker load they were based on."""
+        return web.json_response(admission.stats())
+
+    async def pipeline_stats(request):
+        """Turns processed in inline mode; in celery mode the worker does the work."""
+        return web.json_response({"mode": PIPELINE_MODE, **agent.inline_pipeline.stats()})
+
+    async def filler_stats(request):
+        """How often fillers covered a slow turn, and for how long."""
+        return web.json_response(latency_mask.stats())
+
+    async def lease_stats(request):
+        """Calls this relay process owns, and lease contention with other relays."""
+        return web.json_response(call_leases.stats())
+
     # Start the shim web server to satisfy Render's health checks
     app = web.Application()
     app.router.add_get("/health", health_check)
+    app.router.add_get("/http/stats", http_stats)
+    app.router.add_get("/admission/stats", admission_stats)
+    app.router.add_get("/leases/stats", lease_stats)
+    app.router.add_get("/fillers/stats", filler_stats)
+    app.router.add_get("/pipeline/stats", pipeline_stats)
     runner = web.AppRunner(app)
     await runner.setup()
     # Get the port from the environment, default to 8080 for local testing
@@ -170,6 +509,8 @@ if __name__ == "__main__":
     # Ensure all critical services and credentials are provided
     if not all([SIGNALWIRE_PROJECT_ID, SIGNALWIRE_API_TOKEN, TTS_ORCHESTRATOR_URL, REDIS_URL]):
         logger.critical("FATAL: Missing critical environment variables for relay server. Check SIGNALWIRE credentials, TTS_ORCHESTRATOR_URL, and REDIS_URL.")
+    elif PIPELINE_MODE == "inline" and not GROQ_API_KEY:
+        logger.critical("FATAL: PIPELINE_MODE=inline needs GROQ_API_KEY in the relay's environment.")
     else:
         try:
             asyncio.run(start_agent_and_web_server())
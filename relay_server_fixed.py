@@ -3,7 +3,7 @@ import logging
 import sys
 import os
 import asyncio
-import tempfile
+import time
 import uuid
 import aiohttp
 from aiohttp import web
@@ -11,10 +11,10 @@ from dotenv import load_dotenv
 from signalwire.relay.consumer import Consumer
 from signalwire.relay.calling import Call, Play
 import redis
-import json
 
 # --- HYPER-DETAILED LOGGING ---
-log_file_handler = logging.FileHandler("relay_server.log", mode='w')
+# start_services.py gives each relay instance its own log file.
+log_file_handler = logging.FileHandler(os.environ.get("RELAY_LOG_FILE", "relay_server.log"), mode='w')
 log_stream_handler = logging.StreamHandler(sys.stdout)
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', handlers=[log_file_handler, log_stream_handler])
 logger = logging.getLogger(__name__)
@@ -25,8 +25,21 @@ try:
     # DECOUPLED: We import the Celery app instance, NOT the tasks themselves.
     from celery_worker.celery_app import celery_app
     logger.info("Successfully imported 'celery_worker.celery_app'.")
+    from utils.admission import ADMITTED, REJECTED, AdmissionController
+    from utils.call_lease import CallLeases
+    from utils.call_playback import LatencyMask, play_on_loop
+    from utils.celery_results import CeleryResultWaiter, TaskAborted
+    from utils.http_pool import PooledHTTPSession
+    from utils.inline_pipeline import InlinePipeline
+    from llm.conversation_memory import AsyncConversationMemory
+    from llm.groq_llm import HISTORY_MAX_TURNS, HISTORY_TOKEN_BUDGET, HISTORY_TTL
+    from utils.tracing import SpanRecorder, current_trace, new_trace_id
     from tts.piper_tts import PiperTTS
     logger.info("Successfully imported 'tts.piper_tts'.")
+    from tts.prompt_bank import FILLER_PROMPT_IDS, PromptBank, prompt_path
+    from tts.audio_store import create_audio_store, new_clip_id
+    from utils.audio_janitor import AudioJanitor
+    from tts.provider_router import AllProvidersFailed, CircuitBreaker, TTSProvider, TTSProviderRouter
 except ImportError as e:
     logger.critical(f"FATAL IMPORT ERROR: {e}", exc_info=True)
     sys.exit(1)
@@ -39,8 +52,46 @@ SIGNALWIRE_CONTEXT = os.environ.get("SIGNALWIRE_CONTEXT", "voiceai")
 REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
 GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
 GROQ_TTS_VOICE = os.environ.get("GROQ_TTS_VOICE", "Fritz-PlayAI")
+GROQ_TTS_MODEL = os.environ.get("GROQ_TTS_MODEL", "tts-1")
+# Clips are served as the provider returns them.
+TTS_AUDIO_FORMAT = "wav"
 PUBLIC_URL_BASE = os.environ.get("PUBLIC_URL_BASE")
 AUDIO_SERVER_PORT = int(os.environ.get("AUDIO_SERVER_PORT", 8080))
+PROMPT_BANK_DIR = os.environ.get("PROMPT_BANK_DIR")
+AUDIO_STORE_BACKEND = os.environ.get("AUDIO_STORE_BACKEND", "memory")
+AUDIO_STORE_MAX_BYTES = int(os.environ.get("AUDIO_STORE_MAX_BYTES", 64 * 1024 * 1024))
+AUDIO_STORE_TTL = float(os.environ.get("AUDIO_STORE_TTL", 600))
+AUDIO_STORE_DIR = os.environ.get("AUDIO_STORE_DIR", "relay_audio")
+AUDIO_STORE_DISK_MAX_BYTES = int(os.environ.get("AUDIO_STORE_DISK_MAX_BYTES", 200 * 1024 * 1024))
+AUDIO_STORE_DISK_TTL = float(os.environ.get("AUDIO_STORE_DISK_TTL", 24 * 3600))
+AUDIO_JANITOR_INTERVAL = float(os.environ.get("AUDIO_JANITOR_INTERVAL", 60))
+TTS_BREAKER_FAILURES = int(os.environ.get("TTS_BREAKER_FAILURES", 3))
+TTS_BREAKER_COOLDOWN = float(os.environ.get("TTS_BREAKER_COOLDOWN", 30))
+TTS_HEDGE = os.environ.get("TTS_HEDGE", "false").lower() == "true"
+TTS_HEDGE_DEFAULT_DELAY = float(os.environ.get("TTS_HEDGE_DEFAULT_DELAY", 1.5))
+# "inline" runs each turn's download, STT and LLM on this relay's loop; "celery" hands them to
+# the worker, which remains the place for CPU-heavy local models.
+PIPELINE_MODE = os.environ.get("PIPELINE_MODE", "celery")
+INLINE_MAX_CONCURRENCY = int(os.environ.get("INLINE_MAX_CONCURRENCY", 16))
+# Shared keep-alive pool for outbound HTTP; size per-host limits against concurrent calls.
+HTTP_POOL_LIMIT = int(os.environ.get("HTTP_POOL_LIMIT", 100))
+HTTP_POOL_LIMIT_PER_HOST = int(os.environ.get("HTTP_POOL_LIMIT_PER_HOST", 50))
+HTTP_KEEPALIVE_TIMEOUT = float(os.environ.get("HTTP_KEEPALIVE_TIMEOUT", 30))
+# Admission control: conversations this relay runs at once, and the worker load (turns in
+# flight across relays, tasks queued in the broker) above which new callers are held.
+MAX_ACTIVE_CALLS = int(os.environ.get("MAX_ACTIVE_CALLS", 20))
+ADMISSION_MAX_INFLIGHT_TURNS = int(os.environ.get("ADMISSION_MAX_INFLIGHT_TURNS", 16))
+ADMISSION_MAX_QUEUE_DEPTH = int(os.environ.get("ADMISSION_MAX_QUEUE_DEPTH", 8))
+ADMISSION_QUEUES = os.environ.get("ADMISSION_QUEUES", "realtime").split(",")
+# Held callers hear the hold prompt; past these limits they hear the busy prompt and are hung up on.
+ADMISSION_MAX_WAITING = int(os.environ.get("ADMISSION_MAX_WAITING", 10))
+ADMISSION_MAX_WAIT = float(os.environ.get("ADMISSION_MAX_WAIT", 30))
+# Every relay on the context gets each call; a Redis lease decides which one handles it.
+# A relay that dies stops renewing, and its leases expire after this many seconds.
+CALL_LEASE_TTL = float(os.environ.get("CALL_LEASE_TTL", 15))
+# A short filler prompt plays when a reply has no audio this many seconds after the caller stopped.
+FILLER_ENABLED = os.environ.get("FILLER_ENABLED", "true").lower() == "true"
+FILLER_THRESHOLD = float(os.environ.get("FILLER_THRESHOLD", 1.0))
 logger.info("Environment variables loaded.")
 
 # --- Service Clients ---
@@ -51,9 +102,44 @@ try:
 except Exception as e:
     logger.critical(f"FATAL: Could not connect to Redis: {e}", exc_info=True)
     sys.exit(1)
+celery_results = CeleryResultWaiter(celery_app, REDIS_URL)
+# The shared TTS breaker state gets its own client with short timeouts, so a slow Redis
+# costs a breaker sync (run off the event loop) at most a fraction of a second.
+breaker_redis = redis.from_url(REDIS_URL, socket_timeout=0.2, socket_connect_timeout=0.2)
+# The worker reads and extends it each turn; the relay clears it when the call starts and ends.
+memory = AsyncConversationMemory(REDIS_URL, HISTORY_MAX_TURNS, HISTORY_TOKEN_BUDGET, HISTORY_TTL)
+# One trace per turn; TTS spans pick it up from the turn's context.
+tracer = SpanRecorder("relay", REDIS_URL)
+admission = AdmissionController(
+    REDIS_URL,
+    max_active_calls=MAX_ACTIVE_CALLS,
+    max_waiting=ADMISSION_MAX_WAITING,
+    max_wait=ADMISSION_MAX_WAIT,
+    max_inflight_turns=ADMISSION_MAX_INFLIGHT_TURNS,
+    max_queue_depth=ADMISSION_MAX_QUEUE_DEPTH,
+    queues=ADMISSION_QUEUES,
+)
+call_leases = CallLeases(REDIS_URL, ttl=CALL_LEASE_TTL)
+# Fillers are served from the prompt bank, so they need the public audio server.
+latency_mask = LatencyMask(
+    [f"{PUBLIC_URL_BASE}{prompt_path(prompt_id)}" for prompt_id in FILLER_PROMPT_IDS],
+    threshold=FILLER_THRESHOLD,
+    enabled=FILLER_ENABLED and bool(PUBLIC_URL_BASE),
+)
 
-AUDIO_CACHE_DIR = tempfile.mkdtemp(prefix="auravoice_audio_")
-logger.info(f"Audio cache created at: {AUDIO_CACHE_DIR}")
+audio_janitor = AudioJanitor(
+    [AUDIO_STORE_DIR],
+    ttl=AUDIO_STORE_DISK_TTL,
+    max_bytes=AUDIO_STORE_DISK_MAX_BYTES,
+    interval=AUDIO_JANITOR_INTERVAL,
+)
+audio_store = create_audio_store(
+    AUDIO_STORE_BACKEND,
+    max_bytes=AUDIO_STORE_MAX_BYTES,
+    ttl=AUDIO_STORE_TTL,
+    directory=AUDIO_STORE_DIR,
+    janitor=audio_janitor,
+)
 
 class VoiceAIAgent(Consumer):
     def setup(self):
@@ -62,65 +148,154 @@ class VoiceAIAgent(Consumer):
         self.token = SIGNALWIRE_API_TOKEN
         self.contexts = [SIGNALWIRE_CONTEXT]
         self.tts_service = PiperTTS()
-        self._processing_calls = set()
+        providers = []
+        if GROQ_API_KEY:
+            # Groq's breaker lives in Redis so every relay skips it together.
+            providers.append(TTSProvider(
+                "groq", self._synthesize_with_groq,
+                CircuitBreaker("groq", TTS_BREAKER_FAILURES, TTS_BREAKER_COOLDOWN, redis_client=breaker_redis),
+            ))
+        providers.append(TTSProvider("piper", self._synthesize_with_piper, CircuitBreaker("piper", TTS_BREAKER_FAILURES, TTS_BREAKER_COOLDOWN)))
+        self.tts_router = TTSProviderRouter(providers, hedge=TTS_HEDGE, hedge_default_delay=TTS_HEDGE_DEFAULT_DELAY)
+        self.primary_tts = providers[0].name
+        if self.primary_tts == "groq":
+            voice = f"{GROQ_TTS_MODEL}:{GROQ_TTS_VOICE}"
+        else:
+            voice = os.path.basename(self.tts_service.model_path)
+        self.prompt_bank = PromptBank(self._render_prompt, fingerprint=f"{self.primary_tts}:{voice}:{TTS_AUDIO_FORMAT}")
+        self.http = PooledHTTPSession(
+            limit=HTTP_POOL_LIMIT,
+            limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+            keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+        )
+        self.inline_pipeline = InlinePipeline(
+            GROQ_API_KEY, self.http, tracer,
+            recording_auth=aiohttp.BasicAuth(SIGNALWIRE_PROJECT_ID or "", SIGNALWIRE_API_TOKEN or ""),
+            memory=memory,
+            max_concurrency=INLINE_MAX_CONCURRENCY,
+        )
         # DO NOT initialize async tasks here. The event loop is not running yet.
         logger.info("Exiting VoiceAIAgent.setup()")
 
     async def ready(self):
         logger.info("Entering VoiceAIAgent.ready()")
         # The event loop is running now. This is the correct place for async initialization.
-        asyncio.create_task(self.tts_service.initialize())
+        self.http.open()
+        if PIPELINE_MODE == "inline":
+            self.inline_pipeline.open()
+        admission.open()
+        call_leases.open()
+        memory.open()
+        audio_janitor.start()
+        asyncio.create_task(self._warm_up())
         asyncio.create_task(self._start_web_server())
         logger.info(f"✅ Consumer ready on context '{SIGNALWIRE_CONTEXT}'")
         logger.info("Exiting VoiceAIAgent.ready()")
 
+    async def _warm_up(self):
+        """Loads the Piper fallback, then renders the fixed prompts so no call waits on them."""
+        await self.tts_service.initialize()
+        await self.prompt_bank.load(PROMPT_BANK_DIR)
+
     async def on_incoming_call(self, call: Call):
         logger.info(f"Entering on_incoming_call for call {call.id}")
-        if call.id in self._processing_calls:
-            logger.warning(f"[{call.id}] Ignoring duplicate event.")
+        if not await call_leases.acquire(call.id):
+            logger.info(f"[{call.id}] Ignoring event; the call is owned by another relay or already being handled.")
             return
-        
-        self._processing_calls.add(call.id)
         logger.info(f"📞 Incoming call {call.id} from {call.from_number}. Locked.")
+        session_id = str(uuid.uuid4())
+        event_at = time.time()
+        # Resolve the greeting while the call is being answered, not after.
+        greeting = asyncio.ensure_future(self._get_prompt_or_tts_url(session_id, "aura_greeting", None))
         
         try:
             answer_result = await call.answer()
             if answer_result.successful:
-                logger.info(f"✅ Call {call.id} answered.")
-                asyncio.create_task(self.handle_conversation(call))
+                answered_at = time.time()
+                logger.info(f"✅ Call {call.id} answered in {(answered_at - event_at) * 1000:.0f} ms, "
+                            f"greeting {'ready' if greeting.done() else 'still rendering'}.")
+                asyncio.create_task(self.handle_conversation(call, session_id, greeting, answered_at))
             else:
                 logger.error(f"❌ Failed to answer call {call.id}. Event: {answer_result.event}")
-                self._processing_calls.remove(call.id)
+                greeting.cancel()
+                await call_leases.release(call.id)
         except Exception as e:
             logger.error(f"Error in on_incoming_call for {call.id}: {e}", exc_info=True)
-            self._processing_calls.remove(call.id)
+            greeting.cancel()
+            await call_leases.release(call.id)
 
-    async def handle_conversation(self, call: Call):
+    async def admit(self, call: Call, session_id: str) -> bool:
+        """Holds the caller on the hold prompt until there is capacity; turns them away if none frees up."""
+        hold_url = await self._get_prompt_or_tts_url(session_id, "hold", None)
+        decision = await admission.acquire(
+            call.id,
+            hold=lambda: play_on_loop(call, hold_url, self.prompt_bank.text("hold")),
+            abort_on=call.wait_for_ended(),
+        )
+        if decision == ADMITTED:
+            return True
+        if decision == REJECTED and call.active:
+            busy_url = await self._get_prompt_or_tts_url(session_id, "busy", None)
+            if busy_url:
+                await call.play_audio(url=busy_url)
+        return False
+
+    async def handle_conversation(self, call: Call, session_id: str | None = None, greeting: asyncio.Future | None = None,
+                                  answered_at: float | None = None):
+        """
+        Runs the call's turns. `greeting`, if given, is the greeting URL already
+        being resolved since the call event arrived; `answered_at` is when the
+        call was answered, for the answer-to-first-audio measurement.
+        """
         logger.info(f"Entering handle_conversation for call {call.id}")
-        session_id = str(uuid.uuid4())
-        active_play = None
+        session_id = session_id or str(uuid.uuid4())
+        active_play = record_task = masked = None
         try:
-            redis_client.set(f"history:{call.id}", json.dumps([]))
-            prompt_text = "Hello! I'm Aura, your AI assistant. How can I help you today?"
+            admit_start = time.time()
+            if not await self.admit(call, session_id):
+                return
+            hold_ms = (time.time() - admit_start) * 1000
+            memory.start_soon(call.id)
+            prompt_id, prompt_text = "aura_greeting", None
+            recorded_at = reply_at = None
 
             while call.active:
-                audio_url = await self._get_tts_audio_url(session_id, prompt_text)
+                if greeting is not None:
+                    audio_url, greeting = await greeting, None
+                else:
+                    audio_url = await self._get_prompt_or_tts_url(session_id, prompt_id, prompt_text)
                 if not audio_url:
                     logger.error(f"[{call.id}] Could not generate TTS. Hanging up.")
                     await call.hangup()
                     break
+                if masked is not None:
+                    # Start right after a filler that is still playing, not over it.
+                    await masked.settle()
+                    if masked.played:
+                        tracer.record("filler", masked.filler_ms, start=masked.started_at, call_id=call.id)
+                    masked = None
 
-                # Play audio asynchronously to allow for barge-in
-                logger.info(f"[{call.id}] Playing audio asynchronously: {audio_url}")
-                active_play = await call.play_audio_async(url=audio_url)
-                
-                # Record user's speech
-                logger.info(f"[{call.id}] Starting recording to listen for user input...")
-                record_result = await call.record(
+                # Play audio asynchronously to allow for barge-in; the recorder is armed in the same tick.
+                logger.info(f"[{call.id}] Playing audio asynchronously and listening for user input: {audio_url}")
+                record_task = asyncio.ensure_future(call.record(
                     beep=False,
                     end_silence_timeout=1.0,
                     terminators='#*' # Stop recording on these digits
-                )
+                ))
+                active_play = await call.play_audio_async(url=audio_url)
+                played_at = time.time()
+                if answered_at is not None:
+                    answer_to_audio_ms = (played_at - answered_at) * 1000
+                    logger.info(f"[{call.id}] Answer-to-first-audio: {answer_to_audio_ms:.2f} ms (held {hold_ms:.0f} ms).")
+                    tracer.record("greeting", answer_to_audio_ms, start=answered_at, trace_id=new_trace_id(),
+                                  call_id=call.id, hold_ms=f"{hold_ms:.0f}")
+                    answered_at = None
+                if recorded_at is not None:
+                    tracer.record("first_audio", (played_at - reply_at) * 1000, start=reply_at, call_id=call.id)
+                    tracer.record("turn", (played_at - recorded_at) * 1000, start=recorded_at, call_id=call.id)
+                
+                # Wait for the user's speech
+                record_result = await record_task
 
                 # Stop any lingering playback once recording is done
                 if active_play and not active_play.completed:
@@ -129,16 +304,21 @@ class VoiceAIAgent(Consumer):
 
                 if record_result.successful:
                     logger.info(f"[{call.id}] Recording complete. URL: {record_result.url}")
-                    task = celery_app.send_task("process_recording_task", args=[call.id, record_result.url])
-                    logger.info(f"[{call.id}] Dispatched Celery task {task.id} for processing.")
+                    recorded_at = time.time()
+                    current_trace.set(new_trace_id())
+                    masked = latency_mask.arm(call, recorded_at)
                     
                     try:
-                        prompt_text = task.get(timeout=25.0) # Increased timeout for full pipeline
-                        if not prompt_text:
-                            prompt_text = "I'm sorry, I don't have a response for that."
+                        async with admission.turn(call.id):
+                            prompt_text = await self.request_reply(call, record_result.url, recorded_at)
+                        prompt_id = None if prompt_text else "no_response"
+                    except TaskAborted:
+                        logger.info(f"[{call.id}] Caller hung up while the recording was being processed.")
+                        break
                     except Exception as e:
-                        logger.error(f"[{call.id}] Celery task failed or timed out: {e}", exc_info=True)
-                        prompt_text = "I'm having a little trouble. Could you say that again?"
+                        logger.error(f"[{call.id}] Reply pipeline failed or timed out: {e}", exc_info=True)
+                        prompt_id = "retry"
+                    reply_at = time.time()
                 else:
                     logger.warning(f"[{call.id}] Recording failed or timed out. Reason: {record_result.event}")
                     # If recording fails (e.g., user hangs up), break the loop.
@@ -146,59 +326,142 @@ class VoiceAIAgent(Consumer):
         except Exception as e:
             logger.error(f"[{call.id}] Unhandled exception in conversation: {e}", exc_info=True)
         finally:
+            if greeting is not None:
+                greeting.cancel()
+            if masked is not None:
+                masked.cancel()
+            if record_task is not None and not record_task.done():
+                record_task.cancel()
             if call.active:
                 await call.hangup()
             logger.info(f"[{call.id}] Conversation ended. Unlocking.")
-            self._processing_calls.remove(call.id)
+            try:
+                await memory.end(call.id)
+            except Exception as e:
+                logger.warning(f"[{call.id}] Could not clear conversation memory: {e}")
+            admission.release(call.id)
+            await call_leases.release(call.id)
+
+    async def request_reply(self, call: Call, recording_url: str, recorded_at: float) -> str | None:
+        """
+        The reply text for a recording: transcribed and answered on this loop in
+        inline mode, or by a Celery worker otherwise. Raises TaskAborted if the
+        caller hangs up first.
+        """
+        if PIPELINE_MODE == "inline":
+            return await self.inline_pipeline.reply(
+                call.id, recording_url=recording_url, trace_id=current_trace.get(), recorded_at=recorded_at,
+                timeout=25.0, abort_on=call.wait_for_ended(),
+            )
+        task = celery_app.send_task(
+            "get_llm_response_task",
+            args=[call.id, recording_url],
+            kwargs={"trace_id": current_trace.get(), "recorded_at": recorded_at},
+            expires=25.0,  # a turn nobody is waiting for any more is dropped, not processed
+        )
+        logger.info(f"[{call.id}] Dispatched Celery task {task.id} for processing.")
+        return await celery_results.wait(task.id, timeout=25.0, abort_on=call.wait_for_ended()) # Increased timeout for full pipeline
+
+    async def _get_prompt_or_tts_url(self, session_id: str, prompt_id: str | None, text: str | None) -> str | None:
+        """Fixed prompts come from the in-memory bank; everything else is synthesized."""
+        if prompt_id:
+            if PUBLIC_URL_BASE and await self.prompt_bank.ensure(prompt_id):
+                return self.prompt_bank.url(PUBLIC_URL_BASE, prompt_id)
+            text = self.prompt_bank.text(prompt_id)
+        return await self._get_tts_audio_url(session_id, text)
+
+    async def _render_prompt(self, text: str) -> bytes:
+        audio_content, source_tts = await self.tts_router.synthesize(text)
+        if source_tts != self.primary_tts:
+            # Never pin fallback audio in the bank; the prompt is retried on its next use.
+            raise RuntimeError(f"Prompt rendered by fallback provider '{source_tts}'.")
+        return audio_content
 
     async def _get_tts_audio_url(self, session_id: str, text: str) -> str | None:
         logger.info(f"Entering _get_tts_audio_url for session {session_id}")
-        audio_content, source_tts = None, None
+        audio_content = await self._synthesize_audio(session_id, text)
+        return self._serve_audio_file(session_id, audio_content) if audio_content else None
 
-        # 1. Attempt Groq TTS
-        if GROQ_API_KEY:
-            headers = {"Authorization": f"Bearer {GROQ_API_KEY}", "Content-Type": "application/json"}
-            # Using a more standard model name as per recent API changes
-            payload = {"model": "tts-1", "voice": GROQ_TTS_VOICE, "input": text, "response_format": "wav"}
-            try:
-                async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=8)) as s:
-                    async with s.post("https://api.groq.com/openai/v1/audio/speech", headers=headers, json=payload) as resp:
-                        if resp.status == 200:
-                            audio_content = await resp.read()
-                            source_tts = "Groq TTS"
-                        else:
-                            error_body = await resp.text()
-                            logger.error(f"Groq TTS API failed: {resp.status} - {error_body}")
-            except Exception as e:
-                logger.error(f"Groq TTS request exception: {e}", exc_info=True)
+    async def _synthesize_with_groq(self, text: str) -> bytes:
+        headers = {"Authorization": f"Bearer {GROQ_API_KEY}", "Content-Type": "application/json"}
+        # Using a more standard model name as per recent API changes
+        payload = {"model": GROQ_TTS_MODEL, "voice": GROQ_TTS_VOICE, "input": text, "response_format": TTS_AUDIO_FORMAT}
+        async with self.http.session.post(
+            "https://api.groq.com/openai/v1/audio/speech", headers=headers, json=payload,
+            timeout=aiohttp.ClientTimeout(total=8),
+        ) as resp:
+            if resp.status != 200:
+                error_body = await resp.text()
+                logger.error(f"Groq TTS API failed: {resp.status} - {error_body}")
+                raise aiohttp.ClientResponseError(resp.request_info, resp.history, status=resp.status, message=error_body)
+            return await resp.read()
 
-        # 2. Fallback to PiperTTS
-        if not audio_content and self.tts_service.model:
-            logger.warning(f"[{session_id}] Groq TTS failed. Falling back to PiperTTS.")
-            try:
-                audio_content = await self.tts_service.text_to_speech(text)
-                source_tts = "PiperTTS"
-            except Exception as e:
-                logger.error(f"[{session_id}] PiperTTS exception: {e}", exc_info=True)
+    async def _synthesize_with_piper(self, text: str) -> bytes:
+        if not self.tts_service.available:
+            raise RuntimeError("PiperTTS is not loaded.")
+        return await self.tts_service.text_to_speech(text)
 
-        # 3. Serve the audio file
-        if audio_content:
-            logger.info(f"Generated audio using {source_tts}.")
-            return self._serve_audio_file(session_id, audio_content)
-        else:
-            logger.error(f"All TTS providers failed for text: '{text[:50]}...'")
+    async def _synthesize_audio(self, session_id: str, text: str) -> bytes | None:
+        try:
+            with tracer.span("tts", chars=len(text)) as span:
+                audio_content, source_tts = await self.tts_router.synthesize(text)
+                span["provider"] = source_tts
+        except AllProvidersFailed as e:
+            logger.error(f"[{session_id}] {e} Text: '{text[:50]}...'")
             return None
+        logger.info(f"Generated audio using {source_tts}.")
+        return audio_content
 
     def _serve_audio_file(self, session_id: str, audio_content: bytes) -> str | None:
         if not PUBLIC_URL_BASE: return None
-        filename = f"{session_id}_{uuid.uuid4()}.wav"
-        filepath = os.path.join(AUDIO_CACHE_DIR, filename)
-        with open(filepath, "wb") as f: f.write(audio_content)
-        return f"{PUBLIC_URL_BASE}/audio/{filename}"
+        clip_id = new_clip_id()
+        audio_store.put(clip_id, audio_content)
+        return f"{PUBLIC_URL_BASE}/audio/{clip_id}.wav"
+
+    async def _serve_clip(self, request: web.Request) -> web.Response:
+        audio = audio_store.get(request.match_info["clip_id"])
+        if audio is None:
+            raise web.HTTPNotFound()
+        return web.Response(body=audio, content_type="audio/wav")
+
+    async def _serve_prompt(self, request: web.Request) -> web.Response:
+        audio = await self.prompt_bank.ensure(request.match_info["prompt_id"])
+        if audio is None:
+            raise web.HTTPNotFound()
+        return web.Response(body=audio, content_type="audio/wav", headers={"Cache-Control": "public, max-age=86400"})
+
+    async def _janitor_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(audio_janitor.stats())
+
+    async def _tts_stats(self, request: web.Request) -> web.Response:
+        return web.json_response({**self.tts_router.stats(), "tracing": tracer.stats()})
+
+    async def _http_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.http.stats())
+
+    async def _admission_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(admission.stats())
+
+    async def _lease_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(call_leases.stats())
+
+    async def _filler_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(latency_mask.stats())
+
+    async def _pipeline_stats(self, request: web.Request) -> web.Response:
+        return web.json_response({"mode": PIPELINE_MODE, **self.inline_pipeline.stats()})
 
     async def _start_web_server(self):
         app = web.Application()
-        app.router.add_static('/audio', path=AUDIO_CACHE_DIR)
+        app.router.add_get('/audio/{clip_id}.wav', self._serve_clip)
+        app.router.add_get('/janitor/stats', self._janitor_stats)
+        app.router.add_get('/tts/stats', self._tts_stats)
+        app.router.add_get('/http/stats', self._http_stats)
+        app.router.add_get('/admission/stats', self._admission_stats)
+        app.router.add_get('/leases/stats', self._lease_stats)
+        app.router.add_get('/fillers/stats', self._filler_stats)
+        app.router.add_get('/pipeline/stats', self._pipeline_stats)
+        app.router.add_get(prompt_path("{prompt_id}"), self._serve_prompt)
         runner = web.AppRunner(app)
         await runner.setup()
         site = web.TCPSite(runner, '0.0.0.0', AUDIO_SERVER_PORT)
@@ -207,6 +470,13 @@ class VoiceAIAgent(Consumer):
 
     def teardown(self):
         logger.info("Consumer shutting down.")
+        audio_janitor.stop()
+        self.client.loop.run_until_complete(self.inline_pipeline.close())
+        self.client.loop.run_until_complete(self.http.close())
+        self.client.loop.run_until_complete(admission.close())
+        self.client.loop.run_until_complete(call_leases.close())
+        self.client.loop.run_until_complete(memory.close())
+        tracer.close()
 
 if __name__ == "__main__":
     logger.info("Script __main__ block started.")
@@ -8,3 +8,6 @@ apt-get update && apt-get install -y ffmpeg
 # Install Python dependencies from both files
 pip install -r tts_requirements.txt
 pip install -r requirements.txt
+
+# Pre-render the fixed system prompts; the service renders them at startup if this fails
+python build_prompt_bank.py || echo "Prompt bank build failed; prompts will be rendered at startup."
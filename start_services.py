@@ -4,6 +4,7 @@ AuraVoice AI Voice Agent - Production Startup Script
 Optimized for concurrent calls and low-latency processing
 """
 
+import argparse
 import os
 import sys
 import time
@@ -27,10 +28,27 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Relay processes to run. They all consume the same SignalWire context; a Redis lease per
+# call (utils/call_lease.py) decides which one handles it.
+RELAY_INSTANCES = int(os.environ.get("RELAY_INSTANCES", 1))
+AUDIO_SERVER_PORT = int(os.environ.get("AUDIO_SERVER_PORT", 8080))
+# Optional comma-separated public URL of each instance's audio server, in instance order.
+RELAY_PUBLIC_URL_BASES = [url for url in os.environ.get("RELAY_PUBLIC_URL_BASES", "").split(",") if url]
+# Live turns and bulk jobs run on separate workers (see celery_worker/celery_app.py). Nothing is
+# routed to the bulk queue yet, so its worker is off (0 processes) unless asked for.
+REALTIME_QUEUE = os.environ.get("CELERY_REALTIME_QUEUE", "realtime")
+BULK_QUEUE = os.environ.get("CELERY_BULK_QUEUE", "bulk")
+# The realtime tasks wait on Groq and SignalWire almost all the time, so by default one process
+# runs hundreds of them on green threads ("gevent"); "threads" and "prefork" are the alternatives.
+REALTIME_WORKER_POOL = os.environ.get("REALTIME_WORKER_POOL", "gevent")
+REALTIME_WORKER_CONCURRENCY = int(os.environ.get("REALTIME_WORKER_CONCURRENCY", 4 if REALTIME_WORKER_POOL == "prefork" else 200))
+BULK_WORKER_CONCURRENCY = int(os.environ.get("BULK_WORKER_CONCURRENCY", 0))
+
 class AuraVoiceManager:
-    def __init__(self):
+    def __init__(self, relay_instances=RELAY_INSTANCES):
         self.processes = {}
         self.running = True
+        self.relay_instances = relay_instances
         
     def check_dependencies(self):
         """Check if all required services are available"""
@@ -71,19 +89,26 @@ class AuraVoiceManager:
         return True
     
     def start_celery_worker(self):
-        """Start optimized Celery worker for voice processing"""
+        """Start optimized Celery worker for live call turns"""
         logger.info("🚀 Starting Celery worker...")
         
         cmd = [
             "celery", "-A", "celery_worker.celery_app", "worker",
             "--loglevel=info",
-            "--concurrency=4",  # Optimized for voice processing
-            "--pool=prefork",   # Better for CPU-intensive tasks
-            "--queues=voice_processing",
+            f"--concurrency={REALTIME_WORKER_CONCURRENCY}",
+            f"--pool={REALTIME_WORKER_POOL}",
+            f"--queues={REALTIME_QUEUE}",
+            "--prefetch-multiplier=1",  # One reserved task per slot, so no turn waits behind a slow one
             "--hostname=aura-voice-worker@%h",
-            "--max-tasks-per-child=100",
-            "--max-memory-per-child=200000"  # 200MB limit
         ]
+        if REALTIME_WORKER_POOL == "prefork":
+            cmd += [
+                "--max-tasks-per-child=100",
+                "--max-memory-per-child=200000"  # 200MB limit
+            ]
+        env = dict(os.environ)
+        # Every concurrent turn in the process may be downloading a recording at once.
+        env.setdefault("RECORDING_POOL_MAXSIZE", str(REALTIME_WORKER_CONCURRENCY))
         
         try:
             process = subprocess.Popen(
@@ -91,7 +116,8 @@ class AuraVoiceManager:
                 stdout=subprocess.PIPE,
                 stderr=subprocess.STDOUT,
                 universal_newlines=True,
-                bufsize=1
+                bufsize=1,
+                env=env,
             )
             self.processes['celery'] = process
             logger.info("✅ Celery worker started successfully")
@@ -99,10 +125,53 @@ class AuraVoiceManager:
         except Exception as e:
             logger.error(f"❌ Failed to start Celery worker: {e}")
             return False
+
+    def start_bulk_worker(self):
+        """Start the Celery worker for warm-up and batch jobs"""
+        logger.info("🚀 Starting Celery bulk worker...")
+        
+        cmd = [
+            "celery", "-A", "celery_worker.celery_app", "worker",
+            "--loglevel=info",
+            f"--concurrency={BULK_WORKER_CONCURRENCY}",
+            "--pool=prefork",  # CPU-bound jobs need real processes
+            f"--queues={BULK_QUEUE}",
+            "--prefetch-multiplier=4",  # Throughput over latency here
+            "--hostname=aura-bulk-worker@%h",
+            "--max-tasks-per-child=100",
+        ]
+        
+        try:
+            process = subprocess.Popen(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                universal_newlines=True,
+                bufsize=1
+            )
+            self.processes['celery-bulk'] = process
+            logger.info("✅ Celery bulk worker started successfully")
+            return True
+        except Exception as e:
+            logger.error(f"❌ Failed to start Celery bulk worker: {e}")
+            return False
     
-    def start_relay_server(self):
-        """Start SignalWire Relay server"""
-        logger.info("🚀 Starting SignalWire Relay server...")
+    def relay_env(self, index):
+        """Environment of relay instance `index`: its own audio server port, log file and share of the cores."""
+        env = dict(os.environ)
+        if self.relay_instances == 1:
+            return env
+        # Each instance preloads a Piper voice per pool worker; split the cores instead of giving each all of them.
+        env.setdefault("PIPER_POOL_WORKERS", str(max(1, (os.cpu_count() or 1) // self.relay_instances)))
+        env["AUDIO_SERVER_PORT"] = str(AUDIO_SERVER_PORT + index)
+        env["RELAY_LOG_FILE"] = f"relay_server.{index}.log"
+        if index < len(RELAY_PUBLIC_URL_BASES):
+            env["PUBLIC_URL_BASE"] = RELAY_PUBLIC_URL_BASES[index]
+        return env
+
+    def start_relay_server(self, index=0):
+        """Start SignalWire Relay server instance `index`"""
+        logger.info(f"🚀 Starting SignalWire Relay server {index + 1}/{self.relay_instances}...")
         
         try:
             # FIXED: Use the optimized relay server
@@ -111,14 +180,24 @@ class AuraVoiceManager:
                 stdout=subprocess.PIPE,
                 stderr=subprocess.STDOUT,
                 universal_newlines=True,
-                bufsize=1
+                bufsize=1,
+                env=self.relay_env(index),
             )
-            self.processes['relay'] = process
-            logger.info("✅ SignalWire Relay server (FIXED VERSION) started successfully")
+            self.processes[f'relay-{index}'] = process
+            logger.info(f"✅ SignalWire Relay server {index} (FIXED VERSION) started successfully")
             return True
         except Exception as e:
-            logger.error(f"❌ Failed to start Relay server: {e}")
+            logger.error(f"❌ Failed to start Relay server {index}: {e}")
             return False
+
+    def start_relay_servers(self):
+        """Start every relay instance"""
+        if self.relay_instances > 1 and len(RELAY_PUBLIC_URL_BASES) < self.relay_instances \
+                and os.environ.get("AUDIO_STORE_BACKEND", "memory") == "memory":
+            # Each instance serves the clips it synthesized, so one PUBLIC_URL_BASE must reach all of them.
+            logger.warning("⚠️ Several relays share PUBLIC_URL_BASE with in-memory audio stores; "
+                           "set RELAY_PUBLIC_URL_BASES or use AUDIO_STORE_BACKEND=disk on a shared directory.")
+        return all(self.start_relay_server(index) for index in range(self.relay_instances))
     
     def monitor_processes(self):
         """Monitor and restart processes if they fail"""
@@ -131,8 +210,10 @@ class AuraVoiceManager:
                     
                     if name == 'celery':
                         self.start_celery_worker()
-                    elif name == 'relay':
-                        self.start_relay_server()
+                    elif name == 'celery-bulk':
+                        self.start_bulk_worker()
+                    elif name.startswith('relay-'):
+                        self.start_relay_server(int(name.split('-')[1]))
                         
             time.sleep(5)  # Check every 5 seconds
     
@@ -170,11 +251,14 @@ class AuraVoiceManager:
         if not self.start_celery_worker():
             logger.error("❌ Failed to start Celery worker. Exiting.")
             sys.exit(1)
+        if BULK_WORKER_CONCURRENCY > 0 and not self.start_bulk_worker():
+            logger.error("❌ Failed to start Celery bulk worker. Exiting.")
+            sys.exit(1)
             
         # Wait a moment for Celery to initialize
         time.sleep(3)
         
-        if not self.start_relay_server():
+        if not self.start_relay_servers():
             logger.error("❌ Failed to start Relay server. Exiting.")
             sys.exit(1)
         
@@ -188,5 +272,9 @@ class AuraVoiceManager:
             self.signal_handler(signal.SIGINT, None)
 
 if __name__ == "__main__":
-    manager = AuraVoiceManager()
+    parser = argparse.ArgumentParser(description="Start the Celery worker and the SignalWire relay(s).")
+    parser.add_argument("--relays", type=int, default=RELAY_INSTANCES,
+                        help="Relay processes to run on the SignalWire context (default RELAY_INSTANCES or 1).")
+    args = parser.parse_args()
+    manager = AuraVoiceManager(relay_instances=args.relays)
     manager.start()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Per-turn latency report - reads the spans the relay, Celery worker and TTS
+orchestrator write to the trace stream and prints p50/p95/p99 per stage,
+the slowest turns broken down by stage, or a single trace.
+
+    python trace_report.py                  # last 60 minutes
+    python trace_report.py --since 15 --slowest 10
+    python trace_report.py --trace <trace_id>
+"""
+import argparse
+import os
+import time
+from collections import defaultdict
+
+import redis
+from dotenv import load_dotenv
+
+from utils.tracing import STAGES, TRACE_STREAM, percentile
+
+load_dotenv()
+
+
+def read_spans(r, stream, since_minutes, page_size=5000):
+    """Yields every span written in the last `since_minutes` minutes, oldest first."""
+    start_id = f"{int((time.time() - since_minutes * 60) * 1000)}-0"
+    while True:
+        entries = r.xrange(stream, min=start_id, max="+", count=page_size)
+        for _, fields in entries:
+            yield fields
+        if len(entries) < page_size:
+            return
+        last_ms, last_seq = entries[-1][0].split("-")
+        start_id = f"{last_ms}-{int(last_seq) + 1}"
+
+
+def ordered_stages(stages):
+    known = [stage for stage in STAGES if stage in stages]
+    return known + sorted(stage for stage in stages if stage not in STAGES)
+
+
+def fmt(value):
+    return "-" if value is None else f"{value:.0f}"
+
+
+def print_percentiles(spans):
+    durations = defaultdict(list)
+    errors = defaultdict(int)
+    for span in spans:
+        durations[span["stage"]].append(float(span["duration_ms"]))
+        if "error" in span:
+            errors[span["stage"]] += 1
+
+    print(f"{'stage':<14} {'count':>7} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for stage in ordered_stages(durations):
+        values = durations[stage]
+        print(f"{stage:<14} {len(values):>7} {errors[stage]:>7} {fmt(percentile(values, 50)):>8} "
+              f"{fmt(percentile(values, 95)):>8} {fmt(percentile(values, 99)):>8} {fmt(max(values)):>8}")
+
+
+def print_slowest(spans, limit):
+    traces = defaultdict(list)
+    for span in spans:
+        traces[span["trace_id"]].append(span)
+    turns = []
+    for trace_id, trace_spans in traces.items():
+        turn = next((span for span in trace_spans if span["stage"] == "turn"), None)
+        if turn:
+            turns.append((float(turn["duration_ms"]), trace_id, trace_spans))
+    if not turns:
+        return
+
+    print(f"\nSlowest {min(limit, len(turns))} of {len(turns)} turns (ms per stage):")
+    for turn_ms, trace_id, trace_spans in sorted(turns, reverse=True)[:limit]:
+        per_stage = defaultdict(float)
+        for span in trace_spans:
+            per_stage[span["stage"]] += float(span["duration_ms"])
+        breakdown = ", ".join(f"{stage} {per_stage[stage]:.0f}" for stage in ordered_stages(per_stage) if stage != "turn")
+        call_id = next((span["call_id"] for span in trace_spans if "call_id" in span), "?")
+        print(f"  {turn_ms:>7.0f}  {trace_id}  call {call_id}: {breakdown}")
+
+
+def print_trace(spans, trace_id):
+    trace_spans = sorted((span for span in spans if span["trace_id"] == trace_id), key=lambda span: float(span["start"]))
+    if not trace_spans:
+        print(f"No spans found for trace {trace_id}.")
+        return
+    origin = float(trace_spans[0]["start"])
+    print(f"{'offset ms':>9} {'duration ms':>11}  {'stage':<14} {'service':<13} attributes")
+    for span in trace_spans:
+        attrs = {key: value for key, value in span.items() if key not in ("trace_id", "stage", "service", "start", "duration_ms")}
+        print(f"{(float(span['start']) - origin) * 1000:>9.0f} {float(span['duration_ms']):>11.0f}  "
+              f"{span['stage']:<14} {span['service']:<13} {attrs}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report per-stage turn latency from the trace stream.")
+    parser.add_argument("--since", type=float, default=60, help="Minutes of history to read (default 60).")
+    parser.add_argument("--slowest", type=int, default=5, help="How many of the slowest turns to break down.")
+    parser.add_argument("--trace", help="Print every span of one trace instead of the summary.")
+    parser.add_argument("--stream", default=TRACE_STREAM)
+    args = parser.parse_args()
+
+    r = redis.from_url(os.environ.get("REDIS_URL", "redis://localhost:6379/0"), decode_responses=True)
+    spans = list(read_spans(r, args.stream, args.since))
+    if args.trace:
+        print_trace(spans, args.trace)
+        return
+    if not spans:
+        print(f"No spans in '{args.stream}' for the last {args.since:g} minutes.")
+        return
+
+    print(f"{len(spans)} spans from {len({span['trace_id'] for span in spans})} traces in the last {args.since:g} minutes.\n")
+    print_percentiles(spans)
+    if args.slowest:
+        print_slowest(spans, args.slowest)
+
+
+if __name__ == "__main__":
+    main()
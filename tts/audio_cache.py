@@ -0,0 +1,139 @@
+# tts/audio_cache.py
+
+import asyncio
+import hashlib
+import logging
+import time
+import unicodedata
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from tts.audio_store import AudioStore, new_clip_id
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text so trivially different spellings share one cache entry."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class TTSAudioCache:
+    """Content-addressed cache of transcoded TTS clips on top of an `AudioStore`.
+
+    Entries are keyed by a hash of (normalized text, provider, voice, codec) and
+    that key doubles as the clip id in the store, so a repeated prompt is served
+    straight from wherever the store keeps it. Size limits, expiry and eviction
+    are the store's job. Concurrent misses for the same key share a single
+    in-flight generation.
+
+    With `disk` (a `DiskAudioStore`), every clip cached under its key is also
+    written there, and a key the serving store has dropped (expired, evicted,
+    or lost in a restart) is promoted back from disk instead of regenerated.
+    The serving store can then stay RAM-only without the cache forgetting its
+    greetings and apologies.
+    """
+
+    def __init__(self, store: AudioStore, disk: Optional[AudioStore] = None):
+        self.store = store
+        self.disk = disk
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.uncacheable = 0
+        self.chars_saved = 0
+        self._generation_ms_total = 0.0
+
+    @staticmethod
+    def make_key(text: str, provider: str, voice: str, codec: str) -> str:
+        material = "\x1f".join([normalize_text(text), provider, voice, codec])
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    async def get_or_generate(
+        self,
+        text: str,
+        provider: str,
+        voice: str,
+        codec: str,
+        generate: Callable[[], Awaitable[Tuple[bytes, str]]],
+    ) -> str:
+        """Returns the store clip id for the given text, generating the audio on a miss.
+
+        `generate` must return `(audio_bytes, provider_used)`. The clip is only
+        stored under the cache key when `provider_used` matches the requested
+        provider, so a fallback voice never gets pinned under the primary
+        provider's key; it is still stored, under a one-off id.
+        """
+        key = self.make_key(text, provider, voice, codec)
+
+        if key in self.store:
+            self.hits += 1
+            self.chars_saved += len(text)
+            logger.info(f"TTS cache hit for key {key[:12]}.")
+            return key
+        audio = self.disk.get(key) if self.disk is not None else None
+        if audio is not None:
+            self.store.put(key, audio)
+            self.hits += 1
+            self.disk_hits += 1
+            self.chars_saved += len(text)
+            logger.info(f"TTS cache hit on disk for key {key[:12]}.")
+            return key
+
+        inflight = self._inflight.get(key)
+        # Futures cannot be awaited from another event loop (main.py runs two).
+        if inflight is not None and inflight.get_loop() is asyncio.get_running_loop():
+            self.coalesced += 1
+            self.chars_saved += len(text)
+            logger.info(f"TTS cache joining in-flight generation for key {key[:12]}.")
+            return await asyncio.shield(inflight)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        start_time = time.monotonic()
+        try:
+            audio, provider_used = await generate()
+            self._generation_ms_total += (time.monotonic() - start_time) * 1000
+            if provider_used == provider:
+                clip_id = key
+            else:
+                clip_id = new_clip_id()
+                self.uncacheable += 1
+                logger.info(f"Not caching clip from fallback provider '{provider_used}'.")
+            self.store.put(clip_id, audio)
+            if self.disk is not None and clip_id == key:
+                self.disk.put(key, audio)
+            future.set_result(clip_id)
+            return clip_id
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved in case nobody else was waiting.
+            future.exception()
+            raise
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def stats(self) -> dict:
+        avg_generation_ms = self._generation_ms_total / self.misses if self.misses else 0.0
+        lookups = self.hits + self.coalesced + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "uncacheable": self.uncacheable,
+            "hit_ratio": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+            "avg_generation_ms": round(avg_generation_ms, 2),
+            "estimated_latency_saved_ms": round((self.hits + self.coalesced) * avg_generation_ms, 2),
+            "provider_calls_saved": self.hits + self.coalesced,
+            "provider_chars_saved": self.chars_saved,
+            "store": self.store.stats(),
+            "disk": self.disk.stats() if self.disk is not None else None,
+        }
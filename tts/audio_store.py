@@ -0,0 +1,266 @@
+# tts/audio_store.py
+
+import logging
+import os
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+from utils.audio_janitor import AudioJanitor
+
+logger = logging.getLogger(__name__)
+
+CLIP_SUFFIX = ".wav"
+
+
+def new_clip_id() -> str:
+    return uuid.uuid4().hex
+
+
+class AudioStore(ABC):
+    """Where finished, telephony-ready clips live until the call leg fetches them.
+
+    Clips are addressed by an opaque id and served at `/audio/<id>.wav`. All
+    backends are safe to share between threads, because main.py serves the
+    store from FastAPI while the SignalWire consumer fills it from another loop.
+    """
+
+    @abstractmethod
+    def get(self, clip_id: str) -> Optional[bytes]:
+        """The clip, or None if it is unknown or has expired."""
+
+    @abstractmethod
+    def put(self, clip_id: str, data: bytes):
+        """Stores `data` under `clip_id`, replacing any clip already there."""
+
+    def __contains__(self, clip_id: str) -> bool:
+        return self.get(clip_id) is not None
+
+    @abstractmethod
+    def stats(self) -> dict:
+        """Counters and sizes for the stats endpoints."""
+
+
+class MemoryAudioStore(AudioStore):
+    """Byte-bounded LRU of recent clips held in RAM, each expiring `ttl` seconds after its last use.
+
+    Reading a clip refreshes its expiry, so the LRU order is also the expiry
+    order and expired clips are always found at the cold end. Clips evicted for
+    space (not expired ones) are handed to `on_evict`, which is how the
+    spill-to-disk backend keeps them.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float, on_evict: Optional[Callable[[str, bytes], None]] = None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self._clips: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _drop(self, clip_id: str) -> bytes:
+        data, _ = self._clips.pop(clip_id)
+        self._total_bytes -= len(data)
+        return data
+
+    def _expire(self, now: float):
+        while self._clips:
+            clip_id, (_, expires_at) = next(iter(self._clips.items()))
+            if expires_at > now:
+                break
+            self._drop(clip_id)
+            self.expirations += 1
+
+    def get(self, clip_id: str) -> Optional[bytes]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._clips.get(clip_id)
+            if entry is None or entry[1] <= now:
+                if entry is not None:
+                    self._drop(clip_id)
+                    self.expirations += 1
+                self.misses += 1
+                return None
+            self._clips[clip_id] = (entry[0], now + self.ttl)
+            self._clips.move_to_end(clip_id)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, clip_id: str, data: bytes):
+        data = bytes(data)
+        now = time.monotonic()
+        evicted = []
+        with self._lock:
+            if clip_id in self._clips:
+                self._drop(clip_id)
+            self._clips[clip_id] = (data, now + self.ttl)
+            self._total_bytes += len(data)
+            self._expire(now)
+            while self._total_bytes > self.max_bytes and len(self._clips) > 1:
+                old_id = next(iter(self._clips))
+                evicted.append((old_id, self._drop(old_id)))
+                self.evictions += 1
+        if self.on_evict:
+            for old_id, old_data in evicted:
+                self.on_evict(old_id, old_data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._expire(time.monotonic())
+            return {
+                "backend": "memory",
+                "clips": len(self._clips),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+class DiskAudioStore(AudioStore):
+    """Clips stored as `<id>.wav` files in `directory`.
+
+    Expiry and the byte budget are enforced by `janitor`, which sweeps this
+    directory. Every read refreshes the file's mtime, so the janitor's
+    oldest-first eviction is LRU and recency survives restarts.
+    """
+
+    def __init__(self, directory: str, janitor: AudioJanitor):
+        self.directory = directory
+        self.janitor = janitor
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._load_index()
+        janitor.on_remove(self._forget)
+
+    def _path(self, clip_id: str) -> str:
+        return os.path.join(self.directory, f"{clip_id}{CLIP_SUFFIX}")
+
+    def _load_index(self):
+        """Rebuild the LRU index from whatever is already on disk."""
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.is_file() or not entry.name.endswith(CLIP_SUFFIX):
+                    continue
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name[:-len(CLIP_SUFFIX)], stat.st_size))
+        for _, clip_id, size in sorted(entries):
+            self._index[clip_id] = size
+            self._total_bytes += size
+        logger.info(f"Disk audio store loaded {len(self._index)} clips ({self._total_bytes} bytes) from {self.directory}")
+
+    def _forget(self, path: str):
+        """Drops a clip the janitor removed from the index."""
+        directory, filename = os.path.split(path)
+        if os.path.abspath(directory) != os.path.abspath(self.directory) or not filename.endswith(CLIP_SUFFIX):
+            return
+        with self._lock:
+            size = self._index.pop(filename[:-len(CLIP_SUFFIX)], None)
+            if size is not None:
+                self._total_bytes -= size
+
+    def get(self, clip_id: str) -> Optional[bytes]:
+        with self._lock:
+            if clip_id not in self._index:
+                self.misses += 1
+                return None
+            path = self._path(clip_id)
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+                os.utime(path)
+            except FileNotFoundError:
+                # The file was removed behind our back; forget it.
+                self._total_bytes -= self._index.pop(clip_id)
+                self.misses += 1
+                return None
+            self._index.move_to_end(clip_id)
+            self.hits += 1
+            return data
+
+    def __contains__(self, clip_id: str) -> bool:
+        with self._lock:
+            return clip_id in self._index
+
+    def put(self, clip_id: str, data: bytes):
+        path = self._path(clip_id)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        with self._lock:
+            os.replace(tmp_path, path)
+            if clip_id in self._index:
+                self._total_bytes -= self._index.pop(clip_id)
+            self._index[clip_id] = len(data)
+            self._total_bytes += len(data)
+        self.janitor.track(path, len(data))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": "disk",
+                "clips": len(self._index),
+                "bytes": self._total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+class SpillingAudioStore(AudioStore):
+    """RAM first; clips pushed out of memory for space are kept on disk and promoted back on a hit."""
+
+    def __init__(self, memory_max_bytes: int, ttl: float, directory: str, janitor: AudioJanitor):
+        self.disk = DiskAudioStore(directory, janitor)
+        self.memory = MemoryAudioStore(memory_max_bytes, ttl, on_evict=self.disk.put)
+
+    def get(self, clip_id: str) -> Optional[bytes]:
+        data = self.memory.get(clip_id)
+        if data is None:
+            data = self.disk.get(clip_id)
+            if data is not None:
+                self.memory.put(clip_id, data)
+        return data
+
+    def __contains__(self, clip_id: str) -> bool:
+        return clip_id in self.memory or clip_id in self.disk
+
+    def put(self, clip_id: str, data: bytes):
+        self.memory.put(clip_id, data)
+
+    def stats(self) -> dict:
+        return {"backend": "spill", "memory": self.memory.stats(), "disk": self.disk.stats()}
+
+
+def create_audio_store(backend: str, max_bytes: int, ttl: float, directory: str, janitor: AudioJanitor) -> AudioStore:
+    """Builds the store selected by AUDIO_STORE_BACKEND: "memory" (default), "spill" or "disk".
+
+    `janitor` must be sweeping `directory`; it is what bounds the disk-backed stores.
+    """
+    if backend == "memory":
+        store = MemoryAudioStore(max_bytes, ttl)
+    elif backend == "spill":
+        store = SpillingAudioStore(max_bytes, ttl, directory, janitor)
+    elif backend == "disk":
+        store = DiskAudioStore(directory, janitor)
+    else:
+        raise ValueError(f"Unknown audio store backend: {backend}")
+    logger.info(f"Using '{backend}' audio store.")
+    return store
@@ -0,0 +1,151 @@
+# tts/chunking.py
+
+import asyncio
+import re
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?…])[\"')\]]*\s+")
+_CLAUSE_BOUNDARY = re.compile(r"(?<=[,;:—–])\s+")
+
+
+def _split_long(sentence: str, max_chars: int) -> List[str]:
+    """Splits a sentence at clause boundaries so no piece exceeds `max_chars` where possible."""
+    if len(sentence) <= max_chars:
+        return [sentence]
+    pieces, current = [], ""
+    for clause in _CLAUSE_BOUNDARY.split(sentence):
+        if current and len(current) + 1 + len(clause) > max_chars:
+            pieces.append(current)
+            current = clause
+        else:
+            current = f"{current} {clause}" if current else clause
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_for_tts(text: str, max_chars: int = 180, first_chunk_max_chars: int = 80, min_chars: int = 20) -> List[str]:
+    """Splits a response into speakable chunks at sentence, then clause, boundaries.
+
+    The first chunk is kept short so it can be synthesized and played as soon
+    as possible; fragments shorter than `min_chars` are merged into their
+    neighbour to avoid choppy prosody between clips.
+    """
+    text = " ".join(text.split())
+    if not text:
+        return []
+
+    chunks: List[str] = []
+    for sentence in _SENTENCE_BOUNDARY.split(text):
+        if not sentence:
+            continue
+        if not chunks:
+            # Only the opening piece is held to the tighter limit.
+            head, *rest = _split_long(sentence, first_chunk_max_chars)
+            chunks.append(head)
+            if rest:
+                chunks.extend(_split_long(" ".join(rest), max_chars))
+        else:
+            chunks.extend(_split_long(sentence, max_chars))
+
+    merged: List[str] = []
+    for chunk in chunks:
+        if merged and (len(chunk) < min_chars or len(merged[-1]) < min_chars):
+            merged[-1] = f"{merged[-1]} {chunk}"
+        else:
+            merged.append(chunk)
+    return merged
+
+
+class SentenceAccumulator:
+    """Cuts streamed text (e.g. LLM tokens) into speakable chunks as soon as each is complete.
+
+    The incremental counterpart of `split_for_tts`: a chunk ends at a sentence
+    boundary, one that grows past `max_chars` is cut at its last clause
+    boundary, and pieces shorter than `min_chars` are held back to be merged
+    with what follows. A boundary is only certain once the whitespace after it
+    has arrived, so a chunk is released one token after its full stop.
+    """
+
+    def __init__(self, max_chars: int = 180, min_chars: int = 20):
+        self.max_chars = max_chars
+        self.min_chars = min_chars
+        self._buffer = ""
+
+    def feed(self, text: str) -> List[str]:
+        """Adds text and returns the chunks it completed."""
+        self._buffer += text
+        chunks = []
+        while True:
+            boundary = next((m for m in _SENTENCE_BOUNDARY.finditer(self._buffer) if m.start() >= self.min_chars), None)
+            if boundary is None and len(self._buffer) > self.max_chars:
+                clauses = [m for m in _CLAUSE_BOUNDARY.finditer(self._buffer) if self.min_chars <= m.start() <= self.max_chars]
+                boundary = clauses[-1] if clauses else None
+            if boundary is None:
+                return chunks
+            chunks.append(" ".join(self._buffer[:boundary.start()].split()))
+            self._buffer = self._buffer[boundary.end():]
+
+    def flush(self) -> Optional[str]:
+        """Ends the stream; returns whatever is left as the last chunk."""
+        rest = " ".join(self._buffer.split())
+        self._buffer = ""
+        return rest or None
+
+
+async def synthesize_in_order(chunks: List[str], synthesize: Callable[[str], Awaitable[T]]) -> AsyncIterator[T]:
+    """Starts synthesis of every chunk at once and yields the results in chunk order.
+
+    Tasks are created in order, so the first chunk is first in line for any
+    provider concurrency limit. Abandoning the iterator (e.g. on barge-in)
+    cancels whatever is still being generated.
+    """
+    tasks = [asyncio.create_task(synthesize(chunk)) for chunk in chunks]
+    try:
+        for task in tasks:
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def synthesize_as_ready(chunks: AsyncIterator[str], synthesize: Callable[[str], Awaitable[T]]) -> AsyncIterator[T]:
+    """`synthesize_in_order` for chunks that are still arriving, e.g. from a streaming LLM.
+
+    Each chunk's synthesis starts the moment it arrives and results are yielded
+    in chunk order. An error from `chunks` is raised once the chunks before it
+    have been yielded. Abandoning the iterator cancels pending synthesis and
+    closes `chunks`.
+    """
+    pending: "asyncio.Queue[Optional[asyncio.Task]]" = asyncio.Queue()
+
+    async def feed():
+        try:
+            async for chunk in chunks:
+                pending.put_nowait(asyncio.create_task(synthesize(chunk)))
+        finally:
+            pending.put_nowait(None)
+
+    feeder = asyncio.create_task(feed())
+    tasks = []
+    try:
+        while True:
+            task = await pending.get()
+            if task is None:
+                break
+            tasks.append(task)
+            yield await task
+        await feeder
+    finally:
+        feeder.cancel()
+        await asyncio.gather(feeder, return_exceptions=True)
+        while not pending.empty():
+            task = pending.get_nowait()
+            if task is not None:
+                tasks.append(task)
+        for task in tasks:
+            task.cancel()
+        if hasattr(chunks, "aclose"):
+            await chunks.aclose()
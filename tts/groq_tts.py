@@ -0,0 +1,134 @@
+# tts/groq_tts.py
+
+import asyncio
+import logging
+import time
+from typing import Dict, Optional
+
+import httpx
+from groq import AsyncGroq
+
+logger = logging.getLogger(__name__)
+
+
+class _LoopState:
+    """Connection pool and concurrency limit bound to a single event loop."""
+
+    def __init__(self, client: AsyncGroq, http_client: httpx.AsyncClient, max_concurrency: int):
+        self.client = client
+        self.http_client = http_client
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+
+
+class GroqTTSClient:
+    """Non-blocking Groq TTS client with a shared keep-alive connection pool.
+
+    Each event loop that uses the client gets its own pooled `httpx.AsyncClient`
+    and concurrency semaphore, because neither can be shared across loops (the
+    merged service in main.py runs FastAPI and the SignalWire consumer on
+    separate loops). Audio is streamed into an in-memory buffer that is handed
+    straight to the transcoder; nothing is written to disk.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        model: str,
+        voice: str,
+        max_concurrency: int = 8,
+        timeout: float = 8.0,
+        connect_timeout: float = 2.0,
+        max_connections: int = 20,
+        keepalive_expiry: float = 60.0,
+        max_retries: int = 0,
+    ):
+        self.api_key = api_key
+        self.model = model
+        self.voice = voice
+        self.max_concurrency = max_concurrency
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.max_retries = max_retries
+        self._states: Dict[asyncio.AbstractEventLoop, _LoopState] = {}
+
+        self.requests = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.in_flight = 0
+        self.waiting = 0
+        self.bytes_received = 0
+
+    def _state(self) -> _LoopState:
+        loop = asyncio.get_running_loop()
+        state = self._states.get(loop)
+        if state is None:
+            http_client = httpx.AsyncClient(limits=self.limits, timeout=self.timeout)
+            client = AsyncGroq(
+                api_key=self.api_key,
+                http_client=http_client,
+                timeout=self.timeout,
+                max_retries=self.max_retries,
+            )
+            state = _LoopState(client, http_client, self.max_concurrency)
+            self._states[loop] = state
+            logger.info(f"Created pooled Groq TTS client (max {self.limits.max_connections} connections).")
+        return state
+
+    async def synthesize(self, text: str, voice: Optional[str] = None) -> bytearray:
+        """Synthesizes `text` and returns the WAV body as it arrived on the wire."""
+        state = self._state()
+        self.waiting += 1
+        try:
+            await state.semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.requests += 1
+        self.in_flight += 1
+        start_time = time.monotonic()
+        try:
+            audio = bytearray()
+            async with state.client.audio.speech.with_streaming_response.create(
+                model=self.model,
+                voice=voice or self.voice,
+                input=text,
+                response_format="wav",
+            ) as response:
+                async for chunk in response.iter_bytes():
+                    audio.extend(chunk)
+            self.bytes_received += len(audio)
+            latency = (time.monotonic() - start_time) * 1000
+            logger.info(f"Groq TTS Latency: {latency:.2f} ms ({len(audio)} bytes)")
+            return audio
+        except httpx.TimeoutException:
+            self.timeouts += 1
+            self.failures += 1
+            raise
+        except Exception:
+            self.failures += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            state.semaphore.release()
+
+    async def aclose(self):
+        """Closes the connection pool owned by the current event loop."""
+        state = self._states.pop(asyncio.get_running_loop(), None)
+        if state:
+            await state.http_client.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "max_concurrency": self.max_concurrency,
+            "bytes_received": self.bytes_received,
+            "pools": len(self._states),
+        }
@@ -1,28 +1,221 @@
 # tts/piper_tts.py
 
+import asyncio
 import logging
+import multiprocessing
 import tempfile
+import threading
 import os
+from collections import deque
 from typing import Optional
 import numpy as np
 
 from app.core.config import (
     PIPER_MODEL_PATH,
-    PIPER_CONFIG_PATH
+    PIPER_CONFIG_PATH,
+    PIPER_POOL_WORKERS,
+    PIPER_POOL_MAX_PENDING
 )
 
 logger = logging.getLogger(__name__)
 
+# --- Worker-process side of the synthesis pool ---
+_worker_voice = None
+
+def _load_worker_voice(model_path: str, config_path: str):
+    """Pool initializer: loads the voice once per worker process."""
+    global _worker_voice
+    try:
+        from piper import PiperVoice
+        _worker_voice = PiperVoice.load(model_path, config_path=config_path)
+    except Exception as e:
+        # Raising here would make multiprocessing respawn the worker forever.
+        logging.getLogger(__name__).error(f"Piper worker {os.getpid()} failed to load voice: {e}")
+        _worker_voice = None
+
+def _worker_ready(_=None) -> bool:
+    return _worker_voice is not None
+
+def _synthesize_in_worker(text: str) -> bytes:
+    if _worker_voice is None:
+        raise RuntimeError(f"Piper voice not loaded in worker {os.getpid()}")
+    return _worker_voice.synthesize(text)
+
+
+class PiperSynthesisPool:
+    """Pool of worker processes that each hold a preloaded Piper voice.
+
+    Text goes to the workers over the pool's task queue and WAV bytes come back,
+    so ONNX inference never runs on the caller's event loop and throughput
+    scales with the number of cores. At most `max_pending` jobs are handed to
+    the pool at once, across every event loop in the process; further callers
+    wait (backpressure) and are counted in `waiting`. A job keeps its slot
+    until the pool finishes it, even if its caller was cancelled meanwhile
+    (e.g. the losing side of a hedged request).
+    """
+
+    def __init__(self, model_path: str, config_path: str, workers: int, max_pending: Optional[int] = None):
+        self.model_path = model_path
+        self.config_path = config_path
+        self.workers = workers
+        self.max_pending = max_pending or workers * 2
+        self._pool = None
+        # Slot accounting is shared by all loops and released from the pool's result thread.
+        self._lock = threading.Lock()
+        self._waiters = deque()
+
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.pending = 0
+
+    def start(self) -> bool:
+        """Starts all workers (each loads the voice in its initializer) and checks the voice loaded. Blocking."""
+        # 'spawn' keeps workers clear of the parent's threads and event loops.
+        context = multiprocessing.get_context("spawn")
+        self._pool = context.Pool(
+            processes=self.workers,
+            initializer=_load_worker_voice,
+            initargs=(self.model_path, self.config_path),
+        )
+        try:
+            ready = self._pool.map(_worker_ready, range(self.workers), chunksize=1)
+        except Exception as e:
+            logger.error(f"Piper pool failed to start: {e}")
+            ready = [False]
+        if not all(ready):
+            self.close()
+            return False
+        logger.info(f"Piper synthesis pool started with {self.workers} workers.")
+        return True
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def _acquire_slot(self):
+        """Waits for one of the `max_pending` slots, first come first served."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self.pending < self.max_pending and not self._waiters:
+                self.pending += 1
+                return
+            granted = loop.create_future()
+            self._waiters.append((loop, granted))
+        try:
+            await granted
+        except asyncio.CancelledError:
+            with self._lock:
+                if (loop, granted) in self._waiters:
+                    self._waiters.remove((loop, granted))
+                    raise
+            if granted.done() and not granted.cancelled():
+                # Handed a slot in the same instant we were cancelled; pass it on.
+                self._release_slot()
+            # Otherwise the hand-over is still in flight and _grant passes it on.
+            raise
+
+    def _grant(self, granted: asyncio.Future):
+        if granted.cancelled():
+            self._release_slot()
+        else:
+            granted.set_result(None)
+
+    def _release_slot(self):
+        """Frees a slot, or hands it straight to the next waiter. Called from any thread."""
+        while True:
+            with self._lock:
+                if not self._waiters:
+                    self.pending -= 1
+                    return
+                loop, granted = self._waiters.popleft()
+            try:
+                loop.call_soon_threadsafe(self._grant, granted)
+                return
+            except RuntimeError:
+                continue  # that waiter's loop is closed; try the next one
+
+    async def synthesize(self, text: str) -> bytes:
+        loop = asyncio.get_running_loop()
+        await self._acquire_slot()
+
+        self.submitted += 1
+        future = loop.create_future()
+
+        def deliver(settle):
+            try:
+                loop.call_soon_threadsafe(lambda: future.done() or settle())
+            except RuntimeError:
+                pass  # the caller's loop is gone
+
+        # The slot is released when the job finishes, not when the caller stops waiting.
+        def on_result(audio_bytes):
+            self._release_slot()
+            deliver(lambda: future.set_result(audio_bytes))
+
+        def on_error(error):
+            self._release_slot()
+            deliver(lambda: future.set_exception(error))
+
+        try:
+            self._pool.apply_async(_synthesize_in_worker, (text,), callback=on_result, error_callback=on_error)
+        except Exception:
+            self._release_slot()
+            self.failed += 1
+            raise
+        try:
+            audio_bytes = await future
+            self.completed += 1
+            return audio_bytes
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+
+    def close(self):
+        if self._pool:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "queue_depth": max(0, self.pending - self.workers) + self.waiting,
+            "waiting": self.waiting,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+        }
+
+
 class PiperTTS:
     """Text-to-Speech service using Piper"""
     
-    def __init__(self):
+    def __init__(self, pool_workers: Optional[int] = None):
         self.model = None
+        self.pool = None
         self.model_path = PIPER_MODEL_PATH
         self.config_path = PIPER_CONFIG_PATH
+        self.pool_workers = PIPER_POOL_WORKERS if pool_workers is None else pool_workers
+
+    @property
+    def available(self) -> bool:
+        """True once either the synthesis pool or an in-process voice is ready."""
+        return self.pool is not None or self.model is not None
         
     async def initialize(self):
-        """Initialize the Piper TTS model"""
+        """Initialize the Piper TTS synthesis pool, or the in-process model if the pool is disabled"""
+        if self.pool_workers > 0:
+            pool = PiperSynthesisPool(self.model_path, self.config_path, self.pool_workers, PIPER_POOL_MAX_PENDING)
+            if await asyncio.to_thread(pool.start):
+                self.pool = pool
+                return
+            logger.warning("Piper synthesis pool unavailable. Loading the voice in-process instead.")
+
         try:
             # Import here to avoid loading the model until needed
             from piper import PiperVoice
@@ -77,7 +270,7 @@ class PiperTTS:
         Returns:
             bytes: Audio data in WAV format or None if conversion failed
         """
-        if not self.model:
+        if not self.available:
             logger.error("TTS model not initialized")
             return None
         if not text or not text.strip():
@@ -87,16 +280,27 @@ class PiperTTS:
         try:
             # The updated synthesize method returns audio bytes directly.
             logger.info(f"Converting to speech...")
-            audio_bytes = self.model.synthesize(text)
+            if self.pool:
+                audio_bytes = await self.pool.synthesize(text)
+            else:
+                # Keep ONNX inference off the event loop even without the pool.
+                audio_bytes = await asyncio.to_thread(self.model.synthesize, text)
             logger.info(f"Piper audio generated: {len(audio_bytes)} bytes")
             return audio_bytes
         except Exception as e:
             logger.error(f"Error with Piper TTS: {e}", exc_info=True)
             return None
     
+    def stats(self) -> dict:
+        """Pool queue depth and throughput counters (empty when running in-process)."""
+        return self.pool.stats() if self.pool else {}
+
     async def cleanup(self):
         """Clean up TTS resources"""
         try:
+            if self.pool:
+                await asyncio.to_thread(self.pool.close)
+                self.pool = None
             self.model = None
             logger.info("TTS service cleaned up")
             
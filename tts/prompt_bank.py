@@ -0,0 +1,118 @@
+# tts/prompt_bank.py
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from typing import Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Every fixed system utterance lives here. Call handlers refer to them by id.
+PROMPTS: Dict[str, str] = {
+    "greeting": "Hello! Thank you for calling. How can I help you today?",
+    "aura_greeting": "Hello! I'm Aura, your AI assistant. How can I help you today?",
+    "system_error": "I am sorry, a system error occurred.",
+    "retry": "I'm having a little trouble. Could you say that again?",
+    "no_response": "I'm sorry, I don't have a response for that.",
+    "hold": "Thanks for calling. All of our lines are busy right now. Please stay on the line and we'll be with you shortly.",
+    "busy": "Sorry, we can't take your call right now. Please try again in a few minutes. Goodbye.",
+    "filler_check": "Let me check that.",
+    "filler_mhm": "Mm-hm.",
+    "filler_moment": "One moment.",
+}
+
+# Played while a slow turn's reply is still being prepared, in turn.
+FILLER_PROMPT_IDS = ("filler_check", "filler_mhm", "filler_moment")
+
+MANIFEST_FILENAME = "manifest.json"
+
+
+def prompt_path(prompt_id: str) -> str:
+    """The stable URL path a prompt is served under."""
+    return f"/prompts/{prompt_id}.wav"
+
+
+class PromptBank:
+    """Fixed system prompts rendered once, held in memory and served by id.
+
+    `render` turns text into final, telephony-ready WAV bytes. `fingerprint`
+    describes everything besides the text that affects the audio (provider,
+    voice, codec); a build-time artifact is only reused when both match.
+    """
+
+    def __init__(self, render: Callable[[str], Awaitable[bytes]], fingerprint: str, prompts: Dict[str, str] = PROMPTS):
+        self.render = render
+        self.fingerprint = fingerprint
+        self.prompts = dict(prompts)
+        self._audio: Dict[str, bytes] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def _digest(self, prompt_id: str) -> str:
+        material = f"{self.fingerprint}\x1f{self.prompts[prompt_id]}"
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def text(self, prompt_id: str) -> str:
+        return self.prompts[prompt_id]
+
+    def get(self, prompt_id: str) -> Optional[bytes]:
+        return self._audio.get(prompt_id)
+
+    def url(self, base_url: str, prompt_id: str) -> str:
+        return f"{base_url}{prompt_path(prompt_id)}"
+
+    def load_artifact(self, directory: str) -> int:
+        """Loads prompts from a build-time artifact; stale or missing entries are skipped."""
+        manifest_path = os.path.join(directory, MANIFEST_FILENAME)
+        if not os.path.exists(manifest_path):
+            return 0
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        loaded = 0
+        for prompt_id in self.prompts:
+            if manifest.get(prompt_id) != self._digest(prompt_id):
+                continue
+            with open(os.path.join(directory, f"{prompt_id}.wav"), "rb") as f:
+                self._audio[prompt_id] = f.read()
+            loaded += 1
+        logger.info(f"Loaded {loaded}/{len(self.prompts)} prompts from artifact {directory}")
+        return loaded
+
+    def save_artifact(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        manifest = {}
+        for prompt_id, audio in self._audio.items():
+            with open(os.path.join(directory, f"{prompt_id}.wav"), "wb") as f:
+                f.write(audio)
+            manifest[prompt_id] = self._digest(prompt_id)
+        with open(os.path.join(directory, MANIFEST_FILENAME), "w") as f:
+            json.dump(manifest, f, indent=2)
+        logger.info(f"Saved {len(manifest)} prompts to {directory}")
+
+    async def ensure(self, prompt_id: str) -> Optional[bytes]:
+        """Returns a prompt's audio, rendering it now if startup rendering failed."""
+        if prompt_id not in self.prompts:
+            return None
+        if prompt_id in self._audio:
+            return self._audio[prompt_id]
+        lock = self._locks.setdefault(prompt_id, asyncio.Lock())
+        async with lock:
+            if prompt_id not in self._audio:
+                try:
+                    self._audio[prompt_id] = await self.render(self.prompts[prompt_id])
+                except Exception as e:
+                    logger.error(f"Failed to render prompt '{prompt_id}': {e}", exc_info=True)
+                    return None
+        return self._audio[prompt_id]
+
+    async def load(self, artifact_dir: Optional[str] = None):
+        """Loads the artifact if there is one, then renders whatever is still missing."""
+        if artifact_dir:
+            try:
+                self.load_artifact(artifact_dir)
+            except Exception as e:
+                logger.error(f"Could not load prompt artifact from {artifact_dir}: {e}", exc_info=True)
+        missing = [prompt_id for prompt_id in self.prompts if prompt_id not in self._audio]
+        await asyncio.gather(*(self.ensure(prompt_id) for prompt_id in missing))
+        logger.info(f"Prompt bank ready: {len(self._audio)}/{len(self.prompts)} prompts in memory.")
@@ -0,0 +1,282 @@
+# tts/provider_router.py
+
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
+from utils.tracing import percentile
+
+logger = logging.getLogger(__name__)
+
+# Provider errors that will not go away by retrying; they open the breaker at once.
+FATAL_ERROR_MARKERS = ("model_terms_required", "invalid_api_key", "model_not_found")
+
+
+def is_fatal_error(error: Exception) -> bool:
+    """True for errors such as `model_terms_required` or a rejected API key."""
+    status_code = getattr(error, "status_code", None) or getattr(error, "status", None)
+    if status_code in (401, 403, 404):
+        return True
+    message = str(error)
+    return any(marker in message for marker in FATAL_ERROR_MARKERS)
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(value, 2)
+
+
+class LatencyTracker:
+    """Rolling window of a provider's successful-call latencies."""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+
+    def record(self, latency_ms: float):
+        self._samples.append(latency_ms)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        return percentile(self._samples, pct)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+
+class CircuitBreaker:
+    """Skips a provider for `cooldown` seconds after `failure_threshold` consecutive failures.
+
+    When a Redis client is given, a trip is published as a key that expires
+    with the cool-down, so every process sharing that Redis skips the provider
+    too. Remote state is polled at most every `sync_interval` seconds, which
+    keeps Redis off the hot path. Inside an event loop the Redis reads and
+    writes run on the default executor, so a slow or unreachable Redis never
+    stalls the loop; `allow()` answers from the last state it saw. Redis errors
+    never affect synthesis.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 3,
+        cooldown: float = 30.0,
+        redis_client: Any = None,
+        sync_interval: float = 1.0,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.redis = redis_client
+        self.sync_interval = sync_interval
+        self.redis_key = f"tts:breaker:{name}"
+        self._failures = 0
+        self._open_until = 0.0
+        self._next_sync = 0.0
+        self._syncing = False
+
+        self.trips = 0
+        self.skipped = 0
+
+    @staticmethod
+    def _off_loop(work: Callable[[], None]) -> bool:
+        """Runs `work` on the default executor if this thread has a running loop.
+
+        Returns False when there is no loop, in which case the caller runs it inline.
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+        loop.run_in_executor(None, work)
+        return True
+
+    def _read_shared_state(self):
+        try:
+            ttl_ms = self.redis.pttl(self.redis_key)
+        except Exception as e:
+            logger.debug(f"Breaker '{self.name}' could not read shared state: {e}")
+            return
+        finally:
+            self._syncing = False
+        if ttl_ms and ttl_ms > 0:
+            self._open_until = max(self._open_until, time.monotonic() + ttl_ms / 1000)
+
+    def _publish_trip(self):
+        try:
+            self.redis.set(self.redis_key, "open", px=int(self.cooldown * 1000))
+        except Exception as e:
+            logger.debug(f"Breaker '{self.name}' could not publish shared state: {e}")
+
+    def _sync_from_redis(self, now: float):
+        if self.redis is None or self._syncing or now < self._next_sync:
+            return
+        self._next_sync = now + self.sync_interval
+        self._syncing = True
+        if not self._off_loop(self._read_shared_state):
+            self._read_shared_state()
+
+    def allow(self) -> bool:
+        now = time.monotonic()
+        self._sync_from_redis(now)
+        if now < self._open_until:
+            self.skipped += 1
+            return False
+        return True
+
+    @property
+    def is_open(self) -> bool:
+        return time.monotonic() < self._open_until
+
+    def record_success(self):
+        self._failures = 0
+
+    def record_failure(self, fatal: bool = False):
+        self._failures += 1
+        if fatal or self._failures >= self.failure_threshold:
+            self.trip()
+
+    def trip(self):
+        self._failures = 0
+        self._open_until = time.monotonic() + self.cooldown
+        self.trips += 1
+        logger.warning(f"Circuit breaker for '{self.name}' open for {self.cooldown:.0f}s.")
+        if self.redis is not None and not self._off_loop(self._publish_trip):
+            self._publish_trip()
+
+    def stats(self) -> dict:
+        return {
+            "open": self.is_open,
+            "consecutive_failures": self._failures,
+            "trips": self.trips,
+            "skipped": self.skipped,
+            "shared": self.redis is not None,
+        }
+
+
+@dataclass
+class TTSProvider:
+    """A named synthesis function plus its breaker and latency history."""
+    name: str
+    synthesize: Callable[[str], Awaitable[bytes]]
+    breaker: CircuitBreaker
+    latency: LatencyTracker = field(default_factory=LatencyTracker)
+    calls: int = 0
+    failures: int = 0
+    hedge_wins: int = 0
+
+
+class AllProvidersFailed(Exception):
+    pass
+
+
+class TTSProviderRouter:
+    """Sends each synthesis to the first healthy provider, in priority order.
+
+    A provider whose breaker is open is skipped outright instead of paying its
+    timeout again. With `hedge` enabled, the next provider is started once the
+    current one has run past its p95 latency (clamped to
+    `[hedge_min_delay, hedge_max_delay]`, or `hedge_default_delay` until enough
+    samples exist) and whichever finishes first wins. The loser is cancelled.
+    """
+
+    def __init__(
+        self,
+        providers: List[TTSProvider],
+        hedge: bool = False,
+        hedge_min_delay: float = 0.3,
+        hedge_max_delay: float = 3.0,
+        hedge_default_delay: float = 1.5,
+        hedge_min_samples: int = 20,
+    ):
+        self.providers = providers
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_max_delay = hedge_max_delay
+        self.hedge_default_delay = hedge_default_delay
+        self.hedge_min_samples = hedge_min_samples
+        self.hedges_started = 0
+
+    def _hedge_delay(self, provider: TTSProvider) -> float:
+        p95 = provider.latency.percentile(95)
+        if p95 is None or len(provider.latency) < self.hedge_min_samples:
+            return self.hedge_default_delay
+        return min(self.hedge_max_delay, max(self.hedge_min_delay, p95 / 1000))
+
+    async def _call(self, provider: TTSProvider, text: str) -> Tuple[bytes, str]:
+        provider.calls += 1
+        start_time = time.monotonic()
+        try:
+            audio = await provider.synthesize(text)
+            if not audio:
+                raise ValueError(f"{provider.name} returned no audio.")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            provider.failures += 1
+            provider.breaker.record_failure(fatal=is_fatal_error(e))
+            logger.error(f"TTS provider '{provider.name}' failed: {e}")
+            raise
+        provider.latency.record((time.monotonic() - start_time) * 1000)
+        provider.breaker.record_success()
+        return audio, provider.name
+
+    async def synthesize(self, text: str) -> Tuple[bytes, str]:
+        """Returns `(audio, provider_name)` from the first provider to succeed."""
+        candidates = [provider for provider in self.providers if provider.breaker.allow()]
+        if not candidates:
+            # Everything is tripped; trying beats failing the turn outright.
+            candidates = list(self.providers)
+
+        pending = {}
+        hedges = set()
+        remaining = list(candidates)
+        errors = []
+        try:
+            while remaining or pending:
+                if not pending:
+                    provider = remaining.pop(0)
+                    pending[asyncio.create_task(self._call(provider, text))] = provider
+                timeout = None
+                if self.hedge and remaining and len(pending) == 1:
+                    timeout = self._hedge_delay(next(iter(pending.values())))
+
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    provider = remaining.pop(0)
+                    self.hedges_started += 1
+                    logger.info(f"Hedging TTS request with '{provider.name}' after {timeout:.2f}s.")
+                    hedge = asyncio.create_task(self._call(provider, text))
+                    hedges.add(hedge)
+                    pending[hedge] = provider
+                    continue
+
+                for task in done:
+                    provider = pending.pop(task)
+                    if task.exception() is None:
+                        if task in hedges:
+                            provider.hedge_wins += 1
+                        return task.result()
+                    errors.append(task.exception())
+        finally:
+            for task in pending:
+                task.cancel()
+        raise AllProvidersFailed(f"All TTS providers failed: {errors}")
+
+    def stats(self) -> dict:
+        return {
+            "hedge": self.hedge,
+            "hedges_started": self.hedges_started,
+            "providers": {
+                provider.name: {
+                    "calls": provider.calls,
+                    "failures": provider.failures,
+                    "hedge_wins": provider.hedge_wins,
+                    "p50_ms": _round(provider.latency.percentile(50)),
+                    "p95_ms": _round(provider.latency.percentile(95)),
+                    "hedge_delay_s": round(self._hedge_delay(provider), 3),
+                    "breaker": provider.breaker.stats(),
+                }
+                for provider in self.providers
+            },
+        }
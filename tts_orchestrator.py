@@ -1,14 +1,23 @@
 import logging
 import os
 import asyncio
-import subprocess
-import uuid
-from fastapi import FastAPI, HTTPException, BackgroundTasks
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from groq import Groq
+import json
+from typing import List, Optional
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse, Response
+from pydantic import BaseModel
 from dotenv import load_dotenv
+import redis
 from tts.piper_tts import PiperTTS
+from tts.audio_cache import TTSAudioCache
+from tts.audio_store import DiskAudioStore, create_audio_store
+from tts.groq_tts import GroqTTSClient
+from tts.chunking import split_for_tts, synthesize_in_order
+from tts.prompt_bank import PromptBank
+from tts.provider_router import AllProvidersFailed, CircuitBreaker, TTSProvider, TTSProviderRouter
+from utils.audio_janitor import AudioJanitor
+from utils.tracing import SpanRecorder, current_trace
+from utils.transcoder import transcode
 
 # --- Load Environment Variables & Configuration ---
 load_dotenv()
@@ -18,126 +27,313 @@ logger = logging.getLogger("TTSOrchestrator")
 GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
 # Define the target telephony format
 TELEPHONY_CODEC = os.environ.get("TELEPHONY_CODEC", "pcm_mulaw") 
-OPTIMIZED_AUDIO_DIR = "public_audio"
-RAW_AUDIO_DIR = "temp_raw_audio"
+GROQ_TTS_MODEL = os.environ.get("GROQ_TTS_MODEL", "playai-tts")
+GROQ_TTS_VOICE = os.environ.get("GROQ_TTS_VOICE", "Arista-PlayAI")
+GROQ_TTS_CONCURRENCY = int(os.environ.get("GROQ_TTS_CONCURRENCY", 8))
+GROQ_TTS_TIMEOUT = float(os.environ.get("GROQ_TTS_TIMEOUT", 8.0))
+GROQ_TTS_MAX_CONNECTIONS = int(os.environ.get("GROQ_TTS_MAX_CONNECTIONS", 20))
+# Provider routing: skip a failing provider for a cool-down, optionally hedge slow Groq calls with Piper.
+TTS_BREAKER_FAILURES = int(os.environ.get("TTS_BREAKER_FAILURES", 3))
+TTS_BREAKER_COOLDOWN = float(os.environ.get("TTS_BREAKER_COOLDOWN", 30))
+TTS_HEDGE = os.environ.get("TTS_HEDGE", "false").lower() == "true"
+TTS_HEDGE_DEFAULT_DELAY = float(os.environ.get("TTS_HEDGE_DEFAULT_DELAY", 1.5))
+# Shares breaker state with every other process on the same Redis.
+REDIS_URL = os.environ.get("REDIS_URL")
+# Finished clips are served from RAM; "spill" and "disk" also keep them under AUDIO_STORE_DIR.
+AUDIO_STORE_BACKEND = os.environ.get("AUDIO_STORE_BACKEND", "memory")
+AUDIO_STORE_MAX_BYTES = int(os.environ.get("AUDIO_STORE_MAX_BYTES", 128 * 1024 * 1024))
+AUDIO_STORE_TTL = float(os.environ.get("AUDIO_STORE_TTL", 600))
+AUDIO_STORE_DIR = os.environ.get("AUDIO_STORE_DIR", os.path.join("public_audio", "cache"))
+AUDIO_STORE_DISK_MAX_BYTES = int(os.environ.get("AUDIO_STORE_DISK_MAX_BYTES", 200 * 1024 * 1024))
+AUDIO_STORE_DISK_TTL = float(os.environ.get("AUDIO_STORE_DISK_TTL", 24 * 3600))
+# The TTS cache also writes every primary-voice clip here (LRU, bounded by the janitor), so
+# cached prompts survive restarts and quiet spells whichever backend serves /audio.
+TTS_CACHE_DIR = os.environ.get("TTS_CACHE_DIR", os.path.join("public_audio", "cache", "tts"))
+AUDIO_JANITOR_INTERVAL = float(os.environ.get("AUDIO_JANITOR_INTERVAL", 60))
+# Optional build-time artifact produced by build_prompt_bank.py
+PROMPT_BANK_DIR = os.environ.get("PROMPT_BANK_DIR", "prompt_bank")
+# Batch jobs get their own, smaller share of the provider concurrency so live calls keep headroom.
+BATCH_TTS_CONCURRENCY = int(os.environ.get("BATCH_TTS_CONCURRENCY", 4))
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", 500))
+PUBLIC_URL_BASE = os.environ.get("PUBLIC_URL_BASE") or os.environ.get("RENDER_EXTERNAL_URL")
 
 # --- FastAPI App & Services ---
 app = FastAPI()
-groq_client = Groq(api_key=GROQ_API_KEY)
+groq_tts_client = GroqTTSClient(
+    api_key=GROQ_API_KEY,
+    model=GROQ_TTS_MODEL,
+    voice=GROQ_TTS_VOICE,
+    max_concurrency=GROQ_TTS_CONCURRENCY,
+    timeout=GROQ_TTS_TIMEOUT,
+    max_connections=GROQ_TTS_MAX_CONNECTIONS,
+)
 piper_tts_service = PiperTTS()
 
-# --- Directory Setup ---
-for directory in [RAW_AUDIO_DIR, OPTIMIZED_AUDIO_DIR]:
-    if not os.path.exists(directory):
-        os.makedirs(directory)
-        logger.info(f"Created audio directory: {directory}")
+async def synthesize_with_piper(text: str) -> bytes:
+    if not piper_tts_service.available:
+        await piper_tts_service.initialize()
+    return await piper_tts_service.text_to_speech(text)
 
-app.mount("/audio", StaticFiles(directory=OPTIMIZED_AUDIO_DIR), name="audio")
+breaker_redis = redis.from_url(REDIS_URL, socket_timeout=0.2, socket_connect_timeout=0.2) if REDIS_URL else None
+tts_providers = []
+if GROQ_API_KEY:
+    tts_providers.append(TTSProvider(
+        "groq", groq_tts_client.synthesize,
+        CircuitBreaker("groq", TTS_BREAKER_FAILURES, TTS_BREAKER_COOLDOWN, redis_client=breaker_redis),
+    ))
+# Piper runs in-process, so its health is not shared with other hosts.
+tts_providers.append(TTSProvider("piper", synthesize_with_piper, CircuitBreaker("piper", TTS_BREAKER_FAILURES, TTS_BREAKER_COOLDOWN)))
+tts_router = TTSProviderRouter(tts_providers, hedge=TTS_HEDGE, hedge_default_delay=TTS_HEDGE_DEFAULT_DELAY)
+# TTS and transcode spans for the relay's per-turn trace (the `trace_id` request parameter).
+tracer = SpanRecorder("orchestrator", REDIS_URL)
 
-# --- Helper Functions ---
-def cleanup_file(path: str):
-    """Removes a file and logs the action."""
-    try:
-        if os.path.exists(path):
-            os.remove(path)
-            logger.info(f"Cleaned up file: {path}")
-    except Exception as e:
-        logger.error(f"Error cleaning up file {path}: {e}")
+audio_janitor = AudioJanitor(
+    [AUDIO_STORE_DIR, TTS_CACHE_DIR],
+    ttl=AUDIO_STORE_DISK_TTL,
+    max_bytes=AUDIO_STORE_DISK_MAX_BYTES,
+    interval=AUDIO_JANITOR_INTERVAL,
+)
+audio_store = create_audio_store(
+    AUDIO_STORE_BACKEND,
+    max_bytes=AUDIO_STORE_MAX_BYTES,
+    ttl=AUDIO_STORE_TTL,
+    directory=AUDIO_STORE_DIR,
+    janitor=audio_janitor,
+)
+# With the "disk" backend the served clips are already on disk; the cache needs no second copy.
+tts_cache = TTSAudioCache(audio_store, disk=None if AUDIO_STORE_BACKEND == "disk" else DiskAudioStore(TTS_CACHE_DIR, audio_janitor))
+
+async def render_prompt(text: str) -> bytes:
+    optimized_audio, provider_used = await synthesize_telephony_audio(text)
+    primary_provider = "groq" if GROQ_API_KEY else "piper"
+    if provider_used != primary_provider:
+        # Same rule as the TTS cache: never pin fallback audio under the primary voice.
+        raise RuntimeError(f"Prompt rendered by fallback provider '{provider_used}'.")
+    return optimized_audio
 
-async def generate_tts_audio(text: str, background_tasks: BackgroundTasks) -> str:
+prompt_bank = PromptBank(render_prompt, fingerprint=f"{GROQ_TTS_MODEL}:{GROQ_TTS_VOICE}:{TELEPHONY_CODEC}")
+
+# --- Helper Functions ---
+async def generate_tts_audio(text: str) -> str:
     """
-    Orchestrates TTS generation, transcodes it to the proper telephony format,
-    and returns the final filename.
+    Returns the filename (relative to /audio) of a telephony-ready clip for `text`,
+    serving it from the TTS cache when the same prompt was rendered before.
+    The clip lives in the audio store; nothing touches the filesystem here.
     """
-    request_id = str(uuid.uuid4())
-    # Define paths for the initial high-quality file and the final transcoded file
-    raw_filepath = os.path.join(RAW_AUDIO_DIR, f"{request_id}_raw.wav")
-    optimized_filename = f"{request_id}_optimized.wav"
-    optimized_filepath = os.path.join(OPTIMIZED_AUDIO_DIR, optimized_filename)
-    
-    # Schedule cleanup for both files
-    background_tasks.add_task(asyncio.sleep, 600) # 10 minutes
-    background_tasks.add_task(cleanup_file, raw_filepath)
-    background_tasks.add_task(cleanup_file, optimized_filepath)
-
-    generation_success = False
-    # --- Try Groq First ---
-    if GROQ_API_KEY:
-        try:
-            logger.info(f"Attempting Groq TTS for text: '{text[:30]}...'")
-            tts_response = groq_client.audio.speech.create(model="playai-tts", voice="Arista-PlayAI", input=text)
-            tts_response.write_to_file(raw_filepath)
-            logger.info("Groq TTS succeeded.")
-            generation_success = True
-        except Exception as e:
-            logger.error(f"Groq TTS failed with exception: {e}", exc_info=True)
-            logger.info("Falling back to Piper TTS.")
-
-    # --- Fallback to Piper ---
-    if not generation_success:
-        try:
-            logger.info("Attempting Piper TTS fallback.")
-            if not piper_tts_service.model:
-                await piper_tts_service.initialize()
-            
-            audio_bytes = await piper_tts_service.text_to_speech(text)
-            if audio_bytes:
-                with open(raw_filepath, "wb") as f:
-                    f.write(audio_bytes)
-                logger.info("Piper TTS succeeded.")
-                generation_success = True
-            else:
-                raise Exception("Piper TTS returned no audio bytes.")
-        except Exception as e:
-            logger.error(f"Piper TTS fallback also failed with exception: {e}", exc_info=True)
-            raise HTTPException(status_code=500, detail="All TTS providers failed.")
+    primary_provider = "groq" if GROQ_API_KEY else "piper"
+    clip_id = await tts_cache.get_or_generate(
+        text, primary_provider, GROQ_TTS_VOICE, TELEPHONY_CODEC,
+        lambda: synthesize_telephony_audio(text),
+    )
+    return f"{clip_id}.wav"
 
-    if not generation_success:
-        raise HTTPException(status_code=500, detail="TTS generation failed after all attempts.")
+async def synthesize_telephony_audio(text: str) -> tuple[bytes, str]:
+    """
+    Orchestrates TTS generation and transcodes it to the proper telephony format.
+    Returns the final WAV bytes and the provider that produced them. The
+    provider audio stays in memory throughout.
+    """
+    try:
+        logger.info(f"Synthesizing TTS for text: '{text[:30]}...'")
+        with tracer.span("tts", chars=len(text)) as span:
+            raw_audio, provider_used = await tts_router.synthesize(text)
+            span["provider"] = provider_used
+        logger.info(f"TTS succeeded with provider '{provider_used}'.")
+    except AllProvidersFailed as e:
+        logger.error(str(e))
+        raise HTTPException(status_code=500, detail="All TTS providers failed.")
 
     # --- Transcode the successful audio to the required telephony format ---
     try:
-        logger.info(f"Transcoding raw file to {TELEPHONY_CODEC} at 8kHz mono.")
-        command = [
-            "ffmpeg", "-i", raw_filepath, 
-            "-ar", "8000",           # Set audio sample rate to 8kHz
-            "-ac", "1",             # Set audio channels to 1 (mono)
-            "-acodec", TELEPHONY_CODEC, # Set the codec (e.g., pcm_mulaw)
-            "-y", optimized_filepath # Overwrite output file if it exists
-        ]
-        process = await asyncio.create_subprocess_exec(*command, stderr=asyncio.subprocess.PIPE)
-        _, stderr = await process.communicate()
-
-        if process.returncode != 0:
-            error_output = stderr.decode()
-            logger.error(f"ffmpeg transcoding failed. STDERR: {error_output}")
-            raise Exception(f"ffmpeg failed: {error_output}")
-        
+        logger.info(f"Transcoding audio to {TELEPHONY_CODEC} at 8kHz mono.")
+        with tracer.span("transcode", codec=TELEPHONY_CODEC):
+            optimized_audio = await transcode(raw_audio, TELEPHONY_CODEC)
         logger.info("Transcoding successful.")
-        return optimized_filename
+        return optimized_audio, provider_used
     except Exception as e:
         logger.error(f"An error occurred during transcoding: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Audio transcoding failed: {e}")
 
+async def generate_batch_item(index: int, text: str, semaphore: asyncio.Semaphore) -> dict:
+    """
+    Generates one batch entry. Failures are reported per item instead of
+    failing the whole batch.
+    """
+    async with semaphore:
+        try:
+            return {"index": index, "filename": await generate_tts_audio(text)}
+        except HTTPException as e:
+            return {"index": index, "error": e.detail}
+        except Exception as e:
+            logger.error(f"Batch item {index} failed: {e}", exc_info=True)
+            return {"index": index, "error": str(e)}
+
+async def generate_tts_audio_chunks(text: str):
+    """
+    Splits `text` at sentence/clause boundaries, generates every chunk
+    concurrently and yields (index, chunk_text, filename) in playback order.
+    """
+    chunks = split_for_tts(text)
+    index = 0
+    async for filename in synthesize_in_order(chunks, generate_tts_audio):
+        yield index, chunks[index], filename
+        index += 1
+
 # --- API Endpoints ---
 @app.get("/generate-audio")
-async def get_generated_audio_url(text: str, background_tasks: BackgroundTasks):
+async def get_generated_audio_url(text: str, trace_id: Optional[str] = None):
     """
-    Main endpoint. Generates TTS, saves it, transcodes it, and returns the filename.
+    Main endpoint. Generates TTS, transcodes it, stores it, and returns the filename.
+    `trace_id` attaches the TTS and transcode spans to the caller's turn trace.
     """
     if not text:
         raise HTTPException(status_code=400, detail="Text parameter is required.")
     
-    filename = await generate_tts_audio(text, background_tasks)
+    current_trace.set(trace_id)
+    filename = await generate_tts_audio(text)
     return {"success": True, "filename": filename}
 
+class BatchOptions(BaseModel):
+    stream: bool = False
+    urls: bool = False
+
+class BatchRequest(BaseModel):
+    texts: List[str]
+    options: BatchOptions = BatchOptions()
+
+batch_semaphore = asyncio.Semaphore(BATCH_TTS_CONCURRENCY)
+
+@app.post("/generate-audio/batch")
+async def generate_audio_batch(batch: BatchRequest, request: Request):
+    """
+    Generates many clips in one request, concurrently and through the cache.
+    Returns results in input order, or with `options.stream` streams one NDJSON
+    line per item as soon as it completes. `options.urls` adds absolute URLs.
+    """
+    if not batch.texts:
+        raise HTTPException(status_code=400, detail="At least one text is required.")
+    if len(batch.texts) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"A batch holds at most {BATCH_MAX_ITEMS} texts.")
+    if not all(text.strip() for text in batch.texts):
+        raise HTTPException(status_code=400, detail="Texts must not be empty.")
+
+    base_url = (PUBLIC_URL_BASE or str(request.base_url)).rstrip("/")
+
+    def with_url(item: dict) -> dict:
+        if batch.options.urls and "filename" in item:
+            item["url"] = f"{base_url}/audio/{item['filename']}"
+        return item
+
+    tasks = [
+        asyncio.create_task(generate_batch_item(index, text, batch_semaphore))
+        for index, text in enumerate(batch.texts)
+    ]
+
+    if not batch.options.stream:
+        try:
+            results = [with_url(item) for item in await asyncio.gather(*tasks)]
+        finally:
+            for task in tasks:
+                task.cancel()
+        return {"success": all("filename" in item for item in results), "results": results}
+
+    async def stream_results():
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield json.dumps(with_url(await next_done)) + "\n"
+        finally:
+            # Client went away: stop generating the rest.
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+@app.get("/audio/{clip_id}.wav")
+def get_audio_clip(clip_id: str):
+    """
+    Serves a generated clip straight from the audio store.
+    """
+    audio = audio_store.get(clip_id)
+    if audio is None:
+        raise HTTPException(status_code=404, detail="Audio clip not found or expired.")
+    return Response(content=audio, media_type="audio/wav")
+
+@app.get("/cache/stats")
+def get_cache_stats():
+    """Reports TTS cache hit/miss counters and the latency/API spend they saved."""
+    return tts_cache.stats()
+
+@app.get("/tts/stats")
+def get_tts_stats():
+    """Reports Groq connection-pool usage, Piper pool queue depth, cache counters, provider health and span shipping."""
+    return {"groq": groq_tts_client.stats(), "piper": piper_tts_service.stats(), "cache": tts_cache.stats(),
+            "router": tts_router.stats(), "tracing": tracer.stats()}
+
+@app.on_event("startup")
+async def preload_piper_voices():
+    """Starts the Piper pool up front so a Groq outage never pays the voice load time."""
+    await piper_tts_service.initialize()
+
+@app.on_event("startup")
+async def load_prompt_bank():
+    """Renders (or loads from the build artifact) every fixed prompt before the first call."""
+    await prompt_bank.load(PROMPT_BANK_DIR)
+
+@app.on_event("startup")
+def start_audio_janitor():
+    """Sweeps expired and over-quota clips out of the disk-backed audio store."""
+    audio_janitor.start()
+
+@app.on_event("shutdown")
+async def close_tts_clients():
+    await groq_tts_client.aclose()
+    await piper_tts_service.cleanup()
+    audio_janitor.stop()
+    tracer.close()
+
+@app.get("/janitor/stats")
+def get_janitor_stats():
+    """Reports clip counts on disk and what the janitor has reclaimed."""
+    return audio_janitor.stats()
+
+@app.get("/prompts/{prompt_id}.wav")
+async def get_prompt_audio(prompt_id: str):
+    """
+    Serves a pre-rendered system prompt straight from memory under a stable URL.
+    """
+    audio = await prompt_bank.ensure(prompt_id)
+    if audio is None:
+        raise HTTPException(status_code=404, detail=f"Unknown or unavailable prompt: {prompt_id}")
+    return Response(content=audio, media_type="audio/wav")
+
+@app.get("/generate-audio/chunked")
+async def get_chunked_audio_urls(text: str, trace_id: Optional[str] = None):
+    """
+    Chunked mode. Streams one NDJSON line per chunk, in order, as soon as each
+    chunk is ready, so the caller can start playing the first sentence while
+    the rest are still being synthesized.
+    """
+    if not text:
+        raise HTTPException(status_code=400, detail="Text parameter is required.")
+
+    async def stream_chunks():
+        current_trace.set(trace_id)
+        try:
+            async for index, chunk_text, filename in generate_tts_audio_chunks(text):
+                yield json.dumps({"index": index, "text": chunk_text, "filename": filename}) + "\n"
+        except Exception as e:
+            logger.error(f"Chunked TTS generation failed: {e}", exc_info=True)
+            yield json.dumps({"error": str(e)}) + "\n"
+
+    return StreamingResponse(stream_chunks(), media_type="application/x-ndjson")
+
 @app.get("/")
 def read_root():
     return {"message": "TTS Orchestrator is running."}
 
 # --- Temporary Test Endpoint ---
 @app.get("/test-audio")
-async def get_test_audio(text: str, background_tasks: BackgroundTasks):
+async def get_test_audio(text: str):
     """
     A temporary endpoint for testing. Generates, transcodes, and returns
     the audio file directly for quality checking.
@@ -148,11 +344,11 @@ async def get_test_audio(text: str, background_tasks: BackgroundTasks):
     try:
         logger.info(f"[TEST] Generating test audio for text: '{text[:30]}...'")
         # Run the full pipeline to get the final, optimized filename
-        optimized_filename = await generate_tts_audio(text, background_tasks)
-        optimized_filepath = os.path.join(OPTIMIZED_AUDIO_DIR, optimized_filename)
+        optimized_filename = await generate_tts_audio(text)
+        audio = audio_store.get(optimized_filename[:-len(".wav")])
         
-        # Return the generated file as a response
-        return FileResponse(path=optimized_filepath, media_type='audio/wav', filename=optimized_filename)
+        # Return the generated clip as a response
+        return Response(content=audio, media_type='audio/wav', headers={"Content-Disposition": f'attachment; filename="{optimized_filename}"'})
         
     except Exception as e:
         logger.error(f"[TEST] Test audio generation failed: {e}", exc_info=True)
@@ -0,0 +1,242 @@
+# utils/admission.py
+
+import asyncio
+import logging
+import time
+import uuid
+from collections import Counter, deque
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+import redis.asyncio as aioredis
+
+from utils.tracing import percentile
+
+logger = logging.getLogger(__name__)
+
+ADMITTED = "admitted"
+REJECTED = "rejected"
+ABANDONED = "abandoned"
+
+
+class AdmissionController:
+    """Decides whether a relay takes on another conversation right now.
+
+    A call is admitted while this relay has fewer than `max_active_calls`
+    conversations and the workers are keeping up: fewer than
+    `max_inflight_turns` turns in flight across all relays (a Redis sorted set
+    every relay adds its turns to) and fewer than `max_queue_depth` tasks
+    waiting in the Celery broker `queues`. Otherwise the caller is held, in
+    arrival order, while `hold()` plays, and is admitted as soon as a slot
+    frees up. Callers beyond `max_waiting`, or held longer than `max_wait`
+    seconds, are rejected.
+
+    Worker load is read at most once per `poll_interval` and shared by every
+    decision in between. If Redis cannot be read only the per-relay cap
+    applies. Turns older than `turn_ttl` are assumed lost (e.g. a relay that
+    crashed mid-turn) and stop counting. One controller per consumer loop;
+    `open()` creates its Redis client on that loop.
+    """
+
+    def __init__(
+        self,
+        redis_url: str,
+        max_active_calls: int = 20,
+        max_waiting: int = 10,
+        max_wait: float = 30.0,
+        max_inflight_turns: int = 16,
+        max_queue_depth: int = 8,
+        queues: Iterable[str] = ("celery",),
+        turns_key: str = "admission:turns",
+        turn_ttl: float = 60.0,
+        poll_interval: float = 0.5,
+    ):
+        self.redis_url = redis_url
+        self.max_active_calls = max_active_calls
+        self.max_waiting = max_waiting
+        self.max_wait = max_wait
+        self.max_inflight_turns = max_inflight_turns
+        self.max_queue_depth = max_queue_depth
+        self.queues = list(queues)
+        self.turns_key = turns_key
+        self.turn_ttl = turn_ttl
+        self.poll_interval = poll_interval
+        self._client: Optional[aioredis.Redis] = None
+        self._active: Dict[str, float] = {}
+        self._waiting = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._load: Tuple[Optional[int], Optional[int]] = (None, None)
+        self._load_read_at = 0.0
+        self._healthy = True
+
+        self.decisions = Counter()
+        self.rejections = Counter()
+        self._waits = deque(maxlen=1000)
+        self._turns = deque(maxlen=1000)
+
+    def open(self):
+        if self._client is None:
+            self._client = aioredis.from_url(self.redis_url)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _worker_load(self) -> Tuple[Optional[int], Optional[int]]:
+        """(turns in flight, broker queue depth), refreshed at most every `poll_interval`."""
+        now = time.monotonic()
+        if now - self._load_read_at < self.poll_interval:
+            return self._load
+        self._load_read_at = now
+        try:
+            async with self._client.pipeline(transaction=False) as pipe:
+                pipe.zremrangebyscore(self.turns_key, "-inf", time.time() - self.turn_ttl)
+                pipe.zcard(self.turns_key)
+                for queue in self.queues:
+                    pipe.llen(queue)
+                results = await pipe.execute()
+        except Exception as e:
+            if self._healthy:
+                logger.warning(f"Could not read worker load from Redis, admitting on the per-relay cap only: {e}")
+            self._healthy = False
+            self._load = (None, None)
+            return self._load
+        if not self._healthy:
+            logger.info("Worker load readings from Redis recovered.")
+        self._healthy = True
+        self._load = (results[1], sum(results[2:]))
+        return self._load
+
+    async def _has_capacity(self) -> bool:
+        if len(self._active) >= self.max_active_calls:
+            return False
+        inflight, depth = await self._worker_load()
+        if inflight is not None and inflight >= self.max_inflight_turns:
+            return False
+        if depth is not None and depth >= self.max_queue_depth:
+            return False
+        # Re-checked: another caller may have been admitted during the Redis read.
+        return len(self._active) < self.max_active_calls
+
+    def _admit(self, call_id: str):
+        self._active[call_id] = time.monotonic()
+
+    def _notify(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+        self._wakeup = asyncio.Event()
+
+    async def _wait_for_slot(self, call_id: str):
+        while True:
+            if self._waiting[0] == call_id and await self._has_capacity():
+                self._admit(call_id)
+                return
+            if self._wakeup is None:
+                self._wakeup = asyncio.Event()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def acquire(
+        self,
+        call_id: str,
+        hold: Optional[Callable[[], Awaitable]] = None,
+        abort_on: Optional[Awaitable] = None,
+    ) -> str:
+        """Admits the call, holding it if need be; returns ADMITTED, REJECTED or ABANDONED.
+
+        `abort_on` completing (e.g. the caller hanging up) abandons the wait.
+        """
+        if not self._waiting and await self._has_capacity():
+            self._admit(call_id)
+            self.decisions["immediate"] += 1
+            return ADMITTED
+        if len(self._waiting) >= self.max_waiting:
+            self.rejections["queue_full"] += 1
+            logger.warning(f"[{call_id}] Rejected: {len(self._waiting)} callers already on hold.")
+            return REJECTED
+
+        self._waiting.append(call_id)
+        started = time.monotonic()
+        logger.info(f"[{call_id}] Holding caller; {len(self._active)} active, {len(self._waiting)} waiting, worker load {self._load}.")
+        slot = asyncio.ensure_future(self._wait_for_slot(call_id))
+        holding = asyncio.ensure_future(hold()) if hold is not None else None
+        abort_task = asyncio.ensure_future(abort_on) if abort_on is not None else None
+        try:
+            done, _ = await asyncio.wait([slot] + ([abort_task] if abort_task else []), timeout=self.max_wait, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in (slot, holding, abort_task):
+                if task is not None and not task.done():
+                    task.cancel()
+            if holding is not None:
+                await asyncio.gather(holding, return_exceptions=True)
+            self._waiting.remove(call_id)
+            self._notify()
+
+        waited = time.monotonic() - started
+        if slot in done and not slot.cancelled() and slot.exception() is None:
+            self.decisions["after_wait"] += 1
+            self._waits.append(waited * 1000)
+            logger.info(f"[{call_id}] Admitted after {waited:.1f}s on hold.")
+            return ADMITTED
+        # The slot may have been taken in the same instant the wait ended.
+        self._active.pop(call_id, None)
+        if abort_task is not None and abort_task in done:
+            self.decisions[ABANDONED] += 1
+            logger.info(f"[{call_id}] Caller hung up after {waited:.1f}s on hold.")
+            return ABANDONED
+        self.rejections["timeout"] += 1
+        logger.warning(f"[{call_id}] Rejected after {waited:.1f}s on hold.")
+        return REJECTED
+
+    def release(self, call_id: str):
+        """Frees the call's slot, if it had one, and wakes the callers on hold."""
+        admitted_at = self._active.pop(call_id, None)
+        if admitted_at is not None:
+            self._notify()
+
+    @asynccontextmanager
+    async def turn(self, call_id: str):
+        """Counts the block as a turn in flight on the workers, for every relay to see."""
+        member = f"{call_id}:{uuid.uuid4().hex}"
+        started = time.monotonic()
+        try:
+            await self._client.zadd(self.turns_key, {member: time.time()})
+        except Exception as e:
+            logger.warning(f"[{call_id}] Could not register turn in flight: {e}")
+            member = None
+        try:
+            yield
+        finally:
+            self._turns.append((time.monotonic() - started) * 1000)
+            if member is not None:
+                try:
+                    await self._client.zrem(self.turns_key, member)
+                except Exception as e:
+                    logger.warning(f"[{call_id}] Could not clear turn in flight: {e}")
+
+    def stats(self) -> dict:
+        inflight, depth = self._load
+        waits = list(self._waits)
+        turns = list(self._turns)
+        return {
+            "active_calls": len(self._active),
+            "max_active_calls": self.max_active_calls,
+            "waiting": len(self._waiting),
+            "max_waiting": self.max_waiting,
+            "inflight_turns": inflight,
+            "max_inflight_turns": self.max_inflight_turns,
+            "queue_depth": depth,
+            "max_queue_depth": self.max_queue_depth,
+            "admitted_immediately": self.decisions["immediate"],
+            "admitted_after_wait": self.decisions["after_wait"],
+            "abandoned": self.decisions[ABANDONED],
+            "rejected": dict(self.rejections),
+            "wait_p50_ms": percentile(waits, 50),
+            "wait_p95_ms": percentile(waits, 95),
+            "wait_max_ms": max(waits) if waits else None,
+            "turn_p50_ms": percentile(turns, 50),
+            "turn_p95_ms": percentile(turns, 95),
+        }
@@ -0,0 +1,181 @@
+# utils/audio_janitor.py
+
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AudioJanitor:
+    """Expires and size-caps generated audio files in a set of directories.
+
+    A clip expires `ttl` seconds after its mtime, so anything that refreshes the
+    mtime on use (the disk audio store does) keeps a clip alive. `track` can
+    give one file its own TTL. Files written before a restart are handled the
+    same way, since expiry is derived from the file itself.
+
+    Each sweep is one `os.scandir` pass per directory: expired files are
+    removed, then the oldest survivors are evicted until the directories fit in
+    `max_bytes`. Sweeps run on a daemon thread every `interval` seconds, and
+    early when tracked writes push the estimated total over budget. A thread
+    rather than an asyncio task, because main.py writes clips from two event
+    loops and the sweep itself is blocking I/O.
+    """
+
+    def __init__(
+        self,
+        directories: Iterable[str],
+        ttl: float,
+        max_bytes: int,
+        interval: float = 60.0,
+        suffixes: Iterable[str] = (".wav",),
+    ):
+        self.directories = list(directories)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.suffixes = tuple(suffixes)
+        self._ttls: Dict[str, float] = {}
+        self._listeners: List[Callable[[str], None]] = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._estimated_bytes = 0
+
+        self.sweeps = 0
+        self.files = 0
+        self.bytes = 0
+        self.expired = 0
+        self.evicted = 0
+        self.bytes_reclaimed = 0
+        self.errors = 0
+        self.last_sweep_ms = 0.0
+
+    def track(self, path: str, size: int, ttl: Optional[float] = None):
+        """Registers a freshly written clip, optionally with its own TTL."""
+        with self._lock:
+            if ttl is not None:
+                self._ttls[path] = ttl
+            self._estimated_bytes += size
+            over_budget = self._estimated_bytes > self.max_bytes
+        if over_budget:
+            self._wake.set()
+
+    def on_remove(self, callback: Callable[[str], None]):
+        """`callback(path)` is called for every file the janitor deletes."""
+        self._listeners.append(callback)
+
+    def _remove(self, path: str, size: int) -> bool:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return False
+        except OSError as e:
+            self.errors += 1
+            logger.error(f"Janitor could not remove {path}: {e}")
+            return False
+        self.bytes_reclaimed += size
+        for callback in self._listeners:
+            try:
+                callback(path)
+            except Exception as e:
+                logger.error(f"Janitor remove callback failed for {path}: {e}", exc_info=True)
+        return True
+
+    def sweep(self) -> dict:
+        """Runs one expiry + quota pass and returns what it reclaimed."""
+        start_time = time.monotonic()
+        now = time.time()
+        with self._lock:
+            ttls = dict(self._ttls)
+
+        survivors = []
+        expired = expired_bytes = 0
+        for directory in self.directories:
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        if not entry.name.endswith(self.suffixes) or not entry.is_file():
+                            continue
+                        try:
+                            stat = entry.stat()
+                        except FileNotFoundError:
+                            continue
+                        if stat.st_mtime + ttls.get(entry.path, self.ttl) <= now:
+                            if self._remove(entry.path, stat.st_size):
+                                expired += 1
+                                expired_bytes += stat.st_size
+                        else:
+                            survivors.append((stat.st_mtime, entry.path, stat.st_size))
+            except FileNotFoundError:
+                continue
+
+        total_bytes = sum(size for _, _, size in survivors)
+        evicted = evicted_bytes = 0
+        if total_bytes > self.max_bytes:
+            survivors.sort()
+            while survivors and total_bytes > self.max_bytes:
+                _, path, size = survivors.pop(0)
+                total_bytes -= size
+                if self._remove(path, size):
+                    evicted += 1
+                    evicted_bytes += size
+
+        live_paths = {path for _, path, _ in survivors}
+        with self._lock:
+            self._ttls = {path: ttl for path, ttl in self._ttls.items() if path in live_paths or path not in ttls}
+            self._estimated_bytes = total_bytes
+        self.sweeps += 1
+        self.files = len(survivors)
+        self.bytes = total_bytes
+        self.expired += expired
+        self.evicted += evicted
+        self.last_sweep_ms = (time.monotonic() - start_time) * 1000
+        if expired or evicted:
+            logger.info(f"Janitor removed {expired} expired and {evicted} over-quota clips, "
+                        f"reclaiming {expired_bytes + evicted_bytes} bytes in {self.last_sweep_ms:.2f} ms.")
+        return {"expired": expired, "evicted": evicted, "bytes_reclaimed": expired_bytes + evicted_bytes}
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.sweep()
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Janitor sweep failed: {e}", exc_info=True)
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="audio-janitor", daemon=True)
+        self._thread.start()
+        logger.info(f"Audio janitor watching {self.directories} (ttl {self.ttl}s, budget {self.max_bytes} bytes).")
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def stats(self) -> dict:
+        return {
+            "directories": self.directories,
+            "ttl_seconds": self.ttl,
+            "max_bytes": self.max_bytes,
+            "files": self.files,
+            "bytes": self.bytes,
+            "sweeps": self.sweeps,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "bytes_reclaimed": self.bytes_reclaimed,
+            "errors": self.errors,
+            "last_sweep_ms": round(self.last_sweep_ms, 2),
+        }
@@ -0,0 +1,152 @@
+# utils/call_lease.py
+
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import Dict, Optional
+
+import redis.asyncio as aioredis
+
+logger = logging.getLogger(__name__)
+
+# Extends the lease if we still own it. A key that expired during a Redis blip is taken back.
+_RENEW = """
+local owner = redis.call('GET', KEYS[1])
+if owner == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+elseif not owner then
+    return redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2], 'NX') and 1 or 0
+end
+return 0
+"""
+
+# Deletes the lease only if we own it, so a late release never frees another relay's call.
+_RELEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def default_owner_id() -> str:
+    """host:pid plus a random suffix, unique even across restarts that reuse a pid."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class CallLeases:
+    """Which relay process owns which call, as Redis leases.
+
+    SignalWire delivers a call to every consumer on its context, and may
+    deliver it twice to the same one. `acquire` is a `SET NX PX` on
+    `<prefix>:<call_id>`, so exactly one process wins each call. A heartbeat
+    task renews every lease this process holds every `ttl / 3` seconds, and
+    `release` deletes the lease when the conversation ends. If the process
+    dies its leases simply expire after `ttl`. One instance per consumer
+    loop; `open()` creates the Redis client and starts the heartbeat on it.
+    """
+
+    def __init__(self, redis_url: str, ttl: float = 15.0, prefix: str = "call:owner", owner_id: Optional[str] = None):
+        self.redis_url = redis_url
+        self.ttl_ms = int(ttl * 1000)
+        self.prefix = prefix
+        self.owner_id = owner_id or default_owner_id()
+        self._client: Optional[aioredis.Redis] = None
+        self._renew = None
+        self._release = None
+        self._heartbeat: Optional[asyncio.Task] = None
+        self._held: Dict[str, float] = {}
+
+        self.acquired = 0
+        self.contended = 0
+        self.lost = 0
+        self.renew_failures = 0
+
+    def _key(self, call_id: str) -> str:
+        return f"{self.prefix}:{call_id}"
+
+    def open(self):
+        if self._client is None:
+            self._client = aioredis.from_url(self.redis_url)
+            self._renew = self._client.register_script(_RENEW)
+            self._release = self._client.register_script(_RELEASE)
+            self._heartbeat = asyncio.get_running_loop().create_task(self._run_heartbeat())
+
+    async def close(self):
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            await asyncio.gather(self._heartbeat, return_exceptions=True)
+            self._heartbeat = None
+        if self._client is not None:
+            for call_id in list(self._held):
+                await self.release(call_id)
+            await self._client.aclose()
+            self._client = None
+
+    async def acquire(self, call_id: str) -> bool:
+        """True if this process now owns the call; False if another process (or event) got it first."""
+        if call_id in self._held:
+            self.contended += 1
+            return False
+        if not await self._client.set(self._key(call_id), self.owner_id, nx=True, px=self.ttl_ms):
+            self.contended += 1
+            return False
+        self._held[call_id] = time.monotonic()
+        self.acquired += 1
+        return True
+
+    async def release(self, call_id: str):
+        if self._held.pop(call_id, None) is None:
+            return
+        try:
+            await self._release(keys=[self._key(call_id)], args=[self.owner_id])
+        except Exception as e:
+            # Nothing lost: the lease expires on its own.
+            logger.warning(f"[{call_id}] Could not release call lease: {e}")
+
+    def owns(self, call_id: str) -> bool:
+        return call_id in self._held
+
+    async def _renew_all(self):
+        call_ids = list(self._held)
+        if not call_ids:
+            return
+        async with self._client.pipeline(transaction=False) as pipe:
+            for call_id in call_ids:
+                await self._renew(keys=[self._key(call_id)], args=[self.owner_id, self.ttl_ms], client=pipe)
+            results = await pipe.execute()
+        for call_id, renewed in zip(call_ids, results):
+            if call_id not in self._held:
+                # Released while the renewal was in flight; don't leave it re-taken.
+                if renewed:
+                    await self._release(keys=[self._key(call_id)], args=[self.owner_id])
+            elif not renewed:
+                del self._held[call_id]
+                self.lost += 1
+                logger.error(f"[{call_id}] Call lease was taken over by another relay.")
+
+    async def _run_heartbeat(self):
+        interval = self.ttl_ms / 3000
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self._renew_all()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.renew_failures += 1
+                logger.warning(f"Could not renew {len(self._held)} call lease(s): {e}")
+
+    def stats(self) -> dict:
+        return {
+            "owner_id": self.owner_id,
+            "held": len(self._held),
+            "ttl_ms": self.ttl_ms,
+            "acquired": self.acquired,
+            "contended": self.contended,
+            "lost": self.lost,
+            "renew_failures": self.renew_failures,
+        }
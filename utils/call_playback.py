@@ -0,0 +1,307 @@
+# utils/call_playback.py
+
+import asyncio
+import itertools
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional
+
+from signalwire.relay.calling import Call
+from signalwire.relay.calling.constants import CallPlayState
+
+from utils.tracing import percentile
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PlaybackResult:
+    """Outcome of one (possibly multi-chunk) playback with barge-in listening."""
+    recording: Optional[Any] = None
+    barged_in: bool = False
+    chunks_played: int = 0
+    # Chunks SignalWire could not play (e.g. the URL returned 404); included in chunks_played.
+    chunks_failed: int = 0
+    time_to_first_audio_ms: Optional[float] = None
+
+    @property
+    def audio_played(self) -> bool:
+        return self.chunks_played > self.chunks_failed
+
+
+async def play_with_barge_in(
+    call: Call,
+    media: AsyncIterator[dict],
+    started_at: float,
+    end_silence_timeout: float = 1.0,
+    listen: Optional[Callable[[], Awaitable[Any]]] = None,
+    before_first: Optional[Callable[[], Awaitable[Any]]] = None,
+    listen_ready: Optional[Awaitable[Optional[Callable[[], Awaitable[Any]]]]] = None,
+) -> PlaybackResult:
+    """Plays media items back-to-back while listening for the caller to barge in.
+
+    `media` yields SignalWire media dicts (e.g. `{"type": "audio", "url": ...}`)
+    as they become ready, so later chunks can still be generating while the
+    first one plays. The recorder is armed once, together with the first chunk,
+    and stays armed across chunks. If it finishes, the current chunk is
+    stopped, the remaining media are abandoned and the recording is returned.
+    `started_at` is the `time.monotonic()` timestamp the turn's audio was
+    requested at, used to report time-to-first-audio.
+
+    When the call's audio is already being streamed and endpointed elsewhere,
+    pass `listen`: it is called instead of arming the recorder, and whatever
+    its awaitable returns (e.g. the next utterance) is the barge-in. If that
+    is not known yet when playback starts (the media stream is still being
+    set up), pass `listen_ready` instead: it resolves to `listen` or None (arm
+    the recorder) and is awaited together with the first chunk's play request.
+
+    `before_first` is awaited once the first item is ready, just before it is
+    played, e.g. to let a filler that is still playing finish.
+    """
+    result = PlaybackResult()
+    play_finished = {}
+    play_errors = set()
+    record_finished = asyncio.Event()
+    record_action = None
+
+    def on_play_event(params):
+        event = play_finished.get(params.get("control_id"))
+        if event:
+            event.set()
+
+    def on_play_error(params):
+        play_errors.add(params.get("control_id"))
+        on_play_event(params)
+
+    def on_record_finished(params):
+        if record_action and params.get("control_id") == record_action.control_id:
+            record_finished.set()
+
+    call.on("play.finished", on_play_event)
+    call.on("play.error", on_play_error)
+    call.on("record.finished", on_record_finished)
+    media_iter = media.__aiter__()
+    record_waiter = asyncio.create_task(record_finished.wait())
+    hangup_waiter = asyncio.create_task(call.wait_for_ended())
+    try:
+        while call.active:
+            # Wait for the next chunk, but keep honouring barge-in while it generates.
+            next_media = asyncio.ensure_future(media_iter.__anext__())
+            await asyncio.wait([next_media, record_waiter, hangup_waiter], return_when=asyncio.FIRST_COMPLETED)
+            if not next_media.done():
+                next_media.cancel()
+                await asyncio.gather(next_media, return_exceptions=True)
+                break
+            try:
+                item = next_media.result()
+            except StopAsyncIteration:
+                break
+
+            if result.chunks_played == 0 and before_first is not None:
+                await before_first()
+            if result.chunks_played == 0 and listen_ready is not None:
+                play_action, listen = await asyncio.gather(call.play_async([dict(item)]), listen_ready)
+                if listen is None:
+                    record_action = await call.record_async(beep=False, end_silence_timeout=end_silence_timeout)
+            elif result.chunks_played == 0 and listen is None:
+                # Arm the recorder in the same tick as the first chunk instead of one round trip later.
+                play_action, record_action = await asyncio.gather(
+                    call.play_async([dict(item)]),
+                    call.record_async(beep=False, end_silence_timeout=end_silence_timeout),
+                )
+            else:
+                play_action = await call.play_async([dict(item)])
+            play_finished[play_action.control_id] = asyncio.Event()
+            if play_action.completed:
+                play_finished[play_action.control_id].set()
+            result.chunks_played += 1
+
+            if result.time_to_first_audio_ms is None:
+                result.time_to_first_audio_ms = (time.monotonic() - started_at) * 1000
+                if listen is not None:
+                    record_waiter.cancel()
+                    record_waiter = asyncio.ensure_future(listen())
+                elif record_action.completed:
+                    record_finished.set()
+
+            play_waiter = asyncio.create_task(play_finished[play_action.control_id].wait())
+            await asyncio.wait([play_waiter, record_waiter, hangup_waiter], return_when=asyncio.FIRST_COMPLETED)
+            play_waiter.cancel()
+            if play_action.control_id in play_errors or play_action.state == CallPlayState.ERROR:
+                result.chunks_failed += 1
+                logger.warning(f"[{call.id}] SignalWire could not play chunk {result.chunks_played}: {item.get('url')}")
+
+            if record_waiter.done():
+                logger.info(f"[{call.id}] Barge-in detected during chunk {result.chunks_played}. Stopping playback.")
+                if not play_action.completed:
+                    await play_action.stop()
+                break
+            if hangup_waiter.done():
+                break
+
+        if record_waiter.done() and listen is not None and not record_waiter.cancelled():
+            if record_waiter.exception() is not None:
+                logger.warning(f"[{call.id}] Barge-in listener failed: {record_waiter.exception()}")
+            else:
+                result.recording = record_waiter.result()
+                result.barged_in = result.recording is not None
+        elif record_waiter.done() and record_action:
+            result.barged_in = True
+            result.recording = record_action.result
+        elif record_action and not record_action.completed:
+            await record_action.stop()
+        return result
+    finally:
+        record_waiter.cancel()
+        hangup_waiter.cancel()
+        # Closing the source cancels any chunks that are still being generated.
+        if hasattr(media_iter, "aclose"):
+            await media_iter.aclose()
+        call.off("play.finished", on_play_event)
+        call.off("play.error", on_play_error)
+        call.off("record.finished", on_record_finished)
+
+
+async def play_to_end(call: Call, url: Optional[str] = None, text: Optional[str] = None) -> bool:
+    """Plays `url` (or speaks `text` with SignalWire TTS) and returns once it has finished.
+
+    Returns False if SignalWire could not play it (play.error, e.g. a 404).
+    Cancelling stops it.
+    """
+    finished = asyncio.Event()
+    failed = False
+    play_action = None
+
+    def on_play_finished(params):
+        if play_action and params.get("control_id") == play_action.control_id:
+            finished.set()
+
+    def on_play_error(params):
+        nonlocal failed
+        if play_action and params.get("control_id") == play_action.control_id:
+            failed = True
+            finished.set()
+
+    call.on("play.finished", on_play_finished)
+    call.on("play.error", on_play_error)
+    try:
+        play_action = await (call.play_audio_async(url=url) if url else call.play_tts_async(text=text))
+        if not play_action.completed:
+            await finished.wait()
+    finally:
+        call.off("play.finished", on_play_finished)
+        call.off("play.error", on_play_error)
+        if play_action and not play_action.completed and call.active:
+            await play_action.stop()
+    return not (failed or play_action.state == CallPlayState.ERROR)
+
+
+async def play_on_loop(call: Call, url: Optional[str], fallback_text: Optional[str] = None, min_interval: float = 1.0):
+    """Plays `url` back-to-back until cancelled or the call ends, e.g. a hold prompt.
+
+    If the audio cannot be played (or there is no `url`), the loop speaks
+    `fallback_text` with SignalWire TTS instead, and stops if there is no text
+    or that fails too. Plays start at least `min_interval` seconds apart, so a
+    prompt that errors straight away never spins the loop.
+    """
+    while call.active:
+        started = time.monotonic()
+        if url and not await play_to_end(call, url):
+            logger.warning(f"[{call.id}] Could not play {url}.")
+            url = None
+        if not url:
+            if not fallback_text or not await play_to_end(call, text=fallback_text):
+                logger.warning(f"[{call.id}] Nothing left to play; stopping the loop.")
+                return
+        await asyncio.sleep(max(0.0, min_interval - (time.monotonic() - started)))
+
+
+class LatencyMask:
+    """Covers a slow turn with a short filler prompt ("Let me check that...").
+
+    `arm` is called when the caller stops speaking. If the reply's first audio
+    is not ready `threshold` seconds later, one of `filler_urls` (pre-rendered
+    prompts, taken in turn) starts playing. When the reply is ready, awaiting
+    `settle()` on the armed turn cancels a filler that has not started yet, or
+    waits out one that is playing, so the reply starts right after it instead
+    of over it.
+    """
+
+    def __init__(self, filler_urls: List[str], threshold: float = 1.0, enabled: bool = True):
+        self.filler_urls = itertools.cycle(filler_urls)
+        self.threshold = threshold
+        self.enabled = enabled and bool(filler_urls)
+
+        self.turns = 0
+        self.fillers = 0
+        self._filler_ms = deque(maxlen=1000)
+        self._held_back_ms = deque(maxlen=1000)
+
+    def arm(self, call: Call, since: float) -> "MaskedTurn":
+        """`since` is the epoch time the caller stopped speaking."""
+        self.turns += 1
+        delay = max(0.0, since + self.threshold - time.time())
+        return MaskedTurn(self, call, delay if self.enabled else None)
+
+    def stats(self) -> dict:
+        filler_ms = list(self._filler_ms)
+        return {
+            "enabled": self.enabled,
+            "threshold_ms": self.threshold * 1000,
+            "turns": self.turns,
+            "fillers": self.fillers,
+            "filler_rate": self.fillers / self.turns if self.turns else None,
+            "filler_p50_ms": percentile(filler_ms, 50),
+            "filler_p95_ms": percentile(filler_ms, 95),
+            # How long ready replies waited for a filler to finish.
+            "held_back_p50_ms": percentile(list(self._held_back_ms), 50),
+            "held_back_p95_ms": percentile(list(self._held_back_ms), 95),
+        }
+
+
+class MaskedTurn:
+    """One turn's pending filler; see LatencyMask."""
+
+    def __init__(self, mask: LatencyMask, call: Call, delay: Optional[float]):
+        self.mask = mask
+        self.call = call
+        self.started_at: Optional[float] = None
+        self.filler_ms: Optional[float] = None
+        self._task = asyncio.ensure_future(self._run(delay)) if delay is not None else None
+
+    async def _run(self, delay: float):
+        await asyncio.sleep(delay)
+        if not self.call.active:
+            return
+        url = next(self.mask.filler_urls)
+        self.started_at = time.time()
+        self.mask.fillers += 1
+        logger.info(f"[{self.call.id}] Reply not ready; playing filler {url}.")
+        try:
+            await play_to_end(self.call, url)
+        finally:
+            self.filler_ms = (time.time() - self.started_at) * 1000
+            self.mask._filler_ms.append(self.filler_ms)
+
+    @property
+    def played(self) -> bool:
+        return self.started_at is not None
+
+    async def settle(self):
+        """The reply is ready: drop the filler if it hasn't started, else let it finish."""
+        if self._task is None:
+            return
+        if not self.played:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            return
+        settle_start = time.monotonic()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self.mask._held_back_ms.append((time.monotonic() - settle_start) * 1000)
+
+    def cancel(self):
+        """The turn produced nothing to play; stop the filler wherever it is."""
+        if self._task is not None:
+            self._task.cancel()
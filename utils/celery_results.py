@@ -0,0 +1,155 @@
+# utils/celery_results.py
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Dict, Optional
+
+import redis.asyncio as aioredis
+from celery import Celery, states
+
+logger = logging.getLogger(__name__)
+
+
+class TaskAborted(Exception):
+    """The caller stopped waiting (e.g. hung up) before the task finished."""
+
+
+class _LoopState:
+    """Pub/sub connection and pending futures bound to a single event loop."""
+
+    def __init__(self, client: aioredis.Redis):
+        self.client = client
+        self.pubsub = client.pubsub()
+        # PubSub lazily opens its connection on the first (un)subscribe; concurrent
+        # first calls would each open one and strand a subscription.
+        self.lock = asyncio.Lock()
+        self.waiters: Dict[str, asyncio.Future] = {}
+        self.reader: Optional[asyncio.Task] = None
+
+
+class CeleryResultWaiter:
+    """Awaits Celery results without blocking the event loop.
+
+    The Redis result backend publishes every stored result on a channel named
+    after the result key. One pub/sub connection per event loop subscribes to
+    the channel of each task being waited on and resolves the matching future,
+    so any number of calls can wait concurrently on the SignalWire consumer's
+    loop. The key is also read once after subscribing, which catches results
+    stored before the subscription was in place. `redis_url` defaults to the
+    app's result backend.
+    """
+
+    def __init__(self, celery_app: Celery, redis_url: Optional[str] = None):
+        self.celery_app = celery_app
+        self.redis_url = redis_url or celery_app.conf.result_backend
+        self._states: Dict[asyncio.AbstractEventLoop, _LoopState] = {}
+
+        self.completed = 0
+        self.timeouts = 0
+        self.aborted = 0
+
+    def _state(self) -> _LoopState:
+        loop = asyncio.get_running_loop()
+        state = self._states.get(loop)
+        if state is None:
+            state = _LoopState(aioredis.from_url(self.redis_url))
+            state.reader = loop.create_task(self._read(state))
+            self._states[loop] = state
+        return state
+
+    def _channel(self, task_id: str) -> str:
+        key = self.celery_app.backend.get_key_for_task(task_id)
+        return key.decode() if isinstance(key, bytes) else key
+
+    def _resolve(self, state: _LoopState, channel: str, payload: Any):
+        future = state.waiters.get(channel)
+        if future is None or future.done():
+            return
+        meta = self.celery_app.backend.decode_result(payload)
+        if meta["status"] not in states.READY_STATES:
+            return
+        if meta["status"] == states.SUCCESS:
+            future.set_result(meta["result"])
+        else:
+            result = meta["result"]
+            future.set_exception(result if isinstance(result, BaseException) else RuntimeError(str(result)))
+
+    async def _read(self, state: _LoopState):
+        while True:
+            try:
+                if not state.pubsub.subscribed:
+                    await asyncio.sleep(0.05)
+                    continue
+                message = await state.pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message and message["type"] == "message":
+                    channel = message["channel"]
+                    self._resolve(state, channel.decode() if isinstance(channel, bytes) else channel, message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Celery result listener error: {e}", exc_info=True)
+                await asyncio.sleep(0.5)
+
+    async def wait(self, task_id: str, timeout: float, abort_on: Optional[Awaitable] = None) -> Any:
+        """Returns the task's result, raising its exception if it failed.
+
+        Raises `asyncio.TimeoutError` after `timeout` seconds. If `abort_on`
+        (e.g. `call.wait_for_ended()`) completes first, raises `TaskAborted`.
+        Either way the task is revoked so a worker does not finish it for nobody.
+        """
+        state = self._state()
+        channel = self._channel(task_id)
+        future = asyncio.get_running_loop().create_future()
+        state.waiters[channel] = future
+        abort_task = asyncio.ensure_future(abort_on) if abort_on is not None else None
+        try:
+            async with state.lock:
+                await state.pubsub.subscribe(channel)
+            stored = await state.client.get(channel)
+            if stored is not None:
+                self._resolve(state, channel, stored)
+
+            waiting_on = [future] + ([abort_task] if abort_task else [])
+            done, _ = await asyncio.wait(waiting_on, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if future in done:
+                self.completed += 1
+                return future.result()
+            # Revoking publishes to the broker with a blocking client; keep it off the loop.
+            asyncio.get_running_loop().run_in_executor(None, self._revoke, task_id)
+            if abort_task in done:
+                self.aborted += 1
+                raise TaskAborted(f"Stopped waiting for task {task_id}.")
+            self.timeouts += 1
+            raise asyncio.TimeoutError(f"Task {task_id} did not finish within {timeout}s.")
+        finally:
+            if abort_task:
+                abort_task.cancel()
+            future.cancel()
+            state.waiters.pop(channel, None)
+            try:
+                async with state.lock:
+                    await state.pubsub.unsubscribe(channel)
+            except Exception as e:
+                logger.warning(f"Could not unsubscribe from {channel}: {e}")
+
+    def _revoke(self, task_id: str):
+        try:
+            self.celery_app.control.revoke(task_id)
+        except Exception as e:
+            logger.warning(f"Could not revoke task {task_id}: {e}")
+
+    async def aclose(self):
+        """Closes the pub/sub connection owned by the current event loop."""
+        state = self._states.pop(asyncio.get_running_loop(), None)
+        if state:
+            state.reader.cancel()
+            await state.pubsub.aclose()
+            await state.client.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "waiting": sum(len(state.waiters) for state in self._states.values()),
+            "completed": self.completed,
+            "timeouts": self.timeouts,
+            "aborted": self.aborted,
+        }
@@ -0,0 +1,182 @@
+# utils/http_pool.py
+
+import logging
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+from typing import Dict, Optional
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+
+class _HostMetrics:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.new_connections = 0
+        self.reused_connections = 0
+        self.queued = 0
+        self.queued_ms_total = 0.0
+        self.connect_ms_total = 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "new_connections": self.new_connections,
+            "reused_connections": self.reused_connections,
+            "reuse_ratio": round(self.reused_connections / (self.new_connections + self.reused_connections or 1), 3),
+            "queued": self.queued,
+            "avg_queued_ms": round(self.queued_ms_total / self.queued, 2) if self.queued else 0.0,
+            "avg_connect_ms": round(self.connect_ms_total / self.new_connections, 2) if self.new_connections else 0.0,
+        }
+
+
+class PooledHTTPSession:
+    """A long-lived aiohttp session with a tuned keep-alive pool and per-host metrics.
+
+    Owners (the relay consumers) call `open()` once their event loop is running
+    and `close()` on shutdown; every request in between reuses pooled TCP/TLS
+    connections instead of handshaking per turn. Metrics come from aiohttp
+    trace hooks: requests, new vs. reused connections, time spent queued for a
+    free slot and connect time, per host. Size `limit_per_host` against the
+    number of concurrent calls that hit the same upstream.
+    """
+
+    def __init__(
+        self,
+        limit: int = 100,
+        limit_per_host: int = 50,
+        keepalive_timeout: float = 30.0,
+        dns_cache_ttl: int = 300,
+        timeout: Optional[aiohttp.ClientTimeout] = None,
+    ):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.timeout = timeout or aiohttp.ClientTimeout(total=30, sock_connect=5)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._hosts: Dict[str, _HostMetrics] = defaultdict(_HostMetrics)
+        self.dns_cache_hits = 0
+        self.dns_cache_misses = 0
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        trace = aiohttp.TraceConfig(trace_config_ctx_factory=lambda trace_request_ctx: SimpleNamespace())
+
+        async def on_request_start(session, ctx, params):
+            ctx.host = params.url.host
+            metrics = self._hosts[ctx.host]
+            metrics.requests += 1
+            metrics.in_flight += 1
+
+        async def on_request_end(session, ctx, params):
+            self._hosts[ctx.host].in_flight -= 1
+
+        async def on_request_exception(session, ctx, params):
+            metrics = self._hosts[ctx.host]
+            metrics.in_flight -= 1
+            metrics.errors += 1
+
+        async def on_queued_start(session, ctx, params):
+            ctx.queued_at = time.monotonic()
+
+        async def on_queued_end(session, ctx, params):
+            metrics = self._hosts[ctx.host]
+            metrics.queued += 1
+            metrics.queued_ms_total += (time.monotonic() - ctx.queued_at) * 1000
+
+        async def on_create_start(session, ctx, params):
+            ctx.connect_at = time.monotonic()
+
+        async def on_create_end(session, ctx, params):
+            metrics = self._hosts[ctx.host]
+            metrics.new_connections += 1
+            metrics.connect_ms_total += (time.monotonic() - ctx.connect_at) * 1000
+
+        async def on_reuse(session, ctx, params):
+            self._hosts[ctx.host].reused_connections += 1
+
+        async def on_dns_hit(session, ctx, params):
+            self.dns_cache_hits += 1
+
+        async def on_dns_miss(session, ctx, params):
+            self.dns_cache_misses += 1
+
+        trace.on_request_start.append(on_request_start)
+        trace.on_request_end.append(on_request_end)
+        trace.on_request_exception.append(on_request_exception)
+        trace.on_connection_queued_start.append(on_queued_start)
+        trace.on_connection_queued_end.append(on_queued_end)
+        trace.on_connection_create_start.append(on_create_start)
+        trace.on_connection_create_end.append(on_create_end)
+        trace.on_connection_reuseconn.append(on_reuse)
+        trace.on_dns_cache_hit.append(on_dns_hit)
+        trace.on_dns_cache_miss.append(on_dns_miss)
+        return trace
+
+    def open(self) -> aiohttp.ClientSession:
+        """Creates the session on the running loop; a no-op if it is already open."""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=self.dns_cache_ttl,
+                use_dns_cache=True,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self.timeout,
+                trace_configs=[self._trace_config()],
+            )
+            logger.info(f"Opened pooled HTTP session (limit {self.limit}, {self.limit_per_host} per host).")
+        return self._session
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            raise RuntimeError("HTTP session is not open; call open() from the running event loop first.")
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.info("Closed pooled HTTP session.")
+        self._session = None
+
+    def _idle_connections(self) -> Optional[Dict[str, int]]:
+        """Idle keep-alive connections per host, or None if they cannot be read.
+
+        aiohttp has no public API for this, so it peeks at the connector's
+        private pool; if that is missing or has changed shape, the figure is
+        simply not reported.
+        """
+        if self._session is None or self._session.closed:
+            return {}
+        pool = getattr(self._session.connector, "_conns", None)
+        if not isinstance(pool, dict):
+            return None
+        idle = defaultdict(int)
+        try:
+            for key, connections in pool.items():
+                idle[key.host] += len(connections)
+        except (AttributeError, TypeError):
+            return None
+        return idle
+
+    def stats(self) -> dict:
+        idle = self._idle_connections()
+        return {
+            "open": self._session is not None and not self._session.closed,
+            "limit": self.limit,
+            "limit_per_host": self.limit_per_host,
+            "keepalive_timeout": self.keepalive_timeout,
+            "dns_cache_hits": self.dns_cache_hits,
+            "dns_cache_misses": self.dns_cache_misses,
+            "hosts": {host: {**metrics.as_dict(), "idle_connections": idle.get(host, 0) if idle is not None else None} for host, metrics in self._hosts.items()},
+        }
@@ -0,0 +1,174 @@
+# utils/inline_pipeline.py
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Optional
+
+import aiohttp
+from groq import AsyncGroq
+
+from llm.conversation_memory import AsyncConversationMemory
+from llm.groq_llm import LLM_MODEL, STT_MODEL, chat_messages
+from utils.celery_results import TaskAborted
+from utils.http_pool import PooledHTTPSession
+from utils.tracing import SpanRecorder, percentile
+
+logger = logging.getLogger(__name__)
+
+
+class InlinePipeline:
+    """Runs a turn's download, STT and LLM on the relay's own event loop.
+
+    The same steps as `get_llm_response_task` / `get_llm_reply_task`, minus the
+    round trips through the Celery broker and result backend. Every step is a
+    Groq or HTTP call, so they run as asyncio tasks; at most `max_concurrency`
+    turns are processed at once and the rest wait their turn. Recordings are
+    fetched over the relay's pooled session. `open()` creates the Groq client
+    on the consumer's loop. Spans go to `tracer` under the same stage names
+    the worker uses, with "dispatch" covering the wait for a free slot. Like
+    the worker, the prompt carries the call's recent turns from `memory`, and
+    each exchange is appended to it.
+    """
+
+    def __init__(
+        self,
+        groq_api_key: str,
+        http: PooledHTTPSession,
+        tracer: SpanRecorder,
+        recording_auth: Optional[aiohttp.BasicAuth] = None,
+        memory: Optional[AsyncConversationMemory] = None,
+        max_concurrency: int = 16,
+        download_timeout: float = 15.0,
+    ):
+        self.groq_api_key = groq_api_key
+        self.http = http
+        self.tracer = tracer
+        self.recording_auth = recording_auth
+        self.memory = memory
+        self.max_concurrency = max_concurrency
+        self.download_timeout = download_timeout
+        self._client: Optional[AsyncGroq] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+
+        self.turns = 0
+        self.failures = 0
+        self.in_flight = 0
+        self._turn_ms = deque(maxlen=1000)
+
+    def open(self):
+        if self._client is None:
+            self._client = AsyncGroq(api_key=self.groq_api_key)
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+    async def _download(self, call_id: str, recording_url: str, trace_id: Optional[str]) -> bytes:
+        with self.tracer.span("download", trace_id=trace_id, call_id=call_id) as span:
+            async with self.http.session.get(
+                recording_url, auth=self.recording_auth, timeout=aiohttp.ClientTimeout(total=self.download_timeout),
+            ) as response:
+                response.raise_for_status()
+                audio = await response.read()
+            span["bytes"] = len(audio)
+        return audio
+
+    async def _transcribe(self, call_id: str, audio: bytes, trace_id: Optional[str]) -> str:
+        stt_start_time = time.monotonic()
+        with self.tracer.span("stt", trace_id=trace_id, call_id=call_id):
+            transcription = await self._client.audio.transcriptions.create(file=("recording.wav", audio), model=STT_MODEL)
+        logger.info(f"[{call_id}] Groq STT Latency (inline): {(time.monotonic() - stt_start_time) * 1000:.2f} ms")
+        return transcription.text.strip()
+
+    async def _generate(self, call_id: str, transcript_text: str, trace_id: Optional[str]) -> str:
+        history = []
+        if self.memory is not None:
+            try:
+                history = await self.memory.window(call_id)
+            except Exception as e:
+                logger.warning(f"[{call_id}] Could not read conversation memory, answering without context: {e}")
+        llm_start_time = time.monotonic()
+        with self.tracer.span("llm", trace_id=trace_id, call_id=call_id):
+            chat_completion = await self._client.chat.completions.create(
+                messages=chat_messages(transcript_text, history), model=LLM_MODEL,
+            )
+        logger.info(f"[{call_id}] Groq LLM Latency (inline): {(time.monotonic() - llm_start_time) * 1000:.2f} ms")
+        reply = chat_completion.choices[0].message.content
+        if self.memory is not None:
+            try:
+                await self.memory.append(call_id, {"role": "user", "content": transcript_text}, {"role": "assistant", "content": reply})
+            except Exception as e:
+                logger.warning(f"[{call_id}] Could not update conversation memory: {e}")
+        return reply
+
+    async def _run(self, call_id: str, recording_url: Optional[str], text: Optional[str],
+                   trace_id: Optional[str], recorded_at: Optional[float]) -> Optional[str]:
+        async with self._slots:
+            if recorded_at is not None:
+                self.tracer.record("dispatch", (time.time() - recorded_at) * 1000, start=recorded_at, trace_id=trace_id, call_id=call_id)
+            self.in_flight += 1
+            started = time.monotonic()
+            try:
+                if text is None:
+                    audio = await self._download(call_id, recording_url, trace_id)
+                    text = await self._transcribe(call_id, audio, trace_id)
+                    logger.info(f"[{call_id}] Transcript: '{text}'")
+                    if not text:
+                        return None
+                return await self._generate(call_id, text, trace_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"[{call_id}] Inline STT/LLM pipeline failed: {e}", exc_info=True)
+                return None
+            finally:
+                self.in_flight -= 1
+                self.turns += 1
+                self._turn_ms.append((time.monotonic() - started) * 1000)
+
+    async def reply(
+        self,
+        call_id: str,
+        recording_url: Optional[str] = None,
+        text: Optional[str] = None,
+        trace_id: Optional[str] = None,
+        recorded_at: Optional[float] = None,
+        timeout: Optional[float] = None,
+        abort_on: Optional[Awaitable] = None,
+    ) -> Optional[str]:
+        """The reply to a recording (downloaded and transcribed) or to already-transcribed `text`.
+
+        Mirrors `CeleryResultWaiter.wait`: None if the turn failed, TaskAborted
+        if `abort_on` completes first (the turn is cancelled) and
+        asyncio.TimeoutError after `timeout` seconds.
+        """
+        turn = asyncio.ensure_future(self._run(call_id, recording_url, text, trace_id, recorded_at))
+        abort_task = asyncio.ensure_future(abort_on) if abort_on is not None else None
+        try:
+            done, _ = await asyncio.wait([turn] + ([abort_task] if abort_task else []), timeout=timeout,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if turn in done:
+                return turn.result()
+            if abort_task is not None and abort_task in done:
+                raise TaskAborted(call_id)
+            raise asyncio.TimeoutError()
+        finally:
+            turn.cancel()
+            if abort_task:
+                abort_task.cancel()
+
+    def stats(self) -> dict:
+        turn_ms = list(self._turn_ms)
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "turns": self.turns,
+            "failures": self.failures,
+            "turn_p50_ms": percentile(turn_ms, 50),
+            "turn_p95_ms": percentile(turn_ms, 95),
+        }
@@ -0,0 +1,121 @@
+# utils/recording_fetch.py
+
+import logging
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.tracing import percentile
+
+logger = logging.getLogger(__name__)
+
+
+class RecordingSession:
+    """A per-process pooled `requests` session for downloading call recordings.
+
+    Each turn used to call `requests.get` with no session, so every recording
+    paid a fresh TCP/TLS handshake to SignalWire. One session per worker
+    process keeps those connections alive between turns. Celery workers call
+    `open()` from `worker_process_init`, after the fork, so no pooled socket is
+    ever shared between processes; anything else opens it on first use.
+
+    `download` returns the body as the single `bytes` object the response was
+    read into; hand that object straight to the STT upload rather than
+    wrapping or copying it. `uploading(audio)` times the upload side. Both feed
+    the counters in `stats()`.
+    """
+
+    def __init__(self, pool_maxsize: int = 4, timeout: float = 15.0):
+        self.pool_maxsize = pool_maxsize
+        self.timeout = timeout
+        self._session: Optional[requests.Session] = None
+        self._adapter: Optional[HTTPAdapter] = None
+
+        self.downloads = 0
+        self.download_errors = 0
+        self.download_bytes = 0
+        self.uploads = 0
+        self.upload_errors = 0
+        self.upload_bytes = 0
+        self._download_ms = deque(maxlen=1000)
+        self._upload_ms = deque(maxlen=1000)
+
+    def open(self) -> requests.Session:
+        """Creates the session in this process; a no-op if it is already open."""
+        if self._session is None:
+            session = requests.Session()
+            self._adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_maxsize)
+            session.mount("https://", self._adapter)
+            session.mount("http://", self._adapter)
+            self._session = session
+            logger.info(f"Opened pooled recording session in process {os.getpid()} (pool {self.pool_maxsize}).")
+        return self._session
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+            self._adapter = None
+
+    def download(self, url: str, auth: Optional[Tuple[str, str]] = None) -> bytes:
+        started = time.monotonic()
+        try:
+            response = self.open().get(url, auth=auth, timeout=self.timeout)
+            response.raise_for_status()
+            audio = response.content
+        except Exception:
+            self.download_errors += 1
+            raise
+        self.downloads += 1
+        self.download_bytes += len(audio)
+        self._download_ms.append((time.monotonic() - started) * 1000)
+        return audio
+
+    @contextmanager
+    def uploading(self, audio: bytes):
+        """Times the block as the upload of `audio` (for STT: upload plus transcription)."""
+        started = time.monotonic()
+        try:
+            yield
+        except Exception:
+            self.upload_errors += 1
+            raise
+        self.uploads += 1
+        self.upload_bytes += len(audio)
+        self._upload_ms.append((time.monotonic() - started) * 1000)
+
+    def _connections(self) -> Tuple[int, int]:
+        """(connections opened, requests sent) across the session's urllib3 pools."""
+        opened = sent = 0
+        if self._adapter is not None:
+            pools = self._adapter.poolmanager.pools
+            for key in pools.keys():
+                opened += pools[key].num_connections
+                sent += pools[key].num_requests
+        return opened, sent
+
+    def stats(self) -> dict:
+        download_ms = list(self._download_ms)
+        upload_ms = list(self._upload_ms)
+        opened, sent = self._connections()
+        return {
+            "pid": os.getpid(),
+            "open": self._session is not None,
+            "connections_opened": opened,
+            "requests_sent": sent,
+            "downloads": self.downloads,
+            "download_errors": self.download_errors,
+            "download_bytes": self.download_bytes,
+            "download_p50_ms": percentile(download_ms, 50),
+            "download_p95_ms": percentile(download_ms, 95),
+            "uploads": self.uploads,
+            "upload_errors": self.upload_errors,
+            "upload_bytes": self.upload_bytes,
+            "upload_p50_ms": percentile(upload_ms, 50),
+            "upload_p95_ms": percentile(upload_ms, 95),
+        }
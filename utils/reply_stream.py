@@ -0,0 +1,112 @@
+# utils/reply_stream.py
+
+import asyncio
+import logging
+from typing import AsyncIterator, Awaitable, Optional
+
+import redis
+import redis.asyncio as aioredis
+
+from utils.celery_results import TaskAborted
+
+logger = logging.getLogger(__name__)
+
+# A turn's stream only lives while the relay is reading it.
+REPLY_STREAM_TTL = 120
+
+
+def reply_stream_key(turn_id: str) -> str:
+    """Redis stream a streaming LLM task publishes one turn's reply to (turn_id is the task id)."""
+    return f"reply:{turn_id}"
+
+
+class ReplyStreamWriter:
+    """Worker side: publishes a reply to `reply:<turn_id>` chunk by chunk.
+
+    Entries are `{"type": "sentence", "text": ...}` as chunks complete, then
+    one `{"type": "end"}`, or `{"type": "error", "error": ...}` if the turn
+    failed. The stream expires REPLY_STREAM_TTL seconds after the last write.
+    """
+
+    def __init__(self, client: redis.Redis, turn_id: str):
+        self.client = client
+        self.key = reply_stream_key(turn_id)
+        self.sentences = 0
+        self.closed = False
+
+    def _add(self, fields: dict):
+        pipe = self.client.pipeline(transaction=False)
+        pipe.xadd(self.key, fields)
+        pipe.expire(self.key, REPLY_STREAM_TTL)
+        pipe.execute()
+
+    def sentence(self, text: str):
+        self.sentences += 1
+        self._add({"type": "sentence", "text": text})
+
+    def end(self):
+        if not self.closed:
+            self.closed = True
+            self._add({"type": "end"})
+
+    def error(self, error: str):
+        if not self.closed:
+            self.closed = True
+            self._add({"type": "error", "error": error})
+
+
+class ReplyStreamReader:
+    """Relay side: reads a streaming reply sentence by sentence with XREAD BLOCK.
+
+    One redis.asyncio client, created by `open()` on the consumer's loop.
+    """
+
+    def __init__(self, redis_url: str):
+        self.redis_url = redis_url
+        self._client: Optional[aioredis.Redis] = None
+
+    def open(self):
+        if self._client is None:
+            self._client = aioredis.from_url(self.redis_url, decode_responses=True)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def sentences(self, turn_id: str, timeout: float, abort_on: Optional[Awaitable] = None) -> AsyncIterator[str]:
+        """Yields the turn's sentences as the worker publishes them.
+
+        Raises asyncio.TimeoutError if nothing new arrives for `timeout`
+        seconds, TaskAborted if `abort_on` completes first (e.g. the caller
+        hung up) and RuntimeError if the worker reported a failure. The stream
+        is deleted once it has been read or abandoned.
+        """
+        key = reply_stream_key(turn_id)
+        last_id = "0-0"
+        abort_task = asyncio.ensure_future(abort_on) if abort_on is not None else None
+        try:
+            while True:
+                read = asyncio.ensure_future(self._client.xread({key: last_id}, count=100, block=int(timeout * 1000)))
+                done, _ = await asyncio.wait([read] + ([abort_task] if abort_task else []), return_when=asyncio.FIRST_COMPLETED)
+                if read not in done:
+                    read.cancel()
+                    raise TaskAborted(turn_id)
+                entries = read.result()
+                if not entries:
+                    raise asyncio.TimeoutError()
+                for entry_id, fields in entries[0][1]:
+                    last_id = entry_id
+                    if fields["type"] == "sentence":
+                        yield fields["text"]
+                    elif fields["type"] == "end":
+                        return
+                    else:
+                        raise RuntimeError(f"Streaming reply failed: {fields.get('error')}")
+        finally:
+            if abort_task is not None:
+                abort_task.cancel()
+            try:
+                await self._client.delete(key)
+            except Exception as e:
+                logger.warning(f"Could not delete reply stream {key}: {e}")
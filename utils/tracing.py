@@ -0,0 +1,185 @@
+# utils/tracing.py
+
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterable, List, Optional
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+TRACE_STREAM = os.environ.get("TRACE_STREAM", "traces:spans")
+TRACE_STREAM_MAXLEN = int(os.environ.get("TRACE_STREAM_MAXLEN", 200000))
+
+# Stages of one conversational turn, in pipeline order:
+#   greeting     call answered -> greeting is playing (call setup, its own trace)
+#   endpoint     silence waited through before the turn was declared over (streamed calls)
+#   dispatch     recording finished -> worker picks the task up
+#   download     worker fetches the recording
+#   stt / llm    Groq transcription and chat completion
+#   first_sentence  LLM request -> first complete sentence published (streaming replies)
+#   tts          provider synthesis (orchestrator or in-process)
+#   transcode    conversion to the telephony codec
+#   filler       filler prompt played because the reply was late
+#   first_audio  relay has the reply text -> first chunk is playing
+#   turn         recording finished -> first chunk is playing
+STAGES = ("greeting", "endpoint", "dispatch", "download", "stt", "llm", "first_sentence", "tts", "transcode", "filler", "first_audio", "turn")
+
+# The trace of the turn being handled. Tasks spawned while it is set inherit it,
+# so spans deep in the TTS path need no extra arguments.
+current_trace: ContextVar[Optional[str]] = ContextVar("current_trace", default=None)
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile; the provider latency tracker and the endpointers use it too."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class SpanRecorder:
+    """Records timed spans of a call turn into a Redis stream.
+
+    Each span is one stream entry: `trace_id`, `stage`, `service`, `start`
+    (epoch seconds), `duration_ms` and any extra attributes. Recording only
+    enqueues; a daemon thread drains the queue and XADDs whatever has piled up
+    in one pipeline, so neither the event loops nor the Celery worker wait on
+    Redis. The stream is capped at roughly `maxlen` entries. When the queue is
+    full or Redis is down spans are dropped and counted, never raised. The
+    thread is started lazily, so a recorder created before a Celery prefork
+    still ships spans from each child.
+    """
+
+    def __init__(
+        self,
+        service: str,
+        redis_url: Optional[str],
+        stream: str = TRACE_STREAM,
+        maxlen: int = TRACE_STREAM_MAXLEN,
+        queue_size: int = 10000,
+        batch_size: int = 500,
+    ):
+        self.service = service
+        self.stream = stream
+        self.maxlen = maxlen
+        self.batch_size = batch_size
+        self.enabled = bool(redis_url)
+        self._redis = redis.from_url(redis_url, socket_timeout=1.0, socket_connect_timeout=1.0) if redis_url else None
+        self._queue: "queue.Queue[Optional[dict]]" = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._healthy = True
+
+        self.recorded = 0
+        self.written = 0
+        self.dropped = 0
+
+    def _ensure_thread(self):
+        if self._pid == os.getpid() and self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="span-recorder", daemon=True)
+            self._thread.start()
+
+    def record(self, stage: str, duration_ms: float, start: Optional[float] = None, trace_id: Optional[str] = None, **attrs):
+        """Records a span measured elsewhere. A no-op outside a trace."""
+        trace_id = trace_id or current_trace.get()
+        if not self.enabled or trace_id is None:
+            return
+        fields = {
+            "trace_id": trace_id,
+            "stage": stage,
+            "service": self.service,
+            "start": f"{start if start is not None else time.time() - duration_ms / 1000:.6f}",
+            "duration_ms": f"{duration_ms:.2f}",
+        }
+        fields.update({key: str(value) for key, value in attrs.items() if value is not None})
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(fields)
+            self.recorded += 1
+        except queue.Full:
+            self.dropped += 1
+
+    @contextmanager
+    def span(self, stage: str, trace_id: Optional[str] = None, **attrs):
+        """Times the block as `stage`. Yields the attribute dict, so the block can add to it."""
+        start = time.time()
+        start_time = time.perf_counter()
+        try:
+            yield attrs
+        except BaseException as e:
+            attrs["error"] = type(e).__name__
+            raise
+        finally:
+            self.record(stage, (time.perf_counter() - start_time) * 1000, start=start, trace_id=trace_id, **attrs)
+
+    def _write(self, batch: Iterable[dict]):
+        batch = list(batch)
+        try:
+            pipe = self._redis.pipeline(transaction=False)
+            for fields in batch:
+                pipe.xadd(self.stream, fields, maxlen=self.maxlen, approximate=True)
+            pipe.execute()
+        except Exception as e:
+            self.dropped += len(batch)
+            if self._healthy:
+                logger.warning(f"Could not write trace spans to Redis, dropping them until it recovers: {e}")
+            self._healthy = False
+            return
+        if not self._healthy:
+            logger.info("Trace span writes to Redis recovered.")
+        self._healthy = True
+        self.written += len(batch)
+
+    def _run(self):
+        while True:
+            fields = self._queue.get()
+            if fields is None:
+                return
+            batch = [fields]
+            while len(batch) < self.batch_size:
+                try:
+                    fields = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if fields is None:
+                    self._write(batch)
+                    return
+                batch.append(fields)
+            self._write(batch)
+
+    def close(self, timeout: float = 2.0):
+        """Flushes queued spans and stops the writer thread."""
+        if self._thread and self._thread.is_alive() and self._pid == os.getpid():
+            try:
+                self._queue.put(None, timeout=timeout)
+            except queue.Full:
+                pass
+            self._thread.join(timeout=timeout)
+        self._thread = None
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "stream": self.stream,
+            "recorded": self.recorded,
+            "written": self.written,
+            "dropped": self.dropped,
+            "queued": self._queue.qsize(),
+        }
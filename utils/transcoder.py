@@ -0,0 +1,315 @@
+# utils/transcoder.py
+"""
+In-process telephony transcoder.
+
+Takes the WAV bytes returned by a TTS provider, decodes, downmixes, resamples
+and G.711-encodes them entirely in memory, and emits a ready-to-serve WAV.
+ffmpeg is kept as a fallback for inputs this module cannot decode; it is driven
+over pipes so neither path touches the disk.
+"""
+
+import asyncio
+import logging
+import struct
+import time
+from functools import lru_cache
+from math import gcd
+from typing import Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+logger = logging.getLogger(__name__)
+
+TELEPHONY_SAMPLE_RATE = 8000
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_ALAW = 0x0006
+WAVE_FORMAT_MULAW = 0x0007
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# ffmpeg codec name -> (WAV format tag, bits per sample, raw ffmpeg muxer)
+SUPPORTED_CODECS = {
+    "pcm_mulaw": (WAVE_FORMAT_MULAW, 8, "mulaw"),
+    "pcm_alaw": (WAVE_FORMAT_ALAW, 8, "alaw"),
+    "pcm_s16le": (WAVE_FORMAT_PCM, 16, "s16le"),
+}
+
+# Half-width (in input samples) of the windowed-sinc interpolation kernel.
+RESAMPLE_HALF_WIDTH = 16
+RESAMPLE_KAISER_BETA = 8.6
+RESAMPLE_BLOCK = 16384
+# Above this many polyphase branches, fall back to per-sample kernel evaluation.
+RESAMPLE_MAX_PHASES = 1024
+
+_SEG_UEND = np.array([0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF, 0x1FFF], dtype=np.int32)
+_SEG_AEND = np.array([0x1F, 0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF], dtype=np.int32)
+
+
+class UnsupportedAudioFormat(ValueError):
+    """Raised when the in-process decoder cannot handle the input audio."""
+
+
+def parse_wav(data: bytes) -> Tuple[dict, memoryview]:
+    """Parses a RIFF/WAVE header and returns (format info, sample data view).
+
+    Tolerates the placeholder sizes streaming encoders write (0 or 0xFFFFFFFF)
+    by clamping the data chunk to the bytes actually present.
+    """
+    view = memoryview(data)
+    if len(data) < 12 or data[0:4] != b"RIFF" or data[8:12] != b"WAVE":
+        raise UnsupportedAudioFormat("Input is not a RIFF/WAVE file.")
+
+    fmt = None
+    offset = 12
+    while offset + 8 <= len(data):
+        chunk_id = data[offset:offset + 4]
+        (chunk_size,) = struct.unpack_from("<I", data, offset + 4)
+        body_start = offset + 8
+        if chunk_id == b"fmt ":
+            if chunk_size < 16:
+                raise UnsupportedAudioFormat("Truncated fmt chunk.")
+            format_tag, channels, sample_rate, _, block_align, bits = struct.unpack_from("<HHIIHH", data, body_start)
+            if format_tag == WAVE_FORMAT_EXTENSIBLE and chunk_size >= 40:
+                # The first two bytes of the SubFormat GUID carry the real format tag.
+                (format_tag,) = struct.unpack_from("<H", data, body_start + 24)
+            fmt = {
+                "format_tag": format_tag,
+                "channels": channels,
+                "sample_rate": sample_rate,
+                "block_align": block_align,
+                "bits_per_sample": bits,
+            }
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise UnsupportedAudioFormat("data chunk appears before fmt chunk.")
+            body_end = len(data) if chunk_size in (0, 0xFFFFFFFF) else min(len(data), body_start + chunk_size)
+            return fmt, view[body_start:body_end]
+        offset = body_start + chunk_size + (chunk_size & 1)
+
+    raise UnsupportedAudioFormat("No data chunk found.")
+
+
+def decode_wav(data: bytes) -> Tuple[np.ndarray, int]:
+    """Decodes WAV bytes to a float32 array of shape (frames, channels) and its sample rate."""
+    fmt, payload = parse_wav(data)
+    format_tag, bits, channels = fmt["format_tag"], fmt["bits_per_sample"], fmt["channels"]
+    if channels < 1:
+        raise UnsupportedAudioFormat("WAV declares zero channels.")
+
+    frame_bytes = channels * bits // 8
+    if frame_bytes == 0:
+        raise UnsupportedAudioFormat(f"Unsupported bit depth: {bits}")
+    payload = payload[:len(payload) - len(payload) % frame_bytes]
+
+    if format_tag == WAVE_FORMAT_PCM and bits == 16:
+        samples = np.frombuffer(payload, dtype="<i2").astype(np.float32) / 32768.0
+    elif format_tag == WAVE_FORMAT_PCM and bits == 8:
+        samples = (np.frombuffer(payload, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif format_tag == WAVE_FORMAT_PCM and bits == 24:
+        raw = np.frombuffer(payload, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        ints = raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)
+        ints = np.where(ints & 0x800000, ints - 0x1000000, ints)
+        samples = ints.astype(np.float32) / 8388608.0
+    elif format_tag == WAVE_FORMAT_PCM and bits == 32:
+        samples = (np.frombuffer(payload, dtype="<i4").astype(np.float64) / 2147483648.0).astype(np.float32)
+    elif format_tag == WAVE_FORMAT_IEEE_FLOAT and bits == 32:
+        samples = np.frombuffer(payload, dtype="<f4").astype(np.float32)
+    elif format_tag == WAVE_FORMAT_IEEE_FLOAT and bits == 64:
+        samples = np.frombuffer(payload, dtype="<f8").astype(np.float32)
+    elif format_tag == WAVE_FORMAT_MULAW and bits == 8:
+        samples = ulaw_to_linear(np.frombuffer(payload, dtype=np.uint8)).astype(np.float32) / 32768.0
+    elif format_tag == WAVE_FORMAT_ALAW and bits == 8:
+        samples = alaw_to_linear(np.frombuffer(payload, dtype=np.uint8)).astype(np.float32) / 32768.0
+    else:
+        raise UnsupportedAudioFormat(f"Unsupported WAV encoding: format tag {format_tag:#06x}, {bits} bits")
+
+    return samples.reshape(-1, channels), fmt["sample_rate"]
+
+
+def downmix(samples: np.ndarray) -> np.ndarray:
+    """Averages all channels of a (frames, channels) array into a mono vector."""
+    if samples.ndim == 1:
+        return samples
+    if samples.shape[1] == 1:
+        return samples[:, 0]
+    return samples.mean(axis=1, dtype=np.float32)
+
+
+def _kernel(distance: np.ndarray, cutoff: float, half_width: int) -> np.ndarray:
+    """Kaiser-windowed sinc evaluated at `distance` input samples from the output instant."""
+    window = np.i0(RESAMPLE_KAISER_BETA * np.sqrt(np.clip(1.0 - (distance / half_width) ** 2, 0.0, 1.0)))
+    return (cutoff * np.sinc(cutoff * distance) * window / np.i0(RESAMPLE_KAISER_BETA)).astype(np.float32)
+
+
+@lru_cache(maxsize=32)
+def _polyphase_weights(up: int, down: int, half_width: int, cutoff: float) -> np.ndarray:
+    """One row of filter taps per output phase for a rational up/down ratio."""
+    taps = np.arange(-half_width + 1, half_width + 1)
+    fractions = (np.arange(up) * down % up) / up
+    return _kernel(fractions[:, None] - taps[None, :], cutoff, half_width)
+
+
+def resample(samples: np.ndarray, source_rate: int, target_rate: int) -> np.ndarray:
+    """Band-limited resampling of a mono float32 signal via windowed-sinc interpolation.
+
+    The cutoff sits just below the lower of the two Nyquist frequencies, so
+    downsampling to 8 kHz is anti-aliased without a separate filter pass. For
+    the usual rational ratios (24k/22.05k/16k -> 8k) the filter taps are
+    precomputed per phase and applied as strided matrix-vector products.
+    """
+    if source_rate == target_rate or len(samples) == 0:
+        return samples.astype(np.float32, copy=False)
+
+    ratio = target_rate / source_rate
+    cutoff = min(1.0, ratio) * 0.95
+    half_width = int(np.ceil(RESAMPLE_HALF_WIDTH / min(1.0, ratio)))
+    ntaps = 2 * half_width
+
+    padded = np.concatenate([
+        np.zeros(half_width, dtype=np.float32),
+        samples.astype(np.float32, copy=False),
+        np.zeros(half_width + 1, dtype=np.float32),
+    ])
+    out_len = int(np.floor(len(samples) * ratio))
+    output = np.empty(out_len, dtype=np.float32)
+
+    g = gcd(source_rate, target_rate)
+    up, down = target_rate // g, source_rate // g
+    if up <= RESAMPLE_MAX_PHASES:
+        weights = _polyphase_weights(up, down, half_width, cutoff)
+        for phase in range(min(up, out_len)):
+            base = phase * down // up
+            # Window m starts at input sample (m * down + base - half_width + 1).
+            windows = sliding_window_view(padded[base + 1:], ntaps)[::down]
+            target = output[phase::up]
+            target[:] = windows[:len(target)] @ weights[phase]
+        return output
+
+    taps = np.arange(-half_width + 1, half_width + 1)
+    for start in range(0, out_len, RESAMPLE_BLOCK):
+        positions = np.arange(start, min(out_len, start + RESAMPLE_BLOCK)) / ratio
+        indices = np.floor(positions).astype(np.int64)[:, None] + taps[None, :]
+        weights = _kernel(positions[:, None] - indices, cutoff, half_width)
+        output[start:start + len(positions)] = np.einsum("ij,ij->i", padded[indices + half_width], weights)
+    return output
+
+
+def float_to_pcm16(samples: np.ndarray) -> np.ndarray:
+    return np.clip(np.round(samples * 32768.0), -32768, 32767).astype(np.int16)
+
+
+def linear_to_ulaw(pcm: np.ndarray) -> np.ndarray:
+    """G.711 μ-law encoding of int16 samples (bit-exact with the Sun reference coder)."""
+    values = pcm.astype(np.int32) >> 2
+    mask = np.where(values < 0, 0x7F, 0xFF)
+    values = np.minimum(np.abs(values), 8159) + 0x21
+    seg = np.searchsorted(_SEG_UEND, values, side="left")
+    uval = (seg << 4) | ((values >> (seg + 1)) & 0x0F)
+    return (np.where(seg >= 8, 0x7F, uval) ^ mask).astype(np.uint8)
+
+
+def linear_to_alaw(pcm: np.ndarray) -> np.ndarray:
+    """G.711 A-law encoding of int16 samples (bit-exact with the Sun reference coder)."""
+    values = pcm.astype(np.int32) >> 3
+    mask = np.where(values >= 0, 0xD5, 0x55)
+    values = np.where(values >= 0, values, -values - 1)
+    seg = np.searchsorted(_SEG_AEND, values, side="left")
+    shift = np.where(seg < 2, 1, seg)
+    aval = (seg << 4) | ((values >> shift) & 0x0F)
+    return (np.where(seg >= 8, 0x7F, aval) ^ mask).astype(np.uint8)
+
+
+def ulaw_to_linear(codes: np.ndarray) -> np.ndarray:
+    u = ~codes.astype(np.int32) & 0xFF
+    t = (((u & 0x0F) << 3) + 0x84) << ((u & 0x70) >> 4)
+    return np.where(u & 0x80, 0x84 - t, t - 0x84).astype(np.int16)
+
+
+def alaw_to_linear(codes: np.ndarray) -> np.ndarray:
+    a = codes.astype(np.int32) ^ 0x55
+    t = (a & 0x0F) << 4
+    seg = (a & 0x70) >> 4
+    t = np.where(seg == 0, t + 8, np.where(seg == 1, t + 0x108, (t + 0x108) << np.maximum(seg - 1, 0)))
+    return np.where(a & 0x80, t, -t).astype(np.int16)
+
+
+def build_wav(payload: bytes, codec: str, sample_rate: int = TELEPHONY_SAMPLE_RATE, channels: int = 1) -> bytes:
+    """Wraps encoded sample bytes in a WAV container for the given ffmpeg-style codec name."""
+    if codec not in SUPPORTED_CODECS:
+        raise ValueError(f"Unsupported telephony codec: {codec}")
+    format_tag, bits, _ = SUPPORTED_CODECS[codec]
+    block_align = channels * bits // 8
+    byte_rate = sample_rate * block_align
+
+    if format_tag == WAVE_FORMAT_PCM:
+        fmt_chunk = struct.pack("<4sIHHIIHH", b"fmt ", 16, format_tag, channels, sample_rate, byte_rate, block_align, bits)
+        fact_chunk = b""
+    else:
+        # Non-PCM formats carry cbSize and a fact chunk with the frame count.
+        fmt_chunk = struct.pack("<4sIHHIIHHH", b"fmt ", 18, format_tag, channels, sample_rate, byte_rate, block_align, bits, 0)
+        fact_chunk = struct.pack("<4sII", b"fact", 4, len(payload) // block_align)
+
+    pad = b"\x00" if len(payload) & 1 else b""
+    data_header = struct.pack("<4sI", b"data", len(payload))
+    riff_size = 4 + len(fmt_chunk) + len(fact_chunk) + len(data_header) + len(payload) + len(pad)
+    return b"".join([struct.pack("<4sI4s", b"RIFF", riff_size, b"WAVE"), fmt_chunk, fact_chunk, data_header, payload, pad])
+
+
+def transcode_to_telephony(data: bytes, codec: str, target_rate: int = TELEPHONY_SAMPLE_RATE) -> bytes:
+    """Decodes provider WAV bytes and returns a mono, `target_rate` WAV encoded with `codec`."""
+    if codec not in SUPPORTED_CODECS:
+        raise ValueError(f"Unsupported telephony codec: {codec}")
+    samples, source_rate = decode_wav(data)
+    mono = resample(downmix(samples), source_rate, target_rate)
+    pcm = float_to_pcm16(mono)
+
+    if codec == "pcm_mulaw":
+        payload = linear_to_ulaw(pcm).tobytes()
+    elif codec == "pcm_alaw":
+        payload = linear_to_alaw(pcm).tobytes()
+    else:
+        payload = pcm.astype("<i2").tobytes()
+    return build_wav(payload, codec, target_rate)
+
+
+async def transcode_with_ffmpeg(data: bytes, codec: str, target_rate: int = TELEPHONY_SAMPLE_RATE) -> bytes:
+    """Transcodes any ffmpeg-readable input over stdin/stdout and wraps the result as WAV."""
+    if codec not in SUPPORTED_CODECS:
+        raise ValueError(f"Unsupported telephony codec: {codec}")
+    raw_format = SUPPORTED_CODECS[codec][2]
+    command = [
+        "ffmpeg", "-hide_banner", "-loglevel", "error",
+        "-i", "pipe:0",
+        "-ar", str(target_rate),
+        "-ac", "1",
+        "-acodec", codec,
+        "-f", raw_format, "pipe:1",
+    ]
+    process = await asyncio.create_subprocess_exec(
+        *command, stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    stdout, stderr = await process.communicate(input=data)
+    if process.returncode != 0:
+        raise Exception(f"ffmpeg failed: {stderr.decode(errors='replace')}")
+    return build_wav(stdout, codec, target_rate)
+
+
+async def transcode(data: bytes, codec: str, target_rate: int = TELEPHONY_SAMPLE_RATE) -> bytes:
+    """Transcodes provider audio for telephony, preferring the in-process path.
+
+    The NumPy work runs in a thread so the event loop stays responsive; ffmpeg
+    is only spawned when the input is something the in-process decoder rejects.
+    """
+    start_time = time.monotonic()
+    try:
+        result = await asyncio.to_thread(transcode_to_telephony, data, codec, target_rate)
+        path = "in-process"
+    except UnsupportedAudioFormat as e:
+        logger.warning(f"In-process transcoder cannot handle input ({e}). Falling back to ffmpeg.")
+        result = await transcode_with_ffmpeg(data, codec, target_rate)
+        path = "ffmpeg"
+    latency = (time.monotonic() - start_time) * 1000
+    logger.info(f"Transcoding Latency ({path}): {latency:.2f} ms")
+    return result
@@ -0,0 +1,187 @@
+# vad/endpointing.py
+from collections import deque
+from typing import Optional, Tuple
+
+from utils.tracing import percentile
+
+
+class FixedEndpointer:
+    """Ends a turn after a fixed run of silence, like `end_silence_timeout` on `call.record`."""
+
+    kind = "fixed"
+
+    def __init__(self, end_silence_ms: int = 800, frame_duration_ms: int = 20):
+        self.frame_duration_ms = frame_duration_ms
+        self.end_silence_frames = max(1, end_silence_ms // frame_duration_ms)
+        self._silence_frames = 0
+        self.last_decision_ms: Optional[float] = None
+        self.last_reason: Optional[str] = None
+
+    def begin(self):
+        self._silence_frames = 0
+
+    def idle(self):
+        pass
+
+    def update(self, is_speech: bool) -> bool:
+        self._silence_frames = 0 if is_speech else self._silence_frames + 1
+        if self._silence_frames < self.end_silence_frames:
+            return False
+        self.last_decision_ms = self._silence_frames * self.frame_duration_ms
+        self.last_reason = "fixed"
+        return True
+
+    def stats(self) -> dict:
+        return {"mode": self.kind, "hangover_ms": self.end_silence_frames * self.frame_duration_ms}
+
+
+class AdaptiveEndpointer:
+    """Decides end-of-turn from the speech/silence statistics of the current utterance.
+
+    Fed one VoiceActivityDetector decision per frame. A silence run ends the
+    turn once it outlasts the hangover picked for the utterance so far:
+
+    - short and confident (at most `short_utterance_ms` of voice, and at least
+      `confident_density` of its frames voiced, e.g. a crisp "yes"): the
+      short `min_hangover_ms`;
+    - anything longer, where a silence is more likely a mid-sentence pause:
+      this caller's learned pause length plus `pause_margin_ms`, clamped to
+      `[min_hangover_ms, max_hangover_ms]`.
+
+    Pause length is learned per call. Every silence run inside an utterance
+    that speech resumed after is a pause sample, and so is the gap when the
+    caller starts talking again within `resume_window_ms` of an endpoint,
+    since that endpoint was premature. The `pause_percentile` of the recent
+    samples is used, starting from `default_pause_ms`. A premature short
+    endpoint also lengthens the short hangover by `pause_margin_ms`, for
+    callers who pause early. One endpointer per call; it is not thread-safe.
+    """
+
+    kind = "adaptive"
+
+    def __init__(
+        self,
+        frame_duration_ms: int = 20,
+        min_hangover_ms: int = 300,
+        max_hangover_ms: int = 1200,
+        short_utterance_ms: int = 600,
+        confident_density: float = 0.7,
+        default_pause_ms: int = 500,
+        pause_margin_ms: int = 150,
+        min_pause_ms: int = 100,
+        pause_percentile: float = 75,
+        pause_window: int = 50,
+        resume_window_ms: int = 1000,
+    ):
+        self.frame_duration_ms = frame_duration_ms
+        self.min_hangover_ms = min_hangover_ms
+        self.max_hangover_ms = max_hangover_ms
+        self.short_utterance_ms = short_utterance_ms
+        self.confident_density = confident_density
+        self.default_pause_ms = default_pause_ms
+        self.pause_margin_ms = pause_margin_ms
+        self.min_pause_ms = min_pause_ms
+        self.pause_percentile = pause_percentile
+        self.resume_window_ms = resume_window_ms
+        self._pauses = deque(maxlen=pause_window)
+        self.short_hangover_ms = min_hangover_ms
+        self._frames = 0
+        self._speech_frames = 0
+        self._silence_frames = 0
+        self._idle_frames: Optional[int] = None
+        self.last_decision_ms: Optional[float] = None
+        self.last_reason: Optional[str] = None
+
+        self.endpoints = 0
+        self.short_endpoints = 0
+        self.premature_endpoints = 0
+        self._decisions = deque(maxlen=200)
+
+    @property
+    def learned_pause_ms(self) -> float:
+        if len(self._pauses) < 3:
+            return self.default_pause_ms
+        return percentile(self._pauses, self.pause_percentile)
+
+    def _hangover_ms(self) -> Tuple[float, str]:
+        voiced_ms = self._speech_frames * self.frame_duration_ms
+        active_frames = self._frames - self._silence_frames
+        density = self._speech_frames / active_frames if active_frames else 0.0
+        if voiced_ms <= self.short_utterance_ms and density >= self.confident_density:
+            return self.short_hangover_ms, "short"
+        hangover = self.learned_pause_ms + self.pause_margin_ms
+        return min(self.max_hangover_ms, max(self.min_hangover_ms, hangover)), "pause"
+
+    def _learn_pause(self, pause_ms: float):
+        if pause_ms >= self.min_pause_ms:
+            self._pauses.append(min(pause_ms, self.max_hangover_ms))
+
+    def begin(self):
+        """Speech onset; a quick resumption means the previous endpoint cut the caller off."""
+        if self._idle_frames is not None and self.last_decision_ms is not None:
+            gap_ms = self.last_decision_ms + self._idle_frames * self.frame_duration_ms
+            if gap_ms <= self.resume_window_ms:
+                self.premature_endpoints += 1
+                self._learn_pause(gap_ms)
+                if self.last_reason == "short":
+                    self.short_hangover_ms = min(self.max_hangover_ms, self.short_hangover_ms + self.pause_margin_ms)
+        self._idle_frames = None
+        self._frames = self._speech_frames = self._silence_frames = 0
+
+    def idle(self):
+        """A frame of silence between utterances."""
+        if self._idle_frames is not None:
+            self._idle_frames += 1
+
+    def update(self, is_speech: bool) -> bool:
+        """Feeds one frame of the current utterance; True once the turn is over."""
+        self._frames += 1
+        if is_speech:
+            if self._silence_frames:
+                self._learn_pause(self._silence_frames * self.frame_duration_ms)
+            self._speech_frames += 1
+            self._silence_frames = 0
+            return False
+
+        self._silence_frames += 1
+        hangover_ms, reason = self._hangover_ms()
+        silence_ms = self._silence_frames * self.frame_duration_ms
+        if silence_ms < hangover_ms:
+            return False
+
+        self.last_decision_ms = silence_ms
+        self.last_reason = reason
+        self.endpoints += 1
+        if reason == "short":
+            self.short_endpoints += 1
+        self._decisions.append(silence_ms)
+        self._idle_frames = 0
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.kind,
+            "endpoints": self.endpoints,
+            "short_endpoints": self.short_endpoints,
+            "premature_endpoints": self.premature_endpoints,
+            "short_hangover_ms": self.short_hangover_ms,
+            "learned_pause_ms": self.learned_pause_ms,
+            "pause_samples": len(self._pauses),
+            "decision_p50_ms": percentile(self._decisions, 50),
+            "decision_p95_ms": percentile(self._decisions, 95),
+        }
+
+
+def create_endpointer(
+    mode: str,
+    frame_duration_ms: int = 20,
+    end_silence_ms: int = 800,
+    min_hangover_ms: int = 300,
+    max_hangover_ms: int = 1200,
+):
+    """Builds the endpointer selected by VAD_ENDPOINTING: "adaptive" (default) or "fixed"."""
+    if mode == "adaptive":
+        return AdaptiveEndpointer(frame_duration_ms, min_hangover_ms=min_hangover_ms, max_hangover_ms=max_hangover_ms)
+    if mode == "fixed":
+        return FixedEndpointer(end_silence_ms, frame_duration_ms)
+    raise ValueError(f"Unknown endpointing mode: {mode}")